@@ -178,4 +178,21 @@ api.interceptors.response.use(
   }
 )
 
+/**
+ * 轮询后台任务直到结束
+ * @param {string} jobId - 任务ID
+ * @param {Function} onProgress - 进度回调，参数为任务状态
+ * @param {number} interval - 轮询间隔（毫秒）
+ * @returns {Promise<Object>} 完成的任务，失败时抛出错误
+ */
+export async function waitForJob(jobId, onProgress = null, interval = 1000) {
+  while (true) {
+    const { data: job } = await api.get(`/system/backup/jobs/${jobId}`)
+    if (onProgress) onProgress(job)
+    if (job.status === 'completed') return job
+    if (job.status === 'failed') throw new Error(job.error || '任务执行失败')
+    await new Promise(resolve => setTimeout(resolve, interval))
+  }
+}
+
 export default api
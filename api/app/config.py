@@ -1,12 +1,26 @@
 import os
-from typing import List, Optional
+from typing import Dict, List, Optional, Union
 from pydantic import validator
 from pydantic_settings import BaseSettings
+from app.core.db_profile import tortoise_connections
+from app.core.db_router import ReadWriteRouter
 
 
 class Settings(BaseSettings):
     # 数据库配置
     DATABASE_URL: str = "sqlite://db.sqlite3"
+    # SQLite 连接配置档：development / production / test
+    DB_PROFILE: str = "development"
+    # 覆盖配置档中的 PRAGMA，如 {"mmap_size": 0}
+    DB_PRAGMAS: Dict[str, Union[int, str]] = {}
+    # 只读接口（公开、统计、搜索）使用的 SQLite 只读连接数，0 表示全部走写连接
+    DB_READ_CONNECTIONS: int = 2
+    # PostgreSQL 连接池（asyncpg）
+    DB_POOL_MIN_SIZE: int = 2
+    DB_POOL_MAX_SIZE: int = 10
+    DB_POOL_MAX_QUERIES: int = 50000  # 单个连接执行多少查询后重建
+    DB_POOL_MAX_INACTIVE_LIFETIME: float = 300.0  # 空闲连接回收时间（秒）
+    DB_STATEMENT_TIMEOUT: int = 30000  # 语句超时（毫秒），0 表示不限制
     
     # JWT配置
     SECRET_KEY: str = "hqxx-exam-secret-key"
@@ -16,6 +30,14 @@ class Settings(BaseSettings):
     # Redis配置
     REDIS_URL: Optional[str] = None
     
+    # uvicorn worker 进程数（uvicorn 同样读取该环境变量），大于1时共享状态需要Redis
+    WEB_CONCURRENCY: int = 1
+    # 各 worker 共享的请求指标文件（内存映射，建议放在 /dev/shm）
+    METRICS_FILE: str = "metrics.shm"
+
+    # 启动时自动建表建索引；生产环境关闭，部署时执行 python -m app.migrate
+    AUTO_MIGRATE: bool = True
+
     # 应用配置
     DEBUG: bool = True
     API_V1_STR: str = "/api/v1"
@@ -36,9 +58,45 @@ class Settings(BaseSettings):
     UPLOAD_DIR: str = "uploads"
     MAX_FILE_SIZE: int = 10485760  # 10MB
 
+    # 已发布试题静态快照包（由Nginx直接提供）
+    SNAPSHOT_DIR: str = "snapshots"
+    SNAPSHOT_URL_PREFIX: str = "/snapshots"
+
+    # 备份上传带宽限制（字节/秒，0 表示不限制）
+    BACKUP_UPLOAD_RATE_LIMIT: int = 0
+
+    # 定时任务（cron 表达式：分 时 日 月 周，本地时间）
+    SCHEDULER_ENABLED: bool = True
+    SCHEDULER_LOCK_FILE: str = "scheduler.lock"
+    BACKUP_CRON: str = "0 3 * * *"
+    # 系统日志保留天数，默认 0 不自动清理；设为正数（如 90）后每天删除更早的日志，删除后无法恢复
+    LOG_RETENTION_DAYS: int = 0
+    LOG_RETENTION_CRON: str = "30 3 * * *"
+    CACHE_WARMUP_CRON: str = "*/10 * * * *"
+
+    # 出站HTTP请求（图床、WebDAV）共享连接池
+    HTTP_TIMEOUT: float = 30.0  # 短请求的读写超时（秒）
+    HTTP_TRANSFER_TIMEOUT: float = 60.0  # 备份上传每次读写的超时（秒）
+    HTTP_CONNECT_TIMEOUT: float = 10.0
+    HTTP_MAX_CONNECTIONS: int = 20
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0  # 空闲长连接保留时间（秒）
+    HTTP2_ENABLED: bool = True  # 需要安装 h2
+
     # 图床配置
     IMAGE_CDN_URL: str = "https://img.ink/api/upload"
     IMAGE_CDN_TOKEN: str = ""  # 从环境变量获取
+
+    # 上传图床前的图片优化
+    IMAGE_OPTIMIZE_PRESET: str = "standard"  # original（不处理）/ high / standard / low
+    IMAGE_OPTIMIZE_FORMAT: str = "webp"  # webp / avif / original（保持 JPEG，其余转为 PNG）
+    IMAGE_PROCESS_WORKERS: int = 2  # 图片处理进程数（每个 worker 一个进程池，0 表示CPU核数）
+
+    # 图片去重（按内容 SHA-256 复用已上传的地址）和图床不可用时的本地兜底
+    IMAGE_DEDUP_ENABLED: bool = True
+    IMAGE_LOCAL_FALLBACK: bool = False
+    IMAGE_LOCAL_DIR: str = "uploads/images"
+    IMAGE_LOCAL_URL_PREFIX: str = "/uploads/images"
     
     class Config:
         env_file = ".env"
@@ -50,11 +108,24 @@ settings = Settings()
 
 # Tortoise ORM配置
 TORTOISE_ORM = {
-    "connections": {"default": settings.DATABASE_URL},
+    "connections": tortoise_connections(
+        settings.DATABASE_URL, settings.DB_PROFILE, settings.DB_PRAGMAS, settings.DB_READ_CONNECTIONS,
+        pool={
+            "minsize": settings.DB_POOL_MIN_SIZE,
+            "maxsize": settings.DB_POOL_MAX_SIZE,
+            "max_queries": settings.DB_POOL_MAX_QUERIES,
+            "max_inactive_connection_lifetime": settings.DB_POOL_MAX_INACTIVE_LIFETIME,
+            "statement_timeout": settings.DB_STATEMENT_TIMEOUT,
+        },
+    ),
     "apps": {
         "models": {
             "models": ["app.models", "aerich.models"],
             "default_connection": "default",
         },
     },
+    "routers": ["app.core.db_router.ReadWriteRouter"],
 }
+
+# 只读连接只对 SQLite 配置
+ReadWriteRouter.configure([name for name in TORTOISE_ORM["connections"] if name != "default"])
@@ -0,0 +1,322 @@
+"""
+分块去重的备份存储
+
+数据库按内容切分为数据块，压缩后以哈希命名存入 chunks/ 目录，
+每个备份只保存一份清单（数据块哈希列表），多次备份之间未变化的数据块只存一份。
+
+SQLite 数据库以页为单位切块：页的哈希满足条件时结束当前块（限制最小、最大页数），
+块边界由内容决定，页内容不变则块不变。SQLite 文件中的页位置固定，
+不会出现字节级插入导致后续内容整体偏移的情况，因此无需逐字节滚动哈希。
+
+其他文件（PostgreSQL 备份是连续的字节流，插入一行后其后内容整体偏移）使用逐字节的
+Gear 滚动哈希切块（FastCDC 方式）：块边界只取决于边界前 64 字节的内容，
+偏移后的内容仍切出相同的块，只有修改处附近的块需要重新存储。
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set
+
+try:
+    import zstandard
+except ImportError:  # 未安装时使用 gzip
+    zstandard = None
+
+ARCHIVE_VERSION = 1
+MANIFEST_SUFFIX = ".manifest.json"
+
+# 每块的页数范围，平均约 16 页
+MIN_CHUNK_PAGES = 4
+MAX_CHUNK_PAGES = 64
+BOUNDARY_MASK = 0x0F
+
+DEFAULT_PAGE_SIZE = 4096
+
+# 滚动哈希切块的块大小范围（字节），平均约 MIN + 8 KiB
+CDC_MIN_SIZE = 8 * 1024
+CDC_MAX_SIZE = 64 * 1024
+# 取哈希高 13 位判断边界（Gear 哈希的低位只取决于最近几个字节）
+CDC_MASK = ((1 << 13) - 1) << (64 - 13)
+CDC_READ_SIZE = 1024 * 1024
+
+_HASH_BITS = (1 << 64) - 1
+
+# Gear 哈希表：每个字节值对应一个固定的 64 位随机数（由哈希生成，跨版本不变，否则块边界会全部改变）
+_GEAR = tuple(
+    int.from_bytes(hashlib.blake2b(bytes([value]), digest_size=8, person=b"hqxx-cdc").digest(), "big")
+    for value in range(256)
+)
+
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+BACKUP_ID_PATTERN = re.compile(r"^[\w.-]+$")
+
+
+class BackupNotFoundError(FileNotFoundError):
+    """备份不存在"""
+
+
+def _compressor() -> str:
+    return "zstd" if zstandard is not None else "gzip"
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read this backup")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _page_size(path: Path) -> Optional[int]:
+    """从 SQLite 文件头读取页大小（偏移16，大端两字节，1 表示 65536），不是 SQLite 文件时返回 None"""
+    with open(path, "rb") as f:
+        header = f.read(100)
+    if len(header) < 18 or not header.startswith(SQLITE_HEADER):
+        return None
+    size = int.from_bytes(header[16:18], "big")
+    return 65536 if size == 1 else size or DEFAULT_PAGE_SIZE
+
+
+def _chunks(path: Path) -> Iterator[bytes]:
+    """切分备份文件：SQLite 数据库按页，其他文件按滚动哈希"""
+    page_size = _page_size(path)
+    if page_size is None:
+        return _cdc_chunks(path)
+    return _page_chunks(path, page_size)
+
+
+def _cdc_boundary(data: bytearray, start: int, end: int) -> int:
+    """在 data[start:end] 中查找块的结束位置（不含），未找到时返回 end 与最大块长中的较小者"""
+    limit = min(end, start + CDC_MAX_SIZE)
+    if limit - start <= CDC_MIN_SIZE:
+        return limit
+    gear, mask, bits = _GEAR, CDC_MASK, _HASH_BITS
+    h = 0
+    # 不足最小块长的部分不计算哈希
+    for i in range(start + CDC_MIN_SIZE, limit):
+        h = ((h << 1) + gear[data[i]]) & bits
+        if not h & mask:
+            return i + 1
+    return limit
+
+
+def _cdc_chunks(path: Path) -> Iterator[bytes]:
+    """按 Gear 滚动哈希切分文件"""
+    buffer = bytearray()
+    offset = 0
+    eof = False
+    with open(path, "rb") as f:
+        while True:
+            # 保证缓冲区中至少有一个最大块长的数据（文件末尾除外）
+            if not eof and len(buffer) - offset < CDC_MAX_SIZE:
+                del buffer[:offset]
+                offset = 0
+                data = f.read(CDC_READ_SIZE)
+                if data:
+                    buffer += data
+                    continue
+                eof = True
+            if offset >= len(buffer):
+                return
+            end = _cdc_boundary(buffer, offset, len(buffer))
+            yield bytes(buffer[offset:end])
+            offset = end
+
+
+def _page_chunks(path: Path, page_size: int) -> Iterator[bytes]:
+    """按页内容切分 SQLite 数据库"""
+    chunk = bytearray()
+    pages = 0
+    with open(path, "rb") as f:
+        while True:
+            page = f.read(page_size)
+            if not page:
+                break
+            chunk += page
+            pages += 1
+            boundary = hashlib.blake2b(page, digest_size=8).digest()[-1] & BOUNDARY_MASK == 0
+            if pages >= MAX_CHUNK_PAGES or (pages >= MIN_CHUNK_PAGES and boundary):
+                yield bytes(chunk)
+                chunk.clear()
+                pages = 0
+    if chunk:
+        yield bytes(chunk)
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+class BackupArchive:
+    """备份清单与数据块存储（同步方法，由调用方放到工作线程执行）"""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.chunk_dir = self.directory / "chunks"
+
+    @staticmethod
+    def validate_id(backup_id: str) -> str:
+        if not BACKUP_ID_PATTERN.match(backup_id) or backup_id.startswith("."):
+            raise BackupNotFoundError(backup_id)
+        return backup_id
+
+    def _manifest_path(self, backup_id: str) -> Path:
+        return self.directory / f"{self.validate_id(backup_id)}{MANIFEST_SUFFIX}"
+
+    def _chunk_path(self, digest: str, codec: str) -> Path:
+        ext = "zst" if codec == "zstd" else "gz"
+        return self.chunk_dir / digest[:2] / f"{digest}.{ext}"
+
+    def exists(self, backup_id: str) -> bool:
+        try:
+            return self._manifest_path(backup_id).exists()
+        except BackupNotFoundError:
+            return False
+
+    def manifest(self, backup_id: str) -> dict:
+        path = self._manifest_path(backup_id)
+        if not path.exists():
+            raise BackupNotFoundError(backup_id)
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def manifests(self) -> List[dict]:
+        """所有备份清单，最新的在前"""
+        manifests = []
+        for path in self.directory.glob(f"*{MANIFEST_SUFFIX}"):
+            try:
+                manifests.append(json.loads(path.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                continue
+        manifests.sort(key=lambda m: m["created_at"], reverse=True)
+        return manifests
+
+    def write(self, backup_id: str, source: Path, extra: Optional[dict] = None, extension: str = ".sqlite3") -> dict:
+        """
+        把数据库文件存为分块备份，已存在的数据块不重复写入，返回清单
+
+        extension 为下载时的文件扩展名，由调用方按数据库类型传入（backup_jobs.backup_extension）。
+        """
+        codec = _compressor()
+        file_hash = hashlib.sha256()
+        chunks = []
+        stored_size = 0
+
+        for data in _chunks(source):
+            digest = hashlib.sha256(data).hexdigest()
+            file_hash.update(data)
+            chunk_path = self._chunk_path(digest, codec)
+            if not chunk_path.exists():
+                chunk_path.parent.mkdir(parents=True, exist_ok=True)
+                compressed = _compress(data, codec)
+                _write_atomic(chunk_path, compressed)
+                stored_size += len(compressed)
+            else:
+                # 刷新修改时间，避免被并发的垃圾回收当作无引用的旧数据块删除
+                os.utime(chunk_path)
+            chunks.append([digest, len(data)])
+
+        manifest = {
+            "version": ARCHIVE_VERSION,
+            "id": backup_id,
+            "filename": f"{backup_id}{extension}",
+            "created_at": datetime.now().isoformat(),
+            "compression": codec,
+            "size": sum(length for _, length in chunks),
+            "stored_size": stored_size,
+            "sha256": file_hash.hexdigest(),
+            "chunks": chunks,
+            **(extra or {}),
+        }
+        # 清单最后写入，写入前中断不会留下不完整的备份
+        _write_atomic(
+            self._manifest_path(backup_id),
+            json.dumps(manifest, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        )
+        return manifest
+
+    def iter_content(self, backup_id: str) -> Iterator[bytes]:
+        """按顺序解压数据块，得到原始数据库内容"""
+        manifest = self.manifest(backup_id)
+        codec = manifest["compression"]
+        for digest, length in manifest["chunks"]:
+            data = _decompress(self._chunk_path(digest, codec).read_bytes(), codec)
+            if len(data) != length:
+                raise ValueError(f"Corrupted backup chunk: {digest}")
+            yield data
+
+    def restore_to(self, backup_id: str, dest: Path) -> int:
+        """重组备份到 dest 并校验哈希，返回文件大小"""
+        manifest = self.manifest(backup_id)
+        file_hash = hashlib.sha256()
+        tmp_path = dest.with_name(f".{dest.name}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                for data in self.iter_content(backup_id):
+                    file_hash.update(data)
+                    f.write(data)
+            if file_hash.hexdigest() != manifest["sha256"]:
+                raise ValueError(f"Backup checksum mismatch: {backup_id}")
+            os.replace(tmp_path, dest)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return manifest["size"]
+
+    def delete(self, backup_id: str) -> int:
+        """删除备份清单并清理不再被引用的数据块，返回释放的字节数"""
+        path = self._manifest_path(backup_id)
+        if not path.exists():
+            raise BackupNotFoundError(backup_id)
+        path.unlink()
+        return self.collect_garbage()
+
+    def collect_garbage(self, min_age: float = 3600) -> int:
+        """
+        删除未被任何清单引用的数据块，返回释放的字节数
+
+        最近写入的数据块可能属于正在创建的备份（清单尚未写入），不做清理。
+        """
+        referenced: Set[str] = set()
+        for manifest in self.manifests():
+            referenced.update(digest for digest, _ in manifest["chunks"])
+
+        freed = 0
+        now = time.time()
+        for chunk_path in self.chunk_dir.glob("*/*.*"):
+            digest = chunk_path.name.split(".", 1)[0]
+            if not digest or digest in referenced:
+                continue
+            stat = chunk_path.stat()
+            if now - stat.st_mtime < min_age:
+                continue
+            chunk_path.unlink()
+            freed += stat.st_size
+        return freed
+
+    def physical_size(self) -> int:
+        """数据块实际占用的磁盘空间"""
+        return sum(path.stat().st_size for path in self.chunk_dir.glob("*/*.*") if not path.name.startswith("."))
+
+    def usage(self) -> Dict[str, int]:
+        """所有分块备份的逻辑大小合计与实际占用空间"""
+        return {
+            "logical_size": sum(manifest["size"] for manifest in self.manifests()),
+            "physical_size": self.physical_size(),
+        }
+
+
+# 创建全局备份存储实例
+backup_archive = BackupArchive("backups")
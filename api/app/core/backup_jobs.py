@@ -0,0 +1,286 @@
+"""
+后台任务引擎 - 备份等耗时操作在后台执行，通过任务状态接口查询进度
+
+数据库复制在工作线程中使用 SQLite 备份API分批进行（pages/sleep），
+每批之间释放源数据库，不阻塞事件循环，也不会长时间阻塞正常的读写请求；
+PostgreSQL 在一致性快照中流式 COPY 导出（见 postgres_backend）。
+任务类型通过 register 注册，同一分组（默认为任务类型本身）同时只允许一个任务运行。
+
+多 worker 部署时任务状态定期发布到共享状态，任意 worker 都能查询进度；
+分组互斥通过共享锁实现，持有锁的 worker 退出后锁自动过期。
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from app.config import settings
+from app.core.shared_state import shared_state
+
+logger = logging.getLogger(__name__)
+
+# 保留的已结束任务数
+JOB_HISTORY_LIMIT = 50
+
+# 运行中任务发布状态的间隔、共享状态中任务状态和分组锁的有效期（秒）
+JOB_PUBLISH_INTERVAL = 2
+JOB_STATE_TTL = 24 * 3600
+JOB_LOCK_TTL = 60
+
+# 每批复制的页数及批次间隔（秒），间隔期间其他连接可以写入
+BACKUP_PAGES = 256
+BACKUP_SLEEP = 0.005
+
+
+class JobStatus:
+    """任务状态常量"""
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class JobConflictError(RuntimeError):
+    """同组任务正在运行"""
+
+
+class Job:
+    """后台任务"""
+
+    def __init__(self, kind: str, params: Dict[str, Any], created_by: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.created_by = created_by
+        self.group: Optional[str] = None
+        self.status = JobStatus.PENDING
+        self.progress = 0.0
+        self.stage: Optional[str] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JobStatus.COMPLETED, JobStatus.FAILED)
+
+    def update(self, progress: Optional[float] = None, stage: Optional[str] = None):
+        """更新进度（百分比）和当前阶段，可在工作线程中调用"""
+        if progress is not None:
+            self.progress = round(min(max(progress, 0.0), 100.0), 1)
+        if stage is not None:
+            self.stage = stage
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "stage": self.stage,
+            "result": self.result,
+            "error": self.error,
+            "created_by": self.created_by,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Job":
+        """从共享状态还原其他 worker 上的任务（只读）"""
+        def parse(value: Optional[str]) -> Optional[datetime]:
+            return datetime.fromisoformat(value) if value else None
+
+        job = cls(data["kind"], {}, data.get("created_by"))
+        job.id = data["id"]
+        job.status = data["status"]
+        job.progress = data["progress"]
+        job.stage = data.get("stage")
+        job.result = data.get("result")
+        job.error = data.get("error")
+        job.created_at = parse(data["created_at"])
+        job.started_at = parse(data.get("started_at"))
+        job.finished_at = parse(data.get("finished_at"))
+        return job
+
+
+JobHandler = Callable[..., Awaitable[Any]]
+
+
+class JobManager:
+    """后台任务管理器"""
+
+    def __init__(self):
+        self._handlers: Dict[str, Tuple[JobHandler, Optional[str]]] = {}
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._tasks: Set[asyncio.Task] = set()
+        # 同一时间只复制一份数据库，避免多个任务同时大量读盘
+        self.database_lock = asyncio.Lock()
+
+    def register(self, kind: str, handler: JobHandler, group: Optional[str] = None, exclusive: bool = True):
+        """
+        注册任务类型，handler(job, **params) 的返回值作为任务结果
+
+        group 相同的任务互斥（默认按任务类型），exclusive=False 时不限制并发。
+        """
+        self._handlers[kind] = (handler, (group or kind) if exclusive else None)
+
+    def running(self, kind: Optional[str] = None) -> List[Job]:
+        return [job for job in self._jobs.values() if not job.finished and (kind is None or job.kind == kind)]
+
+    def _group_running(self, group: str) -> List[Job]:
+        return [job for job in self.running() if self._handlers[job.kind][1] == group]
+
+    def submit(self, kind: str, created_by: Optional[str] = None, **params) -> Job:
+        """提交任务并立即返回，任务在后台执行"""
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job type: {kind}")
+        handler, group = self._handlers[kind]
+        job = Job(kind, params, created_by)
+        if group:
+            conflicts = self._group_running(group)
+            if conflicts:
+                raise JobConflictError(f"A {conflicts[0].kind} job is already running")
+            if not shared_state.acquire(f"job-group:{group}", job.id, JOB_LOCK_TTL):
+                raise JobConflictError(f"A {group} job is already running in another worker")
+            job.group = group
+
+        self._jobs[job.id] = job
+        self._publish(job)
+        self._trim()
+
+        task = asyncio.create_task(self._run(job, handler))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def _publish(self, job: Job):
+        """发布任务状态，并为运行中的任务续期分组锁（单 worker 部署无需发布）"""
+        if not shared_state.is_shared:
+            return
+        shared_state.put("jobs", job.id, job.to_dict(), JOB_STATE_TTL)
+        if job.group and not job.finished:
+            shared_state.refresh(f"job-group:{job.group}", job.id, JOB_LOCK_TTL)
+
+    async def _heartbeat(self, job: Job):
+        while True:
+            await asyncio.sleep(JOB_PUBLISH_INTERVAL)
+            self._publish(job)
+
+    async def _run(self, job: Job, handler: JobHandler):
+        job.status = JobStatus.RUNNING
+        job.started_at = datetime.now()
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            job.result = await handler(job, **job.params)
+            job.status = JobStatus.COMPLETED
+            job.update(progress=100)
+        except Exception as e:
+            job.status = JobStatus.FAILED
+            job.error = str(e)
+            logger.exception(f"后台任务失败: {job.kind} {job.id}")
+        finally:
+            job.finished_at = datetime.now()
+            heartbeat.cancel()
+            self._publish(job)
+            if job.group:
+                shared_state.release(f"job-group:{job.group}", job.id)
+
+    def _trim(self):
+        """只保留最近的已结束任务"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(len(finished) - JOB_HISTORY_LIMIT, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """本进程的任务，或其他 worker 发布到共享状态中的任务"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            data = shared_state.get("jobs", job_id)
+            job = Job.from_dict(data) if data else None
+        return job
+
+    def list(self, kind: Optional[str] = None) -> List[Job]:
+        """任务列表（包括其他 worker 的任务），最新的在前"""
+        jobs = dict(self._jobs)
+        if shared_state.is_shared:
+            for job_id, data in shared_state.all("jobs").items():
+                if job_id not in jobs:
+                    jobs[job_id] = Job.from_dict(data)
+        ordered = sorted(jobs.values(), key=lambda job: job.created_at, reverse=True)
+        return [job for job in ordered if kind is None or job.kind == kind][:JOB_HISTORY_LIMIT]
+
+
+def backup_extension() -> str:
+    """当前数据库的备份文件扩展名"""
+    from app.core.postgres_backend import is_postgres
+
+    return ".pgdump" if is_postgres() else ".sqlite3"
+
+
+def database_path() -> str:
+    """从 DATABASE_URL 解析 SQLite 数据库文件路径"""
+    url = settings.DATABASE_URL
+    if not url.startswith("sqlite://"):
+        raise ValueError("Online backup is only supported for SQLite databases")
+    return url[len("sqlite://"):].split("?", 1)[0]
+
+
+def _copy_sqlite(source: str, dest: Path, job: Job, span: Tuple[float, float], pages: int, sleep: float):
+    """在工作线程中分批复制数据库，先写临时文件，完成后再重命名"""
+    tmp_path = dest.with_name(f".{dest.name}.tmp")
+    start, end = span
+
+    def progress(status, remaining, total):
+        if total:
+            job.update(progress=start + (end - start) * (total - remaining) / total)
+
+    source_conn = sqlite3.connect(source)
+    try:
+        backup_conn = sqlite3.connect(str(tmp_path))
+        try:
+            source_conn.backup(backup_conn, pages=pages, progress=progress, sleep=sleep)
+        finally:
+            backup_conn.close()
+    except Exception:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    finally:
+        source_conn.close()
+    os.replace(tmp_path, dest)
+
+
+async def copy_database(
+    job: Job,
+    dest: Path,
+    span: Tuple[float, float] = (0.0, 100.0),
+    pages: int = BACKUP_PAGES,
+    sleep: float = BACKUP_SLEEP,
+) -> int:
+    """在线复制当前数据库到 dest，进度映射到 span 区间，返回文件大小"""
+    from app.core.postgres_backend import dump_database, is_postgres
+
+    if is_postgres():
+        job.update(stage="copying")
+        async with job_manager.database_lock:
+            return await dump_database(job, dest, span)
+
+    source = database_path()
+    if not os.path.exists(source):
+        raise FileNotFoundError("Database file not found")
+
+    job.update(stage="copying")
+    async with job_manager.database_lock:
+        await asyncio.to_thread(_copy_sqlite, source, dest, job, span, pages, sleep)
+    return dest.stat().st_size
+
+
+# 创建全局任务管理器实例
+job_manager = JobManager()
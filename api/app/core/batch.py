@@ -0,0 +1,328 @@
+"""
+批量操作实现 - 基于集合的批量写入，在单个事务中完成
+"""
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Type
+from tortoise import timezone
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import Q
+from tortoise.functions import Count
+from tortoise.models import Model
+from tortoise.transactions import in_transaction
+from app.models.question import Question
+from app.schemas.common import BatchOperationResponse
+
+logger = logging.getLogger(__name__)
+
+# 每批写入的行数，避免单条语句过大
+BULK_BATCH_SIZE = 500
+
+# 复制试题时从原题读取的字段
+QUESTION_COPY_FIELDS = (
+    "id", "title", "content", "answer", "difficulty", "question_type",
+    "semester_id", "grade_id", "subject_id", "category_id",
+    "is_active", "tags", "source", "author",
+)
+
+# 预留新试题ID：PostgreSQL 从自增序列取号，SQLite 读取自增计数
+NEXT_QUESTION_IDS_SQL = """SELECT nextval(pg_get_serial_sequence('questions', 'id')) AS "id" FROM generate_series(1, $1)"""
+QUESTION_SEQUENCE_SQL = """SELECT "seq" FROM "sqlite_sequence" WHERE "name" = 'questions'"""
+
+
+class CopyConflictError(RuntimeError):
+    """复制期间有其他写入占用了预留的试题ID"""
+
+
+async def _reserve_question_ids(conn, count: int) -> List[int]:
+    """
+    在事务内为新试题预留 count 个ID（升序）
+
+    bulk_create 不返回新记录的ID，因此写入前预留ID并显式赋值，新旧ID的对应关系不依赖写入后的查询：
+    - PostgreSQL：从自增序列取号，并发事务不会取到相同的ID
+    - SQLite：写入由数据库锁串行执行，从当前最大ID（含已删除记录的自增计数）之后依次分配
+    """
+    if conn.capabilities.dialect == "postgres":
+        rows = await conn.execute_query_dict(NEXT_QUESTION_IDS_SQL, [count])
+        return sorted(row["id"] for row in rows)
+
+    last_ids = await Question.all().using_db(conn).order_by("-id").limit(1).values_list("id", flat=True)
+    rows = await conn.execute_query_dict(QUESTION_SEQUENCE_SQL)
+    last_id = max([*last_ids, *(row["seq"] for row in rows), 0])
+    return list(range(last_id + 1, last_id + count + 1))
+
+
+async def copy_questions(
+    question_ids: List[int],
+    target_semester_id: Optional[int] = None,
+    target_grade_id: Optional[int] = None,
+    target_subject_id: Optional[int] = None,
+    target_category_id: Optional[int] = None,
+    title_suffix: str = " (副本)",
+) -> Dict[int, int]:
+    """
+    批量复制试题，返回 原题ID -> 新题ID 的映射
+
+    所有副本在同一个事务中通过 bulk_create 写入，任一失败则全部回滚。
+    """
+    async with in_transaction("default") as conn:
+        originals = await Question.filter(id__in=question_ids).using_db(conn).order_by("id").values(
+            *QUESTION_COPY_FIELDS
+        )
+        if not originals:
+            return {}
+
+        new_ids = await _reserve_question_ids(conn, len(originals))
+        copies = [
+            Question(
+                id=new_id,
+                title=f"{original['title']}{title_suffix}",
+                content=original["content"],
+                answer=original["answer"],
+                difficulty=original["difficulty"],
+                question_type=original["question_type"],
+                semester_id=target_semester_id or original["semester_id"],
+                grade_id=target_grade_id or original["grade_id"],
+                subject_id=target_subject_id or original["subject_id"],
+                category_id=target_category_id or original["category_id"],
+                is_active=original["is_active"],
+                is_published=False,  # 复制的题目默认未发布
+                tags=original["tags"],
+                source=original["source"],
+                author=original["author"],
+                view_count=0  # 重置查看次数
+            )
+            for original, new_id in zip(originals, new_ids)
+        ]
+        try:
+            await Question.bulk_create(copies, batch_size=BULK_BATCH_SIZE, using_db=conn)
+        except IntegrityError as e:
+            # 预留的ID被并发写入占用（仅 SQLite 多进程同时写入时可能发生），整体回滚
+            raise CopyConflictError("Questions were modified concurrently, please retry") from e
+
+    logger.debug(f"批量复制试题完成: {len(new_ids)} 条")
+    return {original["id"]: new_id for original, new_id in zip(originals, new_ids)}
+
+
+def _unique_value(candidate: str, taken: Set[str]) -> str:
+    """在已占用集合中为候选值追加序号，直到唯一"""
+    value = candidate
+    counter = 1
+    while value in taken:
+        value = f"{candidate}_{counter}"
+        counter += 1
+    taken.add(value)
+    return value
+
+
+class BatchEngine:
+    """
+    基础数据批量操作引擎
+
+    - ID 校验只查询一次
+    - 更新使用一条 UPDATE ... WHERE id IN (...)
+    - 删除前的依赖检查使用分组聚合查询
+    - 所有写操作在单个事务中完成，失败则整体回滚
+    """
+
+    # 任何批量操作都不允许修改的字段
+    ALWAYS_PROTECTED = ("id", "created_at", "updated_at")
+
+    def __init__(
+        self,
+        model: Type[Model],
+        label: str,
+        protected_fields: Sequence[str] = (),
+        unique_fields: Sequence[str] = (),
+        unique_scope: Optional[str] = None,
+        dependencies: Sequence[Tuple[Type[Model], str, str]] = (),
+        on_change: Optional[Callable[[], None]] = None,
+    ):
+        """
+        :param model: 操作的模型
+        :param label: 错误信息中使用的名称，如 "Semester"
+        :param protected_fields: 批量更新时忽略的额外字段
+        :param unique_fields: 复制时需要保证唯一的字段（如 name、code）
+        :param unique_scope: 唯一约束的作用范围字段（如分类的 subject_id）
+        :param dependencies: 删除前检查的依赖 (依赖模型, 外键字段, 错误信息)，
+                             错误信息可使用 {count} 占位符
+        :param on_change: 有数据写入后的回调，如使快照失效
+        """
+        self.model = model
+        self.label = label
+        self.protected_fields = set(self.ALWAYS_PROTECTED) | set(protected_fields)
+        self.unique_fields = tuple(unique_fields)
+        self.unique_scope = unique_scope
+        self.dependencies = tuple(dependencies)
+        self.on_change = on_change
+
+    @property
+    def data_fields(self) -> List[str]:
+        """可写入的字段（外键使用 *_id 形式）"""
+        return [
+            field for field in self.model._meta.fields_db_projection
+            if field != self.model._meta.pk_attr and field not in self.ALWAYS_PROTECTED
+        ]
+
+    def _result(self, action: str, total: int, success: int, failed_items: List[dict]) -> BatchOperationResponse:
+        if success and self.on_change:
+            self.on_change()
+        return BatchOperationResponse(
+            success_count=success,
+            failed_count=len(failed_items),
+            total_count=total,
+            message=f"批量{action}完成：成功 {success} 个，失败 {len(failed_items)} 个",
+            failed_items=failed_items
+        )
+
+    async def _load(self, ids: Iterable[int], fields: Sequence[str] = ()) -> Tuple[List[int], Dict[int, dict], List[dict]]:
+        """一次查询加载记录，返回 (去重后的ID, 已存在的记录, 不存在的失败项)"""
+        unique_ids = list(dict.fromkeys(ids))
+        rows = await self.model.filter(id__in=unique_ids).values("id", *fields) if unique_ids else []
+        found = {row["id"]: row for row in rows}
+        failed_items = [
+            {"id": item_id, "error": f"{self.label} not found"}
+            for item_id in unique_ids if item_id not in found
+        ]
+        return unique_ids, found, failed_items
+
+    @staticmethod
+    def _reject(unique_ids: List[int], found: Dict[int, dict], reject: Optional[Dict[str, str]]) -> Tuple[List[int], List[dict]]:
+        """按记录字段过滤不允许操作的项，如系统角色"""
+        allowed = []
+        failed_items = []
+        for item_id in unique_ids:
+            row = found.get(item_id)
+            if row is None:
+                continue
+            error = next((message for field, message in (reject or {}).items() if row.get(field)), None)
+            if error:
+                failed_items.append({"id": item_id, "error": error})
+            else:
+                allowed.append(item_id)
+        return allowed, failed_items
+
+    async def update(
+        self,
+        ids: List[int],
+        update_data: dict,
+        reject: Optional[Dict[str, str]] = None,
+        action: str = "更新",
+    ) -> BatchOperationResponse:
+        """批量更新"""
+        unique_ids, found, failed_items = await self._load(ids, tuple(reject or ()))
+        allowed, rejected = self._reject(unique_ids, found, reject)
+        failed_items.extend(rejected)
+
+        writable = set(self.data_fields) - self.protected_fields
+        values = {field: value for field, value in update_data.items() if field in writable}
+        if "updated_at" in self.model._meta.fields_map:
+            values["updated_at"] = timezone.now()
+
+        success = 0
+        if allowed:
+            try:
+                async with in_transaction("default") as conn:
+                    await self.model.filter(id__in=allowed).using_db(conn).update(**values)
+                success = len(allowed)
+            except Exception as e:
+                failed_items.extend({"id": item_id, "error": str(e)} for item_id in allowed)
+
+        return self._result(action, len(ids), success, failed_items)
+
+    async def _dependency_errors(self, ids: List[int], conn) -> Dict[int, str]:
+        """使用分组聚合查询检查依赖，返回 {id: 错误信息}"""
+        errors: Dict[int, str] = {}
+        for dep_model, fk_field, message in self.dependencies:
+            rows = await dep_model.filter(**{f"{fk_field}__in": ids}).using_db(conn).annotate(
+                count=Count("id")
+            ).group_by(fk_field).values(fk_field, "count")
+            for row in rows:
+                if row["count"] and row[fk_field] not in errors:
+                    errors[row[fk_field]] = message.format(count=row["count"])
+        return errors
+
+    async def delete(
+        self,
+        ids: List[int],
+        reject: Optional[Dict[str, str]] = None,
+    ) -> Tuple[BatchOperationResponse, List[dict]]:
+        """批量删除，返回 (结果, 已删除的记录)"""
+        unique_ids, found, failed_items = await self._load(ids, ("name", "code", *(reject or ())))
+        allowed, rejected = self._reject(unique_ids, found, reject)
+        failed_items.extend(rejected)
+
+        deleted: List[dict] = []
+        if allowed:
+            try:
+                async with in_transaction("default") as conn:
+                    blocked = await self._dependency_errors(allowed, conn)
+                    failed_items.extend({"id": item_id, "error": blocked[item_id]} for item_id in allowed if item_id in blocked)
+                    to_delete = [item_id for item_id in allowed if item_id not in blocked]
+                    if to_delete:
+                        await self.model.filter(id__in=to_delete).using_db(conn).delete()
+                deleted = [found[item_id] for item_id in to_delete]
+            except Exception as e:
+                failed_items = [item for item in failed_items if item["id"] not in allowed]
+                failed_items.extend({"id": item_id, "error": str(e)} for item_id in allowed)
+
+        return self._result("删除", len(ids), len(deleted), failed_items), deleted
+
+    async def _taken_values(self, sources: List[dict], conn) -> Dict[Tuple, Set[str]]:
+        """一次查询取出可能冲突的唯一字段值，按 (作用域, 字段) 分组"""
+        taken: Dict[Tuple, Set[str]] = {}
+        if not self.unique_fields:
+            return taken
+
+        conditions = []
+        for source in sources:
+            for field in self.unique_fields:
+                prefix = Q(**{f"{field}__startswith": source[field]})
+                if self.unique_scope:
+                    prefix &= Q(**{self.unique_scope: source[self.unique_scope]})
+                conditions.append(prefix)
+
+        scope_fields = (self.unique_scope,) if self.unique_scope else ()
+        rows = await self.model.filter(Q(*conditions, join_type="OR")).using_db(conn).values(
+            *scope_fields, *self.unique_fields
+        )
+        for row in rows:
+            scope = row[self.unique_scope] if self.unique_scope else None
+            for field in self.unique_fields:
+                taken.setdefault((scope, field), set()).add(row[field])
+        return taken
+
+    async def copy(
+        self,
+        ids: List[int],
+        copy_count: int = 1,
+        name_suffix: str = "_副本",
+    ) -> BatchOperationResponse:
+        """批量复制，name 追加后缀，code 追加 _copy，并保证唯一字段不冲突"""
+        fields = self.data_fields
+        unique_ids, found, failed_items = await self._load(ids, fields)
+        sources = [found[item_id] for item_id in unique_ids if item_id in found]
+
+        success = 0
+        if sources:
+            try:
+                async with in_transaction("default") as conn:
+                    taken = await self._taken_values(sources, conn)
+                    copies = []
+                    for source in sources:
+                        scope = source[self.unique_scope] if self.unique_scope else None
+                        for i in range(copy_count):
+                            data = {field: source[field] for field in fields}
+                            index = f"_{i+1}" if copy_count > 1 else ""
+                            if "name" in data:
+                                data["name"] = f"{source['name']}{name_suffix}{index}"
+                            if "code" in data:
+                                data["code"] = f"{source['code']}_copy{index}"
+                            for field in self.unique_fields:
+                                data[field] = _unique_value(data[field], taken.setdefault((scope, field), set()))
+                            copies.append(self.model(**data))
+                    await self.model.bulk_create(copies, batch_size=BULK_BATCH_SIZE, using_db=conn)
+                success = len(copies)
+            except Exception as e:
+                failed_items.extend({"id": source["id"], "error": str(e)} for source in sources)
+
+        return self._result("复制", len(ids) * copy_count, success, failed_items)
@@ -1,6 +1,7 @@
 """
 Redis缓存实现
 """
+import asyncio
 import json
 import logging
 import hashlib
@@ -13,19 +14,26 @@ logger = logging.getLogger(__name__)
 
 
 class CacheManager:
-    """缓存管理器 - 支持Redis和内存缓存回退"""
+    """
+    缓存管理器 - 支持Redis和内存缓存回退
+
+    Redis在应用启动后连接（connect_in_background），导入模块时不访问网络。
+    多 worker 部署时各进程的内存缓存无法互相失效，因此只使用Redis，
+    不回退到内存缓存。
+    """
     
     def __init__(self):
         self.redis_client = None
         self.memory_cache = {}
         self.memory_cache_ttl = {}
-        self._init_redis()
+        self.memory_cache_enabled = settings.WEB_CONCURRENCY <= 1
+        self._connecting = None
     
-    def _init_redis(self):
-        """初始化Redis连接"""
+    def connect(self):
+        """连接Redis（阻塞，最长等待连接超时时间）"""
         if settings.REDIS_URL:
             try:
-                self.redis_client = Redis.from_url(
+                client = Redis.from_url(
                     settings.REDIS_URL,
                     decode_responses=True,
                     socket_connect_timeout=5,
@@ -34,13 +42,30 @@ class CacheManager:
                     health_check_interval=30
                 )
                 # 测试连接
-                self.redis_client.ping()
+                client.ping()
+                # 连接前写入的内存缓存不会随Redis中的数据失效，直接丢弃
+                self.memory_cache, self.memory_cache_ttl = {}, {}
+                self.redis_client = client
                 logger.info("Redis连接成功")
             except (ConnectionError, RedisError) as e:
                 logger.warning(f"Redis连接失败，将使用内存缓存: {e}")
                 self.redis_client = None
         else:
             logger.info("未配置Redis，使用内存缓存")
+        if self.redis_client is None and not self.memory_cache_enabled:
+            logger.warning(f"{settings.WEB_CONCURRENCY} 个 worker 未配置Redis，缓存已禁用")
+
+    def connect_in_background(self):
+        """在工作线程中连接Redis，不阻塞启动；连接成功前使用内存缓存"""
+        if self._connecting is None:
+            self._connecting = asyncio.get_running_loop().run_in_executor(None, self.connect)
+
+    def close(self):
+        """关闭Redis连接"""
+        if self.redis_client is not None:
+            self.redis_client.close()
+            self.redis_client = None
+        self._connecting = None
     
     def _get_cache_key(self, endpoint: str, params: dict) -> str:
         """生成缓存键"""
@@ -144,6 +169,8 @@ class CacheManager:
         """从内存缓存获取数据"""
         import time
         
+        if not self.memory_cache_enabled:
+            return None
         if cache_key in self.memory_cache:
             if cache_key in self.memory_cache_ttl and time.time() < self.memory_cache_ttl[cache_key]:
                 return self.memory_cache[cache_key]
@@ -157,6 +184,8 @@ class CacheManager:
         """设置内存缓存"""
         import time
         
+        if not self.memory_cache_enabled:
+            return
         self.memory_cache[cache_key] = data
         self.memory_cache_ttl[cache_key] = time.time() + ttl_seconds
         logger.debug(f"内存缓存设置成功: {cache_key}")
@@ -172,6 +201,7 @@ class CacheManager:
         """获取缓存统计信息"""
         stats = {
             "redis_connected": self.redis_client is not None,
+            "memory_cache_enabled": self.memory_cache_enabled,
             "memory_cache_size": len(self.memory_cache)
         }
         
@@ -194,7 +224,7 @@ class CacheManager:
         health = {
             "cache_status": "healthy",
             "redis_status": "disconnected",
-            "memory_cache_status": "active"
+            "memory_cache_status": "active" if self.memory_cache_enabled else "disabled"
         }
         
         if self.redis_client:
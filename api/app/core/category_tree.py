@@ -0,0 +1,209 @@
+"""
+分类层级实现 - 基于闭包表，一次查询即可取出整棵子树
+"""
+import logging
+from typing import Dict, List, Optional
+from tortoise.expressions import Subquery
+from tortoise.transactions import in_transaction
+from app.models.category import Category, CategoryClosure
+
+logger = logging.getLogger(__name__)
+
+# 分类树节点返回的字段
+TREE_FIELDS = (
+    "id", "name", "code", "subject_id", "parent_id", "level",
+    "is_active", "sort_order", "description", "created_at", "updated_at",
+)
+
+
+class CategoryTreeError(ValueError):
+    """分类层级操作错误（如移动到自身子树下）"""
+
+
+class CategoryTree:
+    """分类层级管理器"""
+
+    @staticmethod
+    def descendant_ids(category_id: int) -> Subquery:
+        """分类自身及所有后代ID的子查询，可直接用于 category_id__in 过滤"""
+        return Subquery(CategoryClosure.filter(ancestor_id=category_id).values("descendant_id"))
+
+    @staticmethod
+    async def get_descendant_ids(category_id: int, using_db=None) -> List[int]:
+        """获取分类自身及所有后代ID"""
+        return list(await CategoryClosure.filter(ancestor_id=category_id).using_db(using_db).values_list(
+            "descendant_id", flat=True
+        ))
+
+    @staticmethod
+    async def rebuild() -> int:
+        """根据 parent_id 全量重建闭包表和 level，返回写入的关系数"""
+        async with in_transaction("default") as conn:
+            rows = await Category.all().using_db(conn).values("id", "parent_id", "level")
+            parents = {row["id"]: row["parent_id"] for row in rows}
+
+            links = []
+            levels: Dict[int, int] = {}
+            for category_id in parents:
+                depth = 0
+                node = category_id
+                visited = set()
+                # 沿 parent_id 向上走到根，遇到环或悬空父节点时停止
+                while node is not None and node in parents and node not in visited:
+                    visited.add(node)
+                    links.append(CategoryClosure(ancestor_id=node, descendant_id=category_id, depth=depth))
+                    node = parents[node]
+                    depth += 1
+                levels[category_id] = depth
+
+            await CategoryClosure.all().using_db(conn).delete()
+            await CategoryClosure.bulk_create(links, batch_size=1000, using_db=conn)
+
+            # level 与实际深度不一致时修正
+            for row in rows:
+                if row["level"] != levels[row["id"]]:
+                    await Category.filter(id=row["id"]).using_db(conn).update(level=levels[row["id"]])
+
+        logger.info(f"分类闭包表重建完成: {len(parents)} 个分类, {len(links)} 条关系")
+        return len(links)
+
+    @staticmethod
+    async def ensure_built():
+        """启动时检查闭包表，缺失关系时重建（兼容升级前的数据）"""
+        category_count = await Category.all().count()
+        self_link_count = await CategoryClosure.filter(depth=0).count()
+        if category_count != self_link_count:
+            await CategoryTree.rebuild()
+
+    @staticmethod
+    async def link_missing(using_db=None) -> int:
+        """为尚未写入闭包表的分类补齐关系（如批量复制产生的新分类）"""
+        missing = await Category.exclude(
+            id__in=Subquery(CategoryClosure.filter(depth=0).values("descendant_id"))
+        ).using_db(using_db).order_by("level", "id").values("id", "parent_id")
+        if not missing:
+            return 0
+
+        parent_ids = {row["parent_id"] for row in missing if row["parent_id"]}
+        ancestors: Dict[int, List[dict]] = {}
+        if parent_ids:
+            for link in await CategoryClosure.filter(descendant_id__in=parent_ids).using_db(using_db).values(
+                "ancestor_id", "descendant_id", "depth"
+            ):
+                ancestors.setdefault(link["descendant_id"], []).append(link)
+
+        links = []
+        for row in missing:
+            links.append(CategoryClosure(ancestor_id=row["id"], descendant_id=row["id"], depth=0))
+            for link in ancestors.get(row["parent_id"], []):
+                links.append(CategoryClosure(
+                    ancestor_id=link["ancestor_id"], descendant_id=row["id"], depth=link["depth"] + 1
+                ))
+            # 同批新增的分类之间存在父子关系时，让后续节点也能找到祖先
+            ancestors[row["id"]] = [
+                {"ancestor_id": link.ancestor_id, "depth": link.depth}
+                for link in links if link.descendant_id == row["id"]
+            ]
+
+        await CategoryClosure.bulk_create(links, batch_size=1000, using_db=using_db)
+        return len(links)
+
+    @staticmethod
+    async def insert_node(category: Category, using_db=None):
+        """新建分类后写入闭包关系，并按父分类修正 level"""
+        links = [CategoryClosure(ancestor_id=category.id, descendant_id=category.id, depth=0)]
+        level = 1
+        if category.parent_id:
+            parent_links = await CategoryClosure.filter(descendant_id=category.parent_id).using_db(using_db).values(
+                "ancestor_id", "depth"
+            )
+            links.extend(
+                CategoryClosure(ancestor_id=link["ancestor_id"], descendant_id=category.id, depth=link["depth"] + 1)
+                for link in parent_links
+            )
+            level = len(parent_links) + 1
+
+        await CategoryClosure.bulk_create(links, using_db=using_db)
+        if category.level != level:
+            category.level = level
+            await Category.filter(id=category.id).using_db(using_db).update(level=level)
+
+    @staticmethod
+    async def move(category_id: int, new_parent_id: Optional[int]):
+        """移动分类（连同子树）到新的父分类下"""
+        async with in_transaction("default") as conn:
+            subtree = await CategoryClosure.filter(ancestor_id=category_id).using_db(conn).values(
+                "descendant_id", "depth"
+            )
+            subtree_ids = [row["descendant_id"] for row in subtree]
+            if new_parent_id is not None and new_parent_id in subtree_ids:
+                raise CategoryTreeError("Cannot move category under itself or its descendants")
+
+            # 断开子树与原祖先的关系
+            await CategoryClosure.filter(
+                descendant_id__in=subtree_ids
+            ).exclude(ancestor_id__in=subtree_ids).using_db(conn).delete()
+
+            # 连接到新父分类的所有祖先
+            base_level = 1
+            if new_parent_id is not None:
+                parent_links = await CategoryClosure.filter(descendant_id=new_parent_id).using_db(conn).values(
+                    "ancestor_id", "depth"
+                )
+                await CategoryClosure.bulk_create([
+                    CategoryClosure(
+                        ancestor_id=parent_link["ancestor_id"],
+                        descendant_id=node["descendant_id"],
+                        depth=parent_link["depth"] + node["depth"] + 1
+                    )
+                    for parent_link in parent_links
+                    for node in subtree
+                ], batch_size=1000, using_db=conn)
+                base_level = len(parent_links) + 1
+
+            await Category.filter(id=category_id).using_db(conn).update(parent_id=new_parent_id)
+
+            # 按相对深度批量更新 level
+            by_depth: Dict[int, List[int]] = {}
+            for node in subtree:
+                by_depth.setdefault(node["depth"], []).append(node["descendant_id"])
+            for depth, ids in by_depth.items():
+                await Category.filter(id__in=ids).using_db(conn).update(level=base_level + depth)
+
+    @staticmethod
+    async def delete_subtree(category_id: int) -> int:
+        """删除分类及其所有后代，返回删除的分类数"""
+        async with in_transaction("default") as conn:
+            subtree_ids = await CategoryTree.get_descendant_ids(category_id, using_db=conn)
+            if category_id not in subtree_ids:
+                subtree_ids.append(category_id)
+            await CategoryClosure.filter(descendant_id__in=subtree_ids).using_db(conn).delete()
+            return await Category.filter(id__in=subtree_ids).using_db(conn).delete()
+
+    @staticmethod
+    async def get_tree(
+        root_id: Optional[int] = None,
+        subject_id: Optional[int] = None,
+        is_active: Optional[bool] = None,
+    ) -> List[dict]:
+        """一次查询取出整棵（子）树并组装为嵌套结构"""
+        query = Category.all()
+        if root_id is not None:
+            query = query.filter(id__in=CategoryTree.descendant_ids(root_id))
+        if subject_id is not None:
+            query = query.filter(subject_id=subject_id)
+        if is_active is not None:
+            query = query.filter(is_active=is_active)
+
+        rows = await query.order_by("level", "sort_order", "id").values(*TREE_FIELDS)
+
+        nodes = {row["id"]: {**row, "children": []} for row in rows}
+        roots = []
+        for node in nodes.values():
+            parent = nodes.get(node["parent_id"])
+            if node["id"] == root_id or node["parent_id"] is None:
+                roots.append(node)
+            elif parent is not None:
+                parent["children"].append(node)
+            # 父节点被过滤掉（如已停用）的节点不再展示
+        return roots
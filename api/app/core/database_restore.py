@@ -0,0 +1,177 @@
+"""
+在线恢复数据库 - 不重启进程替换当前数据库
+
+1. 在停顿之前准备好待恢复的数据库文件（分块备份先重组）并做完整性检查
+2. 在线备份当前数据库作为安全备份
+3. 持有所有 Tortoise 连接（写连接和只读连接）的锁使其停顿：等待进行中的查询和事务结束，新的查询排队等待
+4. 使用 SQLite 备份API 反向写入当前数据库（经由 SQLite 的锁和 WAL 写入，
+   其他进程的连接也能看到新数据），随后执行 WAL checkpoint
+5. 关闭连接（下次查询时重新建立）、释放锁，补齐表结构，清空缓存并重建派生数据
+   （数据库已替换，这一步失败时恢复结果带 warnings，不报告为失败）
+
+停顿时间只包括第 3、4 步，记录在恢复结果中。
+
+PostgreSQL 不需要停顿连接池：第 3、4 步由 postgres_backend.load_dump 在一个事务中完成，
+TRUNCATE 持有的表锁使其他查询等待到事务提交。
+"""
+import asyncio
+import logging
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+from tortoise.connection import connections
+from app.core.backup_archive import backup_archive
+from app.core.backup_jobs import Job, backup_extension, copy_database, database_path
+from app.core.postgres_backend import is_dump, is_postgres, load_dump
+from app.core.derived_data import reload_derived_data
+from app.migrate import migrate_schema
+
+logger = logging.getLogger(__name__)
+
+# 等待进行中的查询结束的最长时间（秒）
+QUIESCE_TIMEOUT = 30
+
+
+class RestoreError(RuntimeError):
+    """恢复失败（当前数据库未被修改）"""
+
+
+def _check_integrity(path: Path):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        result = conn.execute("PRAGMA quick_check").fetchone()
+    finally:
+        conn.close()
+    if not result or result[0] != "ok":
+        raise RestoreError(f"Backup failed integrity check: {result[0] if result else 'unknown'}")
+
+
+def _swap(source: Path, target: str):
+    """把 source 的内容通过备份API整体写入 target"""
+    source_conn = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    target_conn = sqlite3.connect(target, timeout=QUIESCE_TIMEOUT)
+    try:
+        source_conn.backup(target_conn)
+        target_conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        target_conn.close()
+        source_conn.close()
+
+
+async def restore_database(job: Job, backup_id: str, source: Optional[Path] = None) -> dict:
+    """
+    从备份恢复当前数据库，返回安全备份ID和各阶段耗时
+
+    backup_id 为分块备份ID；升级前的完整备份文件通过 source 传入。
+    """
+    postgres = is_postgres()
+    clients = connections.all()
+    locks: List[asyncio.Lock] = [getattr(client, "_lock", None) for client in clients]
+    if not postgres and None in locks:
+        raise RestoreError("Online restore is only supported for SQLite and PostgreSQL databases")
+
+    target = None if postgres else database_path()
+    staging_dir = Path("backups") / ".staging"
+    staging_dir.mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    timings = {}
+    started = time.monotonic()
+
+    # 准备待恢复的数据库文件
+    job.update(progress=5, stage="preparing")
+    staged = staging_dir / f"restore_{timestamp}{backup_extension()}"
+    try:
+        if source is None:
+            await asyncio.to_thread(backup_archive.restore_to, backup_id, staged)
+            source = staged
+        if is_dump(source) != postgres:
+            raise RestoreError("Backup was created from a different database backend")
+        if not postgres:
+            await asyncio.to_thread(_check_integrity, source)
+
+        # 在线备份当前数据库
+        job.update(progress=20, stage="safety_backup")
+        safety_id = f"safety_backup_before_restore_{timestamp}"
+        safety_path = staging_dir / f"{safety_id}{backup_extension()}"
+        try:
+            await copy_database(job, safety_path, span=(20, 50))
+            await asyncio.to_thread(
+                backup_archive.write, safety_id, safety_path, {"method": "safety", "created_by": job.created_by},
+                extension=backup_extension()
+            )
+        finally:
+            safety_path.unlink(missing_ok=True)
+        timings["prepare_seconds"] = round(time.monotonic() - started, 3)
+
+        if postgres:
+            job.update(progress=60, stage="swapping")
+            swap_started = time.monotonic()
+            await load_dump(job, source, span=(60, 85))
+            timings["quiesce_wait_seconds"] = 0.0
+            timings["downtime_seconds"] = round(time.monotonic() - swap_started, 3)
+        else:
+            await _swap_sqlite(job, source, target, clients, locks, timings)
+    finally:
+        staged.unlink(missing_ok=True)
+
+    # 数据库已被替换：之后的步骤失败也要继续执行，并报告为“已恢复但有警告”而不是失败
+    job.update(progress=85, stage="reloading")
+    reload_started = time.monotonic()
+    warnings = await _reload_after_swap()
+    timings["reload_seconds"] = round(time.monotonic() - reload_started, 3)
+    timings["total_seconds"] = round(time.monotonic() - started, 3)
+
+    logger.info(f"数据库已从备份恢复: {backup_id}, 停顿 {timings['downtime_seconds']} 秒")
+    result = {
+        "backup_id": backup_id,
+        "safety_backup": safety_id,
+        "status": "restored_with_warnings" if warnings else "restored",
+        **timings,
+    }
+    if warnings:
+        result["warnings"] = warnings
+    return result
+
+
+async def _reload_after_swap() -> List[str]:
+    """补齐恢复后数据库的表结构（旧备份可能缺少新版本的表和索引），清空缓存并重建派生数据，返回警告"""
+    warnings = []
+    try:
+        await migrate_schema()
+    except Exception as e:
+        logger.exception("恢复后补齐表结构失败")
+        warnings.append(f"Schema migration failed: {e}")
+    try:
+        await reload_derived_data()
+    except Exception as e:
+        logger.exception("恢复后重建派生数据失败")
+        warnings.append(f"Reloading caches and derived data failed: {e}")
+    return warnings
+
+
+async def _swap_sqlite(job: Job, source: Path, target: str, clients: list, locks: List[asyncio.Lock], timings: dict):
+    """停顿所有连接并替换 SQLite 数据库"""
+    job.update(progress=60, stage="quiescing")
+    quiesce_started = time.monotonic()
+    acquired: List[asyncio.Lock] = []
+    try:
+        for lock in locks:
+            remaining = QUIESCE_TIMEOUT - (time.monotonic() - quiesce_started)
+            try:
+                await asyncio.wait_for(lock.acquire(), timeout=max(remaining, 0))
+            except asyncio.TimeoutError:
+                raise RestoreError("Timed out waiting for in-flight database operations")
+            acquired.append(lock)
+        swap_started = time.monotonic()
+        timings["quiesce_wait_seconds"] = round(swap_started - quiesce_started, 3)
+        job.update(progress=70, stage="swapping")
+        await asyncio.to_thread(_swap, source, target)
+        # 丢弃旧连接，下次查询时重新连接
+        for client in clients:
+            await client.close()
+        timings["downtime_seconds"] = round(time.monotonic() - swap_started, 3)
+    finally:
+        for lock in acquired:
+            lock.release()
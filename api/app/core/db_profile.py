@@ -0,0 +1,167 @@
+"""
+数据库连接配置档 - 按运行环境为 SQLite 连接设置 PRAGMA，为 PostgreSQL 设置连接池
+
+Tortoise 的 SQLite 客户端在每次建立连接时依次执行 credentials 中的 PRAGMA，
+因此把配置档展开为 credentials 即可让所有新连接（包括恢复备份后重新建立的连接）生效。
+
+- journal_mode=WAL：读写互不阻塞
+- synchronous=NORMAL：WAL 模式下只在 checkpoint 时 fsync，掉电最多丢失最后几个事务
+- busy_timeout：遇到写锁时等待而不是立即报 "database is locked"
+- cache_size / mmap_size：加大页缓存，读操作直接访问内存映射，减少一次内存复制
+- temp_store=MEMORY：排序、临时索引使用内存
+
+PostgreSQL 使用 asyncpg 连接池，池大小、单连接最多执行的查询数、空闲连接回收时间
+和语句超时可配置，URL 查询参数优先。
+"""
+import re
+from typing import Any, Dict, Optional, Union
+from urllib.parse import parse_qsl, unquote, urlsplit
+from app.core.db_router import read_connection_names
+
+SQLITE_ENGINE = "tortoise.backends.sqlite"
+POSTGRES_ENGINE = "tortoise.backends.asyncpg"
+POSTGRES_SCHEMES = ("postgres", "postgresql", "asyncpg")
+
+# 各环境的 PRAGMA 配置，按顺序执行（journal_mode 必须最先设置）
+PROFILES: Dict[str, Dict[str, Union[str, int]]] = {
+    "development": {
+        "journal_mode": "WAL",
+        "journal_size_limit": 16384,
+        "foreign_keys": "ON",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -16384,  # 负数表示 KB，即 16MB
+        "temp_store": "MEMORY",
+    },
+    "production": {
+        "journal_mode": "WAL",
+        "journal_size_limit": 67108864,
+        "foreign_keys": "ON",
+        "synchronous": "NORMAL",
+        "busy_timeout": 15000,
+        "cache_size": -65536,  # 64MB
+        "mmap_size": 268435456,  # 256MB
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 1000,
+    },
+    # 测试和基准数据库可以随时重建，不需要持久性保证
+    "test": {
+        "journal_mode": "WAL",
+        "foreign_keys": "ON",
+        "synchronous": "OFF",
+        "busy_timeout": 5000,
+        "cache_size": -16384,
+        "temp_store": "MEMORY",
+    },
+}
+
+# PRAGMA 名称和值会拼接进 SQL，只允许简单的标识符和数字
+_PRAGMA_PATTERN = re.compile(r"^-?[A-Za-z0-9_]+$")
+
+
+class DatabaseProfileError(ValueError):
+    """数据库配置档或 PRAGMA 无效"""
+
+
+def sqlite_pragmas(profile: str, overrides: Optional[Dict[str, Union[str, int]]] = None) -> Dict[str, Union[str, int]]:
+    """返回配置档的 PRAGMA，overrides 中的同名项覆盖配置档"""
+    if profile not in PROFILES:
+        raise DatabaseProfileError(f"Unknown database profile: {profile}")
+    pragmas = dict(PROFILES[profile])
+    pragmas.update(overrides or {})
+    for name, value in pragmas.items():
+        if not (_PRAGMA_PATTERN.match(name) and _PRAGMA_PATTERN.match(str(value))):
+            raise DatabaseProfileError(f"Invalid SQLite pragma: {name}={value}")
+    return pragmas
+
+
+def _cast(value: str) -> Union[str, int, float]:
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def postgres_connection(url: str, pool: Optional[Dict[str, Any]] = None) -> dict:
+    """
+    PostgreSQL 连接配置
+
+    pool 支持 minsize、maxsize、max_queries、max_inactive_connection_lifetime
+    以及 statement_timeout（毫秒，0 表示不限制）。
+    """
+    parts = urlsplit(url)
+    options: Dict[str, Any] = {key: value for key, value in (pool or {}).items() if value is not None}
+    options.update({key: _cast(value) for key, value in parse_qsl(parts.query)})
+
+    server_settings = {"application_name": "hqxx-exam"}
+    statement_timeout = options.pop("statement_timeout", 0)
+    if statement_timeout:
+        server_settings["statement_timeout"] = str(statement_timeout)
+
+    return {
+        "engine": POSTGRES_ENGINE,
+        "credentials": {
+            "host": parts.hostname or "localhost",
+            "port": parts.port or 5432,
+            "user": unquote(parts.username or ""),
+            "password": unquote(parts.password or ""),
+            "database": parts.path.lstrip("/"),
+            "server_settings": server_settings,
+            **options,
+        },
+    }
+
+
+def tortoise_connection(
+    url: str,
+    profile: str,
+    overrides: Optional[Dict[str, Union[str, int]]] = None,
+    pool: Optional[Dict[str, Any]] = None,
+) -> Union[str, dict]:
+    """
+    生成 Tortoise 连接配置
+
+    SQLite 地址展开为带 PRAGMA 的 credentials，URL 查询参数优先于配置档；
+    PostgreSQL 展开为带连接池参数的 credentials；其他数据库原样返回地址。
+    """
+    if url.split("://", 1)[0] in POSTGRES_SCHEMES:
+        return postgres_connection(url, pool)
+    if not url.startswith("sqlite://"):
+        return url
+    path, _, query = url[len("sqlite://"):].partition("?")
+    pragmas = sqlite_pragmas(profile, {**(overrides or {}), **dict(parse_qsl(query))})
+    return {
+        "engine": SQLITE_ENGINE,
+        "credentials": {"file_path": path, **pragmas},
+    }
+
+
+def tortoise_connections(
+    url: str,
+    profile: str,
+    overrides: Optional[Dict[str, Union[str, int]]] = None,
+    read_connections: int = 0,
+    pool: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Union[str, dict]]:
+    """
+    生成全部连接：default 为写连接，SQLite 另加 read_connections 个只读连接
+    （PostgreSQL 本身支持并发读写，只使用 default 连接池）
+
+    只读连接使用与写连接相同的 PRAGMA，另加 query_only 拒绝任何写入。
+    （Tortoise 按文件路径打开 SQLite，不支持 URI 形式的 mode=ro）
+    """
+    writer = tortoise_connection(url, profile, overrides, pool)
+    connections: Dict[str, Union[str, dict]] = {"default": writer}
+    if isinstance(writer, dict) and writer["engine"] == SQLITE_ENGINE:
+        credentials = {**writer["credentials"], "query_only": "ON"}
+        for name in read_connection_names(read_connections):
+            connections[name] = {"engine": SQLITE_ENGINE, "credentials": dict(credentials)}
+    return connections
+
+
+def apply_pragmas(conn, pragmas: Dict[str, Union[str, int]]):
+    """在标准库 sqlite3 连接上执行 PRAGMA（用于备份等工作线程中的连接）"""
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name}={value}").fetchall()
@@ -0,0 +1,57 @@
+"""
+读写分离 - 只读接口的查询分散到多个只读连接，写操作仍走唯一的写连接
+
+Tortoise 的 SQLite 客户端每个连接同一时间只执行一个查询，
+统计、搜索等耗时的读查询会阻塞写入。WAL 模式下多个连接可以并发读，
+因此为只读接口配置若干只读连接（PRAGMA query_only），按轮询分配。
+
+只有在 use_read_connections() 标记的上下文中读查询才会路由到只读连接；
+写操作、事务内的查询（需要看到未提交的写入）以及其他接口都使用 default 连接。
+"""
+import itertools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+from tortoise.backends.sqlite.client import SqliteTransactionWrapper
+from tortoise.connection import connections
+
+READ_CONNECTION_PREFIX = "read_"
+
+_use_read: ContextVar[bool] = ContextVar("use_read_connections", default=False)
+
+
+def read_connection_names(count: int) -> List[str]:
+    return [f"{READ_CONNECTION_PREFIX}{i}" for i in range(count)]
+
+
+class ReadWriteRouter:
+    """Tortoise 数据库路由（在 TORTOISE_ORM 的 routers 中注册）"""
+
+    _names: List[str] = []
+    _cycle = None
+
+    @classmethod
+    def configure(cls, names: List[str]):
+        cls._names = list(names)
+        cls._cycle = itertools.cycle(cls._names) if cls._names else None
+
+    def db_for_read(self, model) -> Optional[str]:
+        if self._cycle is None or not _use_read.get():
+            return None
+        if isinstance(connections.get("default"), SqliteTransactionWrapper):
+            return None
+        return next(self._cycle)
+
+    def db_for_write(self, model) -> Optional[str]:
+        # 返回 None 时使用模型的默认连接
+        return None
+
+
+@contextmanager
+def use_read_connections():
+    """在上下文中把读查询路由到只读连接"""
+    token = _use_read.set(True)
+    try:
+        yield
+    finally:
+        _use_read.reset(token)
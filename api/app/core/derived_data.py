@@ -0,0 +1,35 @@
+"""
+派生数据准备 - 闭包表、试题数量、分类体系快照、快照包、日志分区等
+
+启动时补齐升级前缺失的派生数据；恢复备份后数据库整体替换，
+需要丢弃进程内状态并按恢复后的数据重新准备。
+"""
+from app.core.cache import cache_manager
+from app.core.category_tree import CategoryTree
+from app.core.log_store import log_store
+from app.core.question_bundles import question_bundles
+from app.core.question_counts import QuestionCounts
+from app.core.taxonomy import taxonomy
+from app.utils.logger import SystemLogger
+
+
+async def prepare_derived_data():
+    """启动时准备派生数据（在Tortoise初始化之后执行）"""
+    await CategoryTree.ensure_built()
+    await QuestionCounts.ensure_built()
+    await taxonomy.load()
+    await question_bundles.ensure_built()
+    await SystemLogger.backfill_login_activity()
+    await log_store.ensure_partitions()
+    await log_store.migrate_legacy()
+    await log_store.ensure_counters()
+
+
+async def reload_derived_data():
+    """数据库被替换后清空缓存和进程内状态，并按新数据重建派生数据"""
+    cache_manager.clear_all()
+    taxonomy.invalidate()
+    log_store.reset()
+    await prepare_derived_data()
+    # 快照包文件在数据库之外，必须按恢复后的数据全部重建
+    await question_bundles.rebuild()
@@ -0,0 +1,76 @@
+"""
+共享 HTTP 客户端 - 出站请求（图床、WebDAV）复用连接
+
+每次请求新建 httpx.AsyncClient 都要重新建立 TCP 和 TLS 连接；共享客户端保持长连接，
+粘贴图片等连续的小请求直接复用已有连接。按用途分别建立客户端，各自的连接池互不占用：
+- default：图床上传、连接测试等短请求
+- transfer：备份文件上传，读写超时更长
+
+客户端在第一次使用时创建（不在启动时导入 httpx），应用关闭时统一关闭。
+安装了 h2（pip install ".[http2]"）且 HTTP2_ENABLED 时使用 HTTP/2，同一连接可并发多个请求。
+"""
+import logging
+from typing import TYPE_CHECKING, Dict
+from app.config import settings
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class HttpClientRegistry:
+    """按用途共享的 httpx.AsyncClient"""
+
+    def __init__(self):
+        self._clients: Dict[str, "httpx.AsyncClient"] = {}
+
+    def _timeout(self, name: str):
+        import httpx
+
+        if name == "transfer":
+            return httpx.Timeout(settings.HTTP_TRANSFER_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT)
+        return httpx.Timeout(settings.HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT)
+
+    def get(self, name: str = "default") -> "httpx.AsyncClient":
+        """获取共享客户端，不存在或已关闭时创建"""
+        import httpx
+
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            http2 = settings.HTTP2_ENABLED and _http2_available()
+            client = httpx.AsyncClient(
+                timeout=self._timeout(name),
+                limits=httpx.Limits(
+                    max_connections=settings.HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+                ),
+                http2=http2,
+            )
+            self._clients[name] = client
+            logger.debug(f"创建共享HTTP客户端: {name}（HTTP/2: {http2}）")
+        return client
+
+    async def close(self):
+        """关闭所有客户端（应用关闭时调用）"""
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+
+# 创建全局HTTP客户端实例
+http_clients = HttpClientRegistry()
+
+
+def get_http_client() -> "httpx.AsyncClient":
+    """FastAPI 依赖：短请求使用的共享客户端"""
+    return http_clients.get()
@@ -0,0 +1,142 @@
+"""
+图片去重索引 - 重复粘贴的图片直接返回已上传的地址
+
+老师经常反复粘贴同一张示意图。上传前计算原图内容的 SHA-256，与图床目录和处理方式（预设、格式、
+是否生成缩略图）一起在 uploaded_images 表中查找：命中时直接返回已有地址，不处理图片，
+也不访问图床；未命中时按正常流程上传后记录。索引保存在数据库中，所有 worker 共用，重启后仍有效。
+
+每条记录对应一次实际上传，hit_count 为之后重复上传的次数，
+命中率 = 总命中次数 / (总命中次数 + 记录数)。
+
+本地兜底（IMAGE_LOCAL_FALLBACK，默认关闭）：图床无法连接时把处理后的图片保存到
+IMAGE_LOCAL_DIR（文件名为内容哈希），通过 IMAGE_LOCAL_URL_PREFIX 访问（生产环境由 Nginx 提供）。
+本地图片在索引中不算命中：之后再上传同一张图时先重试图床，成功后索引改为图床地址。
+"""
+import hashlib
+import logging
+import uuid
+from pathlib import Path
+from typing import Optional
+import aiofiles
+from tortoise import timezone
+from tortoise.expressions import F
+from tortoise.functions import Count, Sum
+from app.config import settings
+from app.core.image_upload import EXTENSIONS, ImageSource
+from app.models.uploaded_image import UploadedImage
+
+logger = logging.getLogger(__name__)
+
+# 处理方式标识中目录名的最大长度，超过时使用目录名的哈希（标识列长 50）
+MAX_FOLDER_LENGTH = 24
+
+
+class ImageIndex:
+    """按内容哈希索引已上传的图片，并提供本地兜底存储"""
+
+    def __init__(self, directory: str, url_prefix: str):
+        self.directory = Path(directory)
+        self.url_prefix = url_prefix.rstrip("/")
+
+    @staticmethod
+    def variant(folder: str, preset: str, fmt: str, thumbnail: bool) -> str:
+        """
+        处理方式标识（同一张图按不同方式处理得到不同的文件）
+
+        包含图床目录：同一张图上传到不同目录时各自上传，不返回其他目录中的地址。
+        """
+        folder = folder or ""
+        if len(folder) > MAX_FOLDER_LENGTH:
+            folder = hashlib.sha256(folder.encode()).hexdigest()[:MAX_FOLDER_LENGTH]
+        if preset == "original":
+            # 不处理时不生成缩略图
+            return f"{folder}/original"
+        return f"{folder}/{preset}:{fmt}:{'thumb' if thumbnail else 'full'}"
+
+    async def lookup(self, sha256: str, variant: str) -> Optional[UploadedImage]:
+        """查找已上传到图床的图片，命中时增加计数"""
+        entry = await UploadedImage.get_or_none(sha256=sha256, variant=variant, is_local=False)
+        if entry is not None:
+            await UploadedImage.filter(id=entry.id).update(
+                hit_count=F("hit_count") + 1, last_hit_at=timezone.now()
+            )
+        return entry
+
+    async def remember(self, sha256: str, variant: str, data: dict, original_size: int):
+        """记录上传结果（并发上传同一张图时以后完成的为准）"""
+        await UploadedImage.update_or_create(
+            defaults={
+                "url": data["url"],
+                "thumbnail_url": data.get("thumbnail"),
+                "cdn_id": str(data["id"]) if data.get("id") is not None else None,
+                "name": data["name"],
+                "size": data["size"],
+                "original_size": original_size,
+                "mime": data["mime"],
+                "is_local": bool(data.get("local")),
+            },
+            sha256=sha256,
+            variant=variant,
+        )
+
+    @staticmethod
+    def response_data(entry: UploadedImage) -> dict:
+        """命中时返回的数据（与图床上传结果格式相同）"""
+        data = {
+            "url": entry.url,
+            "id": entry.cdn_id,
+            "name": entry.name,
+            "size": entry.size,
+            "mime": entry.mime,
+            "deduplicated": True,
+        }
+        if entry.thumbnail_url:
+            data["thumbnail"] = entry.thumbnail_url
+        return data
+
+    async def save_local(self, source: ImageSource, filename: str, max_size: int) -> dict:
+        """图床不可用时把图片保存到本地，返回与图床上传结果格式相同的数据"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.directory / f".{uuid.uuid4().hex}.tmp"
+        digest = hashlib.sha256()
+        try:
+            async with aiofiles.open(tmp_path, "wb") as f:
+                async for chunk in source.chunks(max_size):
+                    digest.update(chunk)
+                    await f.write(chunk)
+            name = digest.hexdigest() + EXTENSIONS.get(source.content_type, "")
+            tmp_path.replace(self.directory / name)
+        except Exception:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        logger.warning(f"图床不可用，图片已保存到本地: {name}")
+        return {
+            "url": f"{self.url_prefix}/{name}",
+            "id": None,
+            "name": filename,
+            "size": source.size,
+            "mime": source.content_type,
+            "local": True,
+        }
+
+    async def stats(self) -> dict:
+        """索引统计：记录数、命中次数和命中率"""
+        rows = await UploadedImage.all().annotate(
+            entries=Count("id"), hits=Sum("hit_count")
+        ).values("entries", "hits")
+        entries = rows[0]["entries"] if rows else 0
+        hits = (rows[0]["hits"] if rows else 0) or 0
+        local_entries = await UploadedImage.filter(is_local=True).count()
+        requests = hits + entries
+        return {
+            "entries": entries,
+            "local_entries": local_entries,
+            "hits": hits,
+            "requests": requests,
+            "hit_rate": round(hits / requests * 100, 2) if requests else 0.0,
+            "local_fallback": settings.IMAGE_LOCAL_FALLBACK,
+        }
+
+
+# 创建全局图片去重索引实例
+image_index = ImageIndex(settings.IMAGE_LOCAL_DIR, settings.IMAGE_LOCAL_URL_PREFIX)
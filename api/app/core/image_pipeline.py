@@ -0,0 +1,196 @@
+"""
+图片优化 - 上传图床前在进程池中缩放、重新编码图片并生成缩略图
+
+粘贴的截图通常是原始分辨率的 PNG，直接上传后试题页面很重。上传前在子进程中：
+- 按 EXIF 方向摆正后缩放到预设的最大边长（只缩小不放大）
+- 重新编码为 WebP / AVIF，或优化后的 PNG / JPEG，不保留 EXIF、XMP 等元数据
+- 按需生成缩略图
+PIL 的解码和编码都是 CPU 密集操作，放在 ProcessPoolExecutor 中执行，不阻塞事件循环，
+多张图片可同时在多个核心上处理。图片通过临时文件在进程间传递，主进程不持有图片内容。
+
+子进程使用 spawn 方式启动，只导入本模块、image_upload 和 PIL，不导入配置、数据库等应用代码。
+"""
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Optional, Tuple
+from app.core.image_upload import EXTENSIONS, ImageSource, ImageUploadError, from_path, save_to
+
+logger = logging.getLogger(__name__)
+
+# 质量预设：最大边长、编码质量、缩略图边长；original 表示不处理，原样上传
+PRESETS = {
+    "original": None,
+    "high": {"max_dimension": 2560, "quality": 90, "thumbnail": 480},
+    "standard": {"max_dimension": 1920, "quality": 80, "thumbnail": 320},
+    "low": {"max_dimension": 1280, "quality": 65, "thumbnail": 240},
+}
+
+# 输出格式：webp、avif（Pillow 不支持时改用 webp）、original（JPEG 仍为 JPEG，其余为 PNG）
+FORMATS = ("webp", "avif", "original")
+
+# 解码的最大像素数（防止解压炸弹）
+MAX_PIXELS = 50_000_000
+
+MIME_TYPES = {"WEBP": "image/webp", "AVIF": "image/avif", "PNG": "image/png", "JPEG": "image/jpeg"}
+
+# 重新编码时保留的图片信息（透明色、颜色配置），其余元数据全部丢弃
+_KEEP_INFO = ("transparency", "icc_profile")
+
+
+def _target_format(fmt: str, source_format: Optional[str]) -> str:
+    if fmt == "avif":
+        from PIL import features
+
+        return "AVIF" if features.check("avif") else "WEBP"
+    if fmt == "original":
+        return "JPEG" if source_format == "JPEG" else "PNG"
+    return "WEBP"
+
+
+def _has_alpha(img) -> bool:
+    return img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+
+
+def _convert(img, target: str):
+    """转换为目标格式支持的颜色模式"""
+    from PIL import Image
+
+    if target == "PNG" and img.mode in ("1", "L", "LA", "P", "RGB", "RGBA"):
+        return img
+    if _has_alpha(img):
+        img = img.convert("RGBA")
+        if target != "JPEG":
+            return img
+        # JPEG 不支持透明，铺白色背景
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+    return img if img.mode == "RGB" else img.convert("RGB")
+
+
+def _save(img, path: str, target: str, quality: int):
+    img.info = {key: img.info[key] for key in _KEEP_INFO if key in img.info}
+    if target == "WEBP":
+        img.save(path, "WEBP", quality=quality, method=4)
+    elif target == "AVIF":
+        img.save(path, "AVIF", quality=quality, speed=6)
+    elif target == "JPEG":
+        img.save(path, "JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        img.save(path, "PNG", optimize=True)
+
+
+def optimize_file(source: str, dest: str, preset: str, fmt: str, thumbnail: Optional[str] = None) -> dict:
+    """
+    在子进程中优化 source，结果写入 dest（缩略图写入 thumbnail）
+
+    返回处理信息；optimized 为 False 时应上传原图
+    （动画图片不处理；未缩放且重新编码后没有变小时也使用原图）。
+    """
+    from PIL import Image, ImageOps
+
+    options = PRESETS[preset]
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    source_size = Path(source).stat().st_size
+    try:
+        with Image.open(source) as original:
+            result = {
+                "optimized": False,
+                "original_size": source_size,
+                "original_width": original.width,
+                "original_height": original.height,
+                "size": source_size,
+                "width": original.width,
+                "height": original.height,
+            }
+            if getattr(original, "n_frames", 1) > 1:
+                return result
+
+            target = _target_format(fmt, original.format)
+            img = ImageOps.exif_transpose(original)
+            size = img.size
+            img.thumbnail((options["max_dimension"], options["max_dimension"]), Image.Resampling.LANCZOS)
+            resized = img.size != size
+            img = _convert(img, target)
+            _save(img, dest, target, options["quality"])
+
+            if thumbnail:
+                thumb = img.copy()
+                thumb.thumbnail((options["thumbnail"], options["thumbnail"]), Image.Resampling.LANCZOS)
+                _save(thumb, thumbnail, target, options["quality"])
+                result["thumbnail_size"] = Path(thumbnail).stat().st_size
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageUploadError(f"Cannot process image: {e}") from None
+
+    dest_size = Path(dest).stat().st_size
+    if resized or dest_size < source_size:
+        result.update(optimized=True, size=dest_size, width=img.width, height=img.height, format=MIME_TYPES[target])
+    return result
+
+
+class ImagePipeline:
+    """图片优化进程池（第一次使用时创建）"""
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            from app.config import settings
+
+            self._executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_PROCESS_WORKERS or None,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def run(self, source: str, dest: str, preset: str, fmt: str, thumbnail: Optional[str] = None) -> dict:
+        """在进程池中执行 optimize_file"""
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._pool(), optimize_file, source, dest, preset, fmt, thumbnail
+            )
+        except BrokenProcessPool:
+            # 子进程异常退出（如内存不足被杀）后进程池不可用，下次重新创建
+            logger.error("图片处理进程异常退出，重建进程池")
+            self.shutdown()
+            raise
+
+    async def optimize(
+        self, source: ImageSource, workdir: Path, preset: str, fmt: str, thumbnail: bool, max_size: int
+    ) -> Tuple[ImageSource, Optional[ImageSource], dict]:
+        """
+        优化待上传的图片，返回 (图片, 缩略图, 处理信息)
+
+        图片先写入 workdir 下的临时文件，处理结果也写在 workdir 中，调用方负责清理。
+        """
+        original_path = workdir / "original"
+        dest_path = workdir / "optimized"
+        thumbnail_path = workdir / "thumbnail" if thumbnail else None
+        await save_to(source, original_path, max_size)
+        result = await self.run(
+            str(original_path), str(dest_path), preset, fmt, str(thumbnail_path) if thumbnail_path else None
+        )
+        image = await from_path(dest_path if result["optimized"] else original_path, max_size)
+        thumb = await from_path(thumbnail_path, max_size) if thumbnail_path and thumbnail_path.exists() else None
+        return image, thumb, result
+
+    def shutdown(self):
+        """关闭进程池（应用关闭时调用）"""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def rename(filename: str, content_type: str) -> str:
+    """按处理后的格式修改文件扩展名"""
+    extension = EXTENSIONS.get(content_type)
+    return Path(filename).stem + extension if extension else filename
+
+
+# 创建全局图片优化实例
+image_pipeline = ImagePipeline()
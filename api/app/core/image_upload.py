@@ -0,0 +1,248 @@
+"""
+图片流式上传 - 把上传的图片边读边转发到图床，不在内存中保留完整文件
+
+- 上传文件由 Starlette 暂存（超过 1MB 时写入临时文件），按块读出后直接写入
+  发往图床的 multipart 请求体，Content-Length 预先算出，不需要分块传输编码
+- 从前几个字节识别图片格式，格式以文件内容为准而不是客户端声明的类型
+- 读取时累计字节数，超过 MAX_FILE_SIZE 立即中止
+- Base64 图片按 4 字符对齐分段解码，不生成完整的解码副本
+"""
+import base64
+import binascii
+import hashlib
+import re
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Optional
+import aiofiles
+
+# 每次读取、发送的块大小
+CHUNK_SIZE = 64 * 1024
+
+# 识别格式需要的字节数
+SNIFF_SIZE = 32
+
+# Base64 每段解码的字符数（4 的倍数）
+BASE64_CHUNK_CHARS = CHUNK_SIZE // 3 * 4
+
+_WHITESPACE = re.compile(r"\s")
+
+# 识别出的图片类型对应的扩展名
+EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+    "image/avif": ".avif",
+    "image/bmp": ".bmp",
+    "image/x-icon": ".ico",
+}
+
+
+class ImageUploadError(ValueError):
+    """上传的图片无效"""
+
+
+class ImageTooLargeError(ImageUploadError):
+    """图片超过大小限制"""
+
+
+class Base64DecodeError(ImageUploadError):
+    """Base64 数据无效"""
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """根据文件头识别图片类型，返回 MIME 类型，无法识别时返回 None"""
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"avif", b"avis"):
+        return "image/avif"
+    if head.startswith(b"BM") and len(head) >= 14:
+        return "image/bmp"
+    if head.startswith(b"\x00\x00\x01\x00"):
+        return "image/x-icon"
+    return None
+
+
+def _quote_filename(filename: str) -> str:
+    """multipart 头中的文件名（与浏览器一致，转义引号和换行）"""
+    return filename.replace("\\", "\\\\").replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
+
+
+class MultipartBody:
+    """
+    流式 multipart/form-data 请求体：若干普通字段 + 一个文件字段
+
+    文件内容来自异步迭代器，长度必须预先确定（用于计算 Content-Length）。
+    """
+
+    def __init__(self, fields: Dict[str, str], file_field: str, filename: str, content_type: str, size: int):
+        self.boundary = uuid.uuid4().hex
+        parts = []
+        for name, value in fields.items():
+            parts.append(
+                f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+            )
+        parts.append(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+            f'filename="{_quote_filename(filename)}"\r\nContent-Type: {content_type}\r\n\r\n'.encode()
+        )
+        self.prefix = b"".join(parts)
+        self.suffix = f"\r\n--{self.boundary}--\r\n".encode()
+        self.size = size
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {
+            "Content-Type": f"multipart/form-data; boundary={self.boundary}",
+            "Content-Length": str(len(self.prefix) + self.size + len(self.suffix)),
+        }
+
+    async def stream(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        yield self.prefix
+        sent = 0
+        async for chunk in chunks:
+            sent += len(chunk)
+            yield chunk
+        if sent != self.size:
+            raise ImageUploadError(f"Image size changed during upload: expected {self.size}, got {sent}")
+        yield self.suffix
+
+
+def _limited(chunks: AsyncIterator[bytes], max_size: int) -> AsyncIterator[bytes]:
+    """累计字节数，超过限制时中止"""
+    async def generator():
+        total = 0
+        async for chunk in chunks:
+            total += len(chunk)
+            if total > max_size:
+                raise ImageTooLargeError("File too large")
+            yield chunk
+    return generator()
+
+
+class ImageSource:
+    """待上传的图片：类型（由文件头识别）、大小和内容迭代器"""
+
+    def __init__(self, content_type: str, size: int, head: bytes, rest: Callable[[], AsyncIterator[bytes]]):
+        self.content_type = content_type
+        self.size = size
+        self._head = head
+        self._rest = rest
+
+    async def sha256(self, max_size: int) -> str:
+        """内容的 SHA-256（十六进制）"""
+        digest = hashlib.sha256()
+        async for chunk in self.chunks(max_size):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    async def chunks(self, max_size: int) -> AsyncIterator[bytes]:
+        async def generator():
+            yield self._head
+            async for chunk in self._rest():
+                yield chunk
+        async for chunk in _limited(generator(), max_size):
+            yield chunk
+
+
+def _check_head(head: bytes) -> str:
+    content_type = sniff_image_type(head)
+    if content_type is None:
+        raise ImageUploadError("Unsupported or invalid image data")
+    return content_type
+
+
+async def from_upload(upload, max_size: int) -> ImageSource:
+    """从 FastAPI UploadFile 创建图片源（文件已由 Starlette 暂存）"""
+    size = upload.size
+    if size is None:
+        # 旧版本 Starlette 不记录大小，从暂存文件获取（seek 不读取内容）
+        size = upload.file.seek(0, 2)
+    if size > max_size:
+        raise ImageTooLargeError("File too large")
+    await upload.seek(0)
+    head = await upload.read(SNIFF_SIZE)
+    content_type = _check_head(head)
+
+    async def rest():
+        # 每次从头读取，同一图片可以多次遍历（计算哈希、上传失败后保存到本地）
+        await upload.seek(len(head))
+        while True:
+            chunk = await upload.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+    return ImageSource(content_type, size, head, rest)
+
+
+async def from_path(path: Path, max_size: int) -> ImageSource:
+    """从本地文件创建图片源（图片优化的输出）"""
+    size = path.stat().st_size
+    if size > max_size:
+        raise ImageTooLargeError("File too large")
+    async with aiofiles.open(path, "rb") as f:
+        head = await f.read(SNIFF_SIZE)
+    content_type = _check_head(head)
+
+    async def rest():
+        async with aiofiles.open(path, "rb") as f:
+            await f.seek(len(head))
+            while chunk := await f.read(CHUNK_SIZE):
+                yield chunk
+
+    return ImageSource(content_type, size, head, rest)
+
+
+async def save_to(source: ImageSource, path: Path, max_size: int):
+    """把图片写入本地文件（交给图片优化进程处理）"""
+    async with aiofiles.open(path, "wb") as f:
+        async for chunk in source.chunks(max_size):
+            await f.write(chunk)
+
+
+def _base64_size(encoded: str) -> int:
+    padding = len(encoded) - len(encoded.rstrip("="))
+    return len(encoded) // 4 * 3 - padding
+
+
+def from_base64(image_data: str, max_size: int) -> ImageSource:
+    """
+    从 Base64 字符串（可带 data:image/xxx;base64, 前缀）创建图片源
+
+    内容在上传时按段解码，不生成完整的解码副本。
+    """
+    encoded = image_data
+    if image_data.startswith("data:"):
+        encoded = image_data.partition(",")[2]
+    if _WHITESPACE.search(encoded):
+        encoded = _WHITESPACE.sub("", encoded)
+    if len(encoded) % 4:
+        raise Base64DecodeError("Invalid base64 data")
+
+    size = _base64_size(encoded)
+    if size > max_size:
+        raise ImageTooLargeError("File too large")
+
+    def decode(start: int, end: int) -> bytes:
+        try:
+            return base64.b64decode(encoded[start:end], validate=True)
+        except binascii.Error as e:
+            raise Base64DecodeError("Invalid base64 data") from e
+
+    head_chars = min(len(encoded), (SNIFF_SIZE + 2) // 3 * 4)
+    head = decode(0, head_chars)
+    content_type = _check_head(head)
+
+    async def rest():
+        for start in range(head_chars, len(encoded), BASE64_CHUNK_CHARS):
+            yield decode(start, start + BASE64_CHUNK_CHARS)
+
+    return ImageSource(content_type, size, head, rest)
@@ -0,0 +1,556 @@
+"""
+系统日志按月分区存储
+
+每个月的日志写入独立的表 system_logs_YYYYMM，分区登记在 log_partitions 中，
+并随写入维护分区计数和按 (日期, 级别, 模块) 的计数（log_counters）：
+- 按时间范围查询时只访问有交集的分区
+- 级别、模块、时间范围的统计由计数回答，只有不足一天的边界时段查询日志表
+- 清理旧日志时整表删除过期分区，只有跨越截止时间的分区执行 DELETE
+- 计数与日志表不一致时（如手工删除日志）由 reconcile 按实际数据修正
+
+单 worker 时每日计数在进程内缓存；多 worker 时各进程的缓存无法互相更新，
+分页总数会与实际不符，因此每次从计数表读取。
+
+SQL 按 SQLite 的 ? 占位符编写，PostgreSQL 下由 _sql 转换为 $n。
+"""
+import json
+import logging
+import re
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+from tortoise import Tortoise
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+from app.config import settings
+from app.models.system_log import SystemLog, LogPartition, LogCounter, LogLevel
+
+logger = logging.getLogger(__name__)
+
+TABLE_PREFIX = "system_logs_"
+
+# 分区表列（不含自增ID）
+COLUMNS = ("level", "module", "message", "details", "user", "ip_address", "user_agent", "request_id", "timestamp")
+
+# 有独立计数的日志级别
+COUNTED_LEVELS = (LogLevel.INFO, LogLevel.WARNING, LogLevel.ERROR, LogLevel.DEBUG)
+
+# 对外ID = 分区月份 * ID_FACTOR + 分区内ID，保证跨分区唯一
+ID_FACTOR = 1_000_000_000
+
+# 迁移旧表数据时每批行数
+MIGRATE_BATCH_SIZE = 1000
+
+# 进程内计数的最长使用时间（秒），之后重新读取以包含命令行工具等其他进程的写入
+COUNTERS_MAX_AGE = 60
+
+CounterKey = Tuple[date, str, str]
+
+CREATE_PARTITION_SQL = """
+CREATE TABLE IF NOT EXISTS "{table}" (
+    "id" {id_column},
+    "level" VARCHAR(20) NOT NULL,
+    "module" VARCHAR(50) NOT NULL,
+    "message" TEXT NOT NULL,
+    "details" JSON,
+    "user" VARCHAR(100),
+    "ip_address" VARCHAR(45),
+    "user_agent" VARCHAR(500),
+    "request_id" VARCHAR(100),
+    "timestamp" TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS "idx_{table}_timestamp" ON "{table}" ("timestamp");
+CREATE INDEX IF NOT EXISTS "idx_{table}_level_module" ON "{table}" ("level", "module");
+CREATE INDEX IF NOT EXISTS "idx_{table}_module_user_ts" ON "{table}" ("module", "user", "timestamp");
+"""
+
+INSERT_SQL = (
+    'INSERT INTO "{table}" (' + ", ".join(f'"{column}"' for column in COLUMNS) + ") "
+    "VALUES (" + ", ".join("?" for _ in COLUMNS) + ")"
+)
+
+INCREMENT_COUNTER_SQL = (
+    'INSERT INTO "log_counters" ("day", "level", "module", "count") VALUES (?, ?, ?, 1) '
+    'ON CONFLICT ("day", "level", "module") DO UPDATE SET "count" = "log_counters"."count" + 1'
+)
+
+# 各数据库的自增主键和按天分组表达式
+ID_COLUMNS = {"sqlite": "INTEGER PRIMARY KEY AUTOINCREMENT", "postgres": "SERIAL PRIMARY KEY"}
+DAY_EXPRESSIONS = {"sqlite": 'substr("timestamp", 1, 10)', "postgres": 'to_char("timestamp", \'YYYY-MM-DD\')'}
+
+_PLACEHOLDER = re.compile(r"\?")
+
+
+def utcnow() -> datetime:
+    """当前UTC时间（不带时区，与分区表中存储的格式一致）"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _to_utc(value: datetime) -> datetime:
+    """统一转换为不带时区的UTC时间，不带时区的输入视为UTC"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _format(value: datetime) -> str:
+    return _to_utc(value).isoformat(sep=" ", timespec="microseconds")
+
+
+def _partition_key(value: datetime) -> str:
+    return value.strftime("%Y%m")
+
+
+def _day_start(value: datetime) -> datetime:
+    return datetime.combine(value.date(), datetime.min.time())
+
+
+def _partition_range(key: str) -> Tuple[datetime, datetime]:
+    """分区覆盖的时间范围 [开始, 结束)"""
+    start = datetime.strptime(key, "%Y%m")
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+def _like(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+class LogStore:
+    """按月分区的系统日志存储"""
+
+    def __init__(self):
+        self._known: Set[str] = set()
+        self._counters: Optional[Dict[CounterKey, int]] = None
+        self._counters_loaded_at = 0.0
+        self._cache_counters = settings.WEB_CONCURRENCY <= 1
+
+    def reset(self):
+        """丢弃进程内的分区和计数缓存（数据库被替换后调用）"""
+        self._known.clear()
+        self._counters = None
+
+    @staticmethod
+    def _connection():
+        return Tortoise.get_connection("default")
+
+    @classmethod
+    def _dialect(cls) -> str:
+        return cls._connection().capabilities.dialect
+
+    @classmethod
+    def _sql(cls, query: str) -> str:
+        """把 ? 占位符转换为当前数据库的格式"""
+        if cls._dialect() != "postgres":
+            return query
+        counter = iter(range(1, query.count("?") + 1))
+        return _PLACEHOLDER.sub(lambda _: f"${next(counter)}", query)
+
+    @classmethod
+    def _time(cls, value: datetime):
+        """时间参数：SQLite 存储为文本，PostgreSQL 使用 timestamp 类型"""
+        return _to_utc(value) if cls._dialect() == "postgres" else _format(value)
+
+    @classmethod
+    def _date(cls, value: date):
+        return value if cls._dialect() == "postgres" else value.isoformat()
+
+    async def _ensure_partition(self, key: str) -> str:
+        """确保分区表和登记记录存在，返回表名"""
+        table = f"{TABLE_PREFIX}{key}"
+        if key in self._known:
+            return table
+
+        await self._connection().execute_script(
+            CREATE_PARTITION_SQL.format(table=table, id_column=ID_COLUMNS.get(self._dialect(), ID_COLUMNS["sqlite"]))
+        )
+        try:
+            await LogPartition.get_or_create(key=key, defaults={"table_name": table})
+        except IntegrityError:
+            # 其他进程同时创建了该分区
+            pass
+        self._known.add(key)
+        return table
+
+    async def write(
+        self,
+        level: str,
+        module: str,
+        message: str,
+        details: Optional[Dict[str, Any]] = None,
+        user: Optional[str] = None,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None,
+        request_id: Optional[str] = None,
+        timestamp: Optional[datetime] = None,
+    ):
+        """写入一条日志并更新所在分区的计数"""
+        timestamp = _to_utc(timestamp) if timestamp else utcnow()
+        key = _partition_key(timestamp)
+        table = await self._ensure_partition(key)
+
+        counters = {"total_count": F("total_count") + 1}
+        if level in COUNTED_LEVELS:
+            counters[f"{level}_count"] = F(f"{level}_count") + 1
+
+        async with in_transaction("default") as conn:
+            await conn.execute_query(
+                self._sql(INSERT_SQL.format(table=table)),
+                [
+                    level, module, message,
+                    json.dumps(details, ensure_ascii=False, default=str) if details is not None else None,
+                    user, ip_address, user_agent, request_id, self._time(timestamp),
+                ]
+            )
+            await LogPartition.filter(key=key).using_db(conn).update(**counters)
+            await conn.execute_query(self._sql(INCREMENT_COUNTER_SQL), [self._date(timestamp.date()), level, module])
+
+        if self._counters is not None:
+            counter_key = (timestamp.date(), level, module)
+            self._counters[counter_key] = self._counters.get(counter_key, 0) + 1
+
+    async def partitions(
+        self,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+    ) -> List[LogPartition]:
+        """与时间范围有交集的分区，按时间倒序"""
+        start = _to_utc(start_time) if start_time else None
+        end = _to_utc(end_time) if end_time else None
+        result = []
+        for partition in await LogPartition.all().order_by("-key"):
+            part_start, part_end = _partition_range(partition.key)
+            if start and part_end <= start:
+                continue
+            if end and part_start > end:
+                continue
+            result.append(partition)
+        return result
+
+    def _where(
+        self,
+        level: Optional[str],
+        module: Optional[str],
+        user: Optional[str],
+        message: Optional[str],
+        start_time: Optional[datetime],
+        end_time: Optional[datetime],
+    ) -> Tuple[str, list]:
+        clauses = []
+        params: list = []
+        if level:
+            clauses.append('"level" = ?')
+            params.append(level)
+        if module:
+            clauses.append('"module" = ?')
+            params.append(module)
+        if user:
+            clauses.append('"user" LIKE ? ESCAPE \'\\\'')
+            params.append(_like(user))
+        if message:
+            clauses.append('"message" LIKE ? ESCAPE \'\\\'')
+            params.append(_like(message))
+        if start_time:
+            clauses.append('"timestamp" >= ?')
+            params.append(self._time(start_time))
+        if end_time:
+            clauses.append('"timestamp" <= ?')
+            params.append(self._time(end_time))
+        return (f" WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+    async def _counter_map(self) -> Dict[CounterKey, int]:
+        """每日计数：单 worker 时使用进程内缓存（过期后重新读取），多 worker 时每次从计数表读取"""
+        if self._counters is None or time.monotonic() - self._counters_loaded_at > COUNTERS_MAX_AGE:
+            rows = await LogCounter.all().values("day", "level", "module", "count")
+            counters = {(row["day"], row["level"], row["module"]): row["count"] for row in rows}
+            if not self._cache_counters:
+                return counters
+            self._counters = counters
+            self._counters_loaded_at = time.monotonic()
+        return self._counters
+
+    async def _slice_counts(self, key: str, module: Optional[str],
+                            start: datetime, stop: datetime) -> Dict[str, int]:
+        """查询分区表中 [start, stop) 时段的各级别日志数"""
+        clauses = ['"timestamp" >= ?', '"timestamp" < ?']
+        params = [self._time(start), self._time(stop)]
+        if module:
+            clauses.append('"module" = ?')
+            params.append(module)
+        rows = await self._connection().execute_query_dict(
+            self._sql(
+                f'SELECT "level", COUNT(*) AS "count" FROM "{TABLE_PREFIX}{key}" '
+                f'WHERE {" AND ".join(clauses)} GROUP BY "level"'
+            ),
+            params
+        )
+        return {row["level"]: row["count"] for row in rows}
+
+    async def counts(
+        self,
+        module: Optional[str] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+    ) -> Dict[str, Dict[str, int]]:
+        """
+        按分区返回各级别日志数 {分区月份: {级别: 数量}}
+
+        完整的日期直接累加计数，时间范围两端不足一天的时段查询日志表。
+        """
+        start = _to_utc(start_time) if start_time else None
+        # end_time 为闭区间，转换为开区间便于按天比较
+        stop = _to_utc(end_time) + timedelta(microseconds=1) if end_time else None
+        keys = {partition.key for partition in await self.partitions(start_time, end_time)}
+
+        result: Dict[str, Dict[str, int]] = {key: {} for key in keys}
+
+        def add(key: str, level: str, count: int):
+            if key in result:
+                result[key][level] = result[key].get(level, 0) + count
+
+        for (day, level, counter_module), count in (await self._counter_map()).items():
+            if module and counter_module != module:
+                continue
+            day_start = datetime.combine(day, datetime.min.time())
+            if start and start > day_start:
+                continue
+            if stop and stop < day_start + timedelta(days=1):
+                continue
+            add(day.strftime("%Y%m"), level, count)
+
+        # 边界上不足一天的时段
+        slices = []
+        if start and start != _day_start(start):
+            day_end = _day_start(start) + timedelta(days=1)
+            slices.append((start, min(day_end, stop) if stop else day_end))
+        if stop and stop != _day_start(stop) and not (slices and slices[0][1] == stop):
+            slices.append((max(_day_start(stop), start) if start else _day_start(stop), stop))
+        for slice_start, slice_stop in slices:
+            key = _partition_key(slice_start)
+            if key in keys:
+                for level, count in (await self._slice_counts(key, module, slice_start, slice_stop)).items():
+                    add(key, level, count)
+
+        return result
+
+    async def stats(
+        self,
+        module: Optional[str] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+    ) -> Dict[str, int]:
+        """模块、时间范围筛选下的各级别日志数"""
+        stats = {"total": 0, **{f"{level}_count": 0 for level in COUNTED_LEVELS}}
+        for by_level in (await self.counts(module, start_time, end_time)).values():
+            for level, count in by_level.items():
+                stats["total"] += count
+                if level in COUNTED_LEVELS:
+                    stats[f"{level}_count"] += count
+        return stats
+
+    @staticmethod
+    def _row(partition: LogPartition, row: dict) -> dict:
+        details = row.get("details")
+        if isinstance(details, str):
+            try:
+                details = json.loads(details)
+            except ValueError:
+                details = None
+        timestamp = row["timestamp"]
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        return {
+            **row,
+            "id": int(partition.key) * ID_FACTOR + row["id"],
+            "details": details,
+            "timestamp": _to_utc(timestamp).replace(tzinfo=timezone.utc),
+        }
+
+    async def search(
+        self,
+        level: Optional[str] = None,
+        module: Optional[str] = None,
+        user: Optional[str] = None,
+        message: Optional[str] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        offset: int = 0,
+        limit: int = 20,
+    ) -> Tuple[List[dict], int]:
+        """按条件查询日志（时间倒序），返回 (当前页日志, 总数)"""
+        where, params = self._where(level, module, user, message, start_time, end_time)
+        partitions = await self.partitions(start_time, end_time)
+
+        if user or message:
+            # 用户、消息内容的模糊匹配无法由计数回答
+            counts = []
+            for partition in partitions:
+                rows = await self._connection().execute_query_dict(
+                    self._sql(f'SELECT COUNT(*) AS "count" FROM "{partition.table_name}"{where}'), params
+                )
+                counts.append(rows[0]["count"] if rows else 0)
+        else:
+            by_partition = await self.counts(module, start_time, end_time)
+            counts = [
+                by_partition[p.key].get(level, 0) if level else sum(by_partition[p.key].values())
+                for p in partitions
+            ]
+        total = sum(counts)
+
+        logs: List[dict] = []
+        remaining = limit
+        for partition, count in zip(partitions, counts):
+            if remaining <= 0:
+                break
+            if offset >= count:
+                offset -= count
+                continue
+            rows = await self._connection().execute_query_dict(
+                self._sql(
+                    f'SELECT * FROM "{partition.table_name}"{where} '
+                    f'ORDER BY "timestamp" DESC, "id" DESC LIMIT ? OFFSET ?'
+                ),
+                params + [remaining, offset]
+            )
+            logs.extend(self._row(partition, dict(row)) for row in rows)
+            remaining -= len(rows)
+            offset = 0
+
+        return logs, total
+
+    async def _recount(self, partition: LogPartition, conn) -> int:
+        """按分区内实际数据重新计算分区计数和每日计数，返回修正的计数条数"""
+        day = DAY_EXPRESSIONS.get(self._dialect(), DAY_EXPRESSIONS["sqlite"])
+        rows = await conn.execute_query_dict(
+            f'SELECT {day} AS "day", "level", "module", COUNT(*) AS "count" '
+            f'FROM "{partition.table_name}" GROUP BY 1, 2, 3'
+        )
+        actual = {(date.fromisoformat(row["day"]), row["level"], row["module"]): row["count"] for row in rows}
+
+        part_start, part_end = _partition_range(partition.key)
+        day_range = {"day__gte": part_start.date(), "day__lt": part_end.date()}
+        stored = {
+            (row["day"], row["level"], row["module"]): row["count"]
+            for row in await LogCounter.filter(**day_range).using_db(conn).values("day", "level", "module", "count")
+        }
+        drift = sum(1 for key in set(actual) | set(stored) if actual.get(key) != stored.get(key))
+
+        if drift:
+            await LogCounter.filter(**day_range).using_db(conn).delete()
+            await LogCounter.bulk_create([
+                LogCounter(day=day, level=level, module=module, count=count)
+                for (day, level, module), count in actual.items()
+            ], batch_size=1000, using_db=conn)
+
+        by_level: Dict[str, int] = {}
+        for (_, level, _), count in actual.items():
+            by_level[level] = by_level.get(level, 0) + count
+        await LogPartition.filter(key=partition.key).using_db(conn).update(
+            total_count=sum(by_level.values()),
+            **{f"{level}_count": by_level.get(level, 0) for level in COUNTED_LEVELS}
+        )
+        return drift
+
+    async def reconcile(self) -> int:
+        """按日志表实际数据修正所有计数，返回修正的计数条数"""
+        drift = 0
+        async with in_transaction("default") as conn:
+            partitions = await LogPartition.all().using_db(conn)
+            for partition in partitions:
+                drift += await self._recount(partition, conn)
+
+            # 不属于任何分区的计数（分区已删除）
+            orphans = await LogCounter.all().using_db(conn).values("id", "day")
+            orphan_ids = [
+                row["id"] for row in orphans
+                if row["day"].strftime("%Y%m") not in {partition.key for partition in partitions}
+            ]
+            if orphan_ids:
+                await LogCounter.filter(id__in=orphan_ids).using_db(conn).delete()
+                drift += len(orphan_ids)
+
+        self._counters = None
+        if drift:
+            logger.warning(f"系统日志计数已修正: {drift} 条")
+        return drift
+
+    async def ensure_partitions(self):
+        """启动时为已登记的分区补齐表结构和新增的索引"""
+        for key in await LogPartition.all().values_list("key", flat=True):
+            await self._ensure_partition(key)
+
+    async def ensure_counters(self):
+        """启动时检查每日计数，为空且已有日志时按日志表重建（兼容升级前的数据）"""
+        if not await LogCounter.all().exists() and await LogPartition.filter(total_count__gt=0).exists():
+            await self.reconcile()
+
+    async def purge_before(self, cutoff: datetime) -> int:
+        """删除截止时间之前的日志，返回删除条数"""
+        cutoff = _to_utc(cutoff)
+        deleted = 0
+        for partition in await LogPartition.all():
+            part_start, part_end = _partition_range(partition.key)
+            if part_end <= cutoff:
+                # 整个分区都已过期，直接删除分区表
+                await self._connection().execute_script(f'DROP TABLE IF EXISTS "{partition.table_name}"')
+                async with in_transaction("default") as conn:
+                    await LogCounter.filter(
+                        day__gte=part_start.date(), day__lt=part_end.date()
+                    ).using_db(conn).delete()
+                    await partition.delete(using_db=conn)
+                self._known.discard(partition.key)
+                deleted += partition.total_count
+            elif part_start < cutoff:
+                async with in_transaction("default") as conn:
+                    count, _ = await conn.execute_query(
+                        self._sql(f'DELETE FROM "{partition.table_name}" WHERE "timestamp" < ?'), [self._time(cutoff)]
+                    )
+                    await self._recount(partition, conn)
+                deleted += count
+
+        self._counters = None
+        return deleted
+
+    async def migrate_legacy(self):
+        """把旧 system_logs 表中的日志迁移到月分区（升级后只执行一次）"""
+        migrated = 0
+        touched: Set[str] = set()
+        try:
+            while True:
+                batch = await SystemLog.all().order_by("id").limit(MIGRATE_BATCH_SIZE)
+                if not batch:
+                    break
+
+                by_key: Dict[str, List[list]] = {}
+                for log in batch:
+                    timestamp = _to_utc(log.timestamp)
+                    by_key.setdefault(_partition_key(timestamp), []).append([
+                        log.level, log.module, log.message,
+                        json.dumps(log.details, ensure_ascii=False, default=str) if log.details is not None else None,
+                        log.user, log.ip_address, log.user_agent, log.request_id, self._time(timestamp),
+                    ])
+
+                tables = {key: await self._ensure_partition(key) for key in by_key}
+                async with in_transaction("default") as conn:
+                    for key, values in by_key.items():
+                        await conn.execute_many(self._sql(INSERT_SQL.format(table=tables[key])), values)
+                    await SystemLog.filter(id__lte=batch[-1].id).using_db(conn).delete()
+                touched.update(by_key)
+                migrated += len(batch)
+        finally:
+            # 计数在全部批次之后按分区重算一次（逐批重算会反复扫描同一分区）；
+            # 中途失败时也为已提交的批次重算
+            if touched:
+                async with in_transaction("default") as conn:
+                    for key in sorted(touched):
+                        await self._recount(await LogPartition.get(key=key).using_db(conn), conn)
+                self._counters = None
+
+        if migrated:
+            logger.info(f"旧系统日志已迁移到月分区: {migrated} 条")
+
+
+# 创建全局日志存储实例
+log_store = LogStore()
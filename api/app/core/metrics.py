@@ -0,0 +1,356 @@
+"""
+共享内存请求指标 - 多个 worker 进程写入同一个内存映射文件，任意 worker 读取汇总
+
+文件按 worker 分槽，每个槽只由占用它的进程写入（单写者），因此记录请求时无需加锁；
+读取方把所有槽累加得到全局统计。只有占用槽、初始化文件和重置时使用文件锁。
+
+布局（均为 8 字节无符号整数，按机器字节序）：
+    文件头：魔数、版本、槽数、每槽路由数、直方图桶数、重置纪元、创建时间
+    每个槽：槽头（进程号、纪元、路由数、启动时间）
+            + 最近几分钟的请求环（分钟序号、请求数、错误数、总耗时）
+            + 路由表（路由键 + 请求数、错误数、总耗时、最大耗时 + 耗时直方图）
+耗时单位为微秒。
+
+重置只递增文件头中的纪元：读取方忽略纪元不同的槽，各 worker 下次写入时清零自己的槽。
+"""
+import logging
+import mmap
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from app.config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = 0x48515858_4D455452  # "HQXXMETR"
+VERSION = 1
+
+# 耗时直方图桶上界（毫秒），最后一个桶为 +Inf
+BUCKET_BOUNDS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+BUCKETS = len(BUCKET_BOUNDS_MS) + 1
+_BUCKET_BOUNDS_US = [bound * 1000 for bound in BUCKET_BOUNDS_MS]
+
+MAX_WORKERS = 32
+MAX_ROUTES = 256
+# 路由表满后其余路由计入该键
+OVERFLOW_ROUTE = "<other>"
+
+# 最近请求按分钟统计，保留的分钟数（比统计窗口多一分钟，避免读到正在覆盖的分钟）
+RECENT_MINUTES = 6
+RECENT_WINDOW_MINUTES = 5
+
+WORD = 8
+HEADER_WORDS = 8
+SLOT_HEADER_WORDS = 8
+RECENT_WORDS = 4
+KEY_BYTES = 128
+KEY_WORDS = KEY_BYTES // WORD
+ROUTE_STAT_WORDS = 4  # 请求数、错误数、总耗时、最大耗时
+ROUTE_WORDS = KEY_WORDS + ROUTE_STAT_WORDS + BUCKETS
+SLOT_WORDS = SLOT_HEADER_WORDS + RECENT_MINUTES * RECENT_WORDS + MAX_ROUTES * ROUTE_WORDS
+FILE_SIZE = (HEADER_WORDS + MAX_WORKERS * SLOT_WORDS) * WORD
+
+# 文件头字段
+H_MAGIC, H_VERSION, H_SLOTS, H_ROUTES, H_BUCKETS, H_EPOCH, H_CREATED = range(7)
+# 槽头字段
+S_PID, S_EPOCH, S_ROUTES, S_STARTED = range(4)
+# 路由统计字段（相对路由键之后）
+R_COUNT, R_ERRORS, R_DURATION, R_MAX = range(4)
+
+
+def _layout() -> List[int]:
+    return [MAGIC, VERSION, MAX_WORKERS, MAX_ROUTES, BUCKETS]
+
+
+def _slot_base(slot: int) -> int:
+    return HEADER_WORDS + slot * SLOT_WORDS
+
+
+def _recent_base(slot: int) -> int:
+    return _slot_base(slot) + SLOT_HEADER_WORDS
+
+
+def _route_base(slot: int, index: int) -> int:
+    return _recent_base(slot) + RECENT_MINUTES * RECENT_WORDS + index * ROUTE_WORDS
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _percentile(buckets: List[int], count: int, quantile: float) -> Optional[float]:
+    """按直方图估算分位数（取所在桶的上界，毫秒）"""
+    if not count:
+        return None
+    rank = quantile * count
+    seen = 0
+    for index, bucket in enumerate(buckets):
+        seen += bucket
+        if seen >= rank:
+            return float(BUCKET_BOUNDS_MS[index]) if index < len(BUCKET_BOUNDS_MS) else None
+    return None
+
+
+class MetricsStore:
+    """共享内存请求指标"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+        self._mm: Optional[mmap.mmap] = None
+        self._words: Optional[memoryview] = None
+        self._pid = 0
+        self._slot = -1
+        self._epoch = -1
+        self._routes: Dict[str, int] = {}
+
+    # ---- 文件和槽 ----
+
+    @contextmanager
+    def _locked(self):
+        """文件锁（只在初始化、占用槽和重置时使用）"""
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _open(self):
+        """映射文件，布局不符时重新初始化"""
+        if self._words is not None and self._pid == os.getpid():
+            return
+        self._close()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._locked():
+            if os.fstat(self._fd).st_size != FILE_SIZE:
+                os.ftruncate(self._fd, FILE_SIZE)
+            self._mm = mmap.mmap(self._fd, FILE_SIZE)
+            self._words = memoryview(self._mm).cast("Q")
+            if list(self._words[H_MAGIC:H_BUCKETS + 1]) != _layout():
+                self._mm[:] = bytes(FILE_SIZE)
+                for index, value in enumerate(_layout()):
+                    self._words[index] = value
+                self._words[H_CREATED] = int(time.time())
+        self._pid = os.getpid()
+        self._slot = -1
+
+    def _close(self):
+        if self._words is not None:
+            self._words.release()
+            self._words = None
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _claim(self):
+        """
+        为当前进程占用一个槽：优先使用空槽，没有空槽时复用进程已退出的槽
+        （已退出 worker 的统计保留到其槽被复用为止）
+        """
+        words = self._words
+        with self._locked():
+            pid = os.getpid()
+            pids = [words[_slot_base(slot) + S_PID] for slot in range(MAX_WORKERS)]
+            candidates = (
+                [slot for slot, owner in enumerate(pids) if owner == pid]
+                or [slot for slot, owner in enumerate(pids) if not owner]
+                or [slot for slot, owner in enumerate(pids) if not _pid_alive(owner)]
+            )
+            if not candidates:
+                raise RuntimeError(f"No free metrics slot (max {MAX_WORKERS} workers)")
+            self._slot = candidates[0]
+            self._reset_slot()
+            base = _slot_base(self._slot)
+            words[base + S_PID] = pid
+            words[base + S_STARTED] = int(time.time())
+
+    def _reset_slot(self):
+        """清零本进程的槽并采用当前纪元"""
+        base = _slot_base(self._slot)
+        self._words[base + S_ROUTES] = 0
+        start = _recent_base(self._slot)
+        end = base + SLOT_WORDS
+        self._mm[start * WORD:end * WORD] = bytes((end - start) * WORD)
+        self._epoch = self._words[H_EPOCH]
+        self._words[base + S_EPOCH] = self._epoch
+        self._routes = {}
+
+    def _ensure_slot(self) -> bool:
+        try:
+            self._open()
+            if self._slot < 0:
+                self._claim()
+            elif self._words[H_EPOCH] != self._epoch:
+                self._reset_slot()
+            return True
+        except (OSError, RuntimeError) as e:
+            logger.warning(f"共享内存指标不可用: {e}")
+            self._slot = -1
+            return False
+
+    def _route_index(self, route: str) -> int:
+        index = self._routes.get(route)
+        if index is not None:
+            return index
+        words = self._words
+        base = _slot_base(self._slot)
+        count = words[base + S_ROUTES]
+        if count >= MAX_ROUTES - 1 and route != OVERFLOW_ROUTE:
+            return self._route_index(OVERFLOW_ROUTE)
+        # 先写路由键再增加路由数，读取方看到的路由都是完整的
+        key = route.encode("utf-8")[:KEY_BYTES]
+        offset = _route_base(self._slot, count) * WORD
+        self._mm[offset:offset + KEY_BYTES] = key.ljust(KEY_BYTES, b"\0")
+        words[base + S_ROUTES] = count + 1
+        self._routes[route] = count
+        return count
+
+    # ---- 写入 ----
+
+    def record(self, route: str, duration: float, error: bool):
+        """记录一次请求（duration 为秒）"""
+        if (self._slot < 0 or self._pid != os.getpid() or self._words[H_EPOCH] != self._epoch) \
+                and not self._ensure_slot():
+            return
+        words = self._words
+        duration_us = int(duration * 1_000_000)
+
+        base = _route_base(self._slot, self._route_index(route)) + KEY_WORDS
+        words[base + R_COUNT] += 1
+        if error:
+            words[base + R_ERRORS] += 1
+        words[base + R_DURATION] += duration_us
+        if duration_us > words[base + R_MAX]:
+            words[base + R_MAX] = duration_us
+        words[base + ROUTE_STAT_WORDS + bisect_left(_BUCKET_BOUNDS_US, duration_us)] += 1
+
+        # 最近请求环：按分钟序号定位，序号不同说明是旧数据，先清零
+        minute = int(time.time() // 60)
+        recent = _recent_base(self._slot) + (minute % RECENT_MINUTES) * RECENT_WORDS
+        if words[recent] != minute:
+            words[recent + 1] = words[recent + 2] = words[recent + 3] = 0
+            words[recent] = minute
+        words[recent + 1] += 1
+        if error:
+            words[recent + 2] += 1
+        words[recent + 3] += duration_us
+
+    # ---- 读取 ----
+
+    def snapshot(self) -> Dict:
+        """
+        所有 worker 的汇总统计
+
+        先整体复制共享内存再解析，得到一个时间点的快照；各槽由不同进程独立写入，
+        快照中的计数可能相差正在进行的几次写入。
+        """
+        # 共享内存不可用时按空数据汇总
+        data = bytes(self._mm) if self._ensure_slot() else bytes(FILE_SIZE)
+        words = memoryview(data).cast("Q")
+        epoch = words[H_EPOCH]
+        minute = int(time.time() // 60)
+
+        routes: Dict[str, Dict] = {}
+        recent = {"count": 0, "errors": 0, "duration_us": 0}
+        workers = []
+        for slot in range(MAX_WORKERS):
+            base = _slot_base(slot)
+            pid = words[base + S_PID]
+            if not pid or words[base + S_EPOCH] != epoch:
+                continue
+            workers.append({"pid": pid, "alive": _pid_alive(pid), "started_at": words[base + S_STARTED]})
+
+            for index in range(RECENT_MINUTES):
+                entry = _recent_base(slot) + index * RECENT_WORDS
+                if 0 <= minute - words[entry] < RECENT_WINDOW_MINUTES:
+                    recent["count"] += words[entry + 1]
+                    recent["errors"] += words[entry + 2]
+                    recent["duration_us"] += words[entry + 3]
+
+            for index in range(min(words[base + S_ROUTES], MAX_ROUTES)):
+                route_base = _route_base(slot, index)
+                key = data[route_base * WORD:route_base * WORD + KEY_BYTES].rstrip(b"\0").decode("utf-8", "replace")
+                stats = routes.setdefault(key, {"count": 0, "errors": 0, "duration_us": 0, "max_us": 0, "buckets": [0] * BUCKETS})
+                stat_base = route_base + KEY_WORDS
+                stats["count"] += words[stat_base + R_COUNT]
+                stats["errors"] += words[stat_base + R_ERRORS]
+                stats["duration_us"] += words[stat_base + R_DURATION]
+                stats["max_us"] = max(stats["max_us"], words[stat_base + R_MAX])
+                for bucket in range(BUCKETS):
+                    stats["buckets"][bucket] += words[stat_base + ROUTE_STAT_WORDS + bucket]
+        words.release()
+
+        totals = {"count": 0, "errors": 0, "duration_us": 0, "max_us": 0, "buckets": [0] * BUCKETS}
+        result_routes = {}
+        for key, stats in routes.items():
+            totals["count"] += stats["count"]
+            totals["errors"] += stats["errors"]
+            totals["duration_us"] += stats["duration_us"]
+            totals["max_us"] = max(totals["max_us"], stats["max_us"])
+            totals["buckets"] = [a + b for a, b in zip(totals["buckets"], stats["buckets"])]
+            result_routes[key] = self._summarize(stats)
+
+        return {
+            "workers": len(workers),
+            "live_workers": sum(1 for worker in workers if worker["alive"]),
+            "started_at": min((worker["started_at"] for worker in workers if worker["alive"]), default=None),
+            "totals": self._summarize(totals),
+            "recent": {
+                "count": recent["count"],
+                "errors": recent["errors"],
+                "avg_ms": round(recent["duration_us"] / recent["count"] / 1000, 2) if recent["count"] else 0,
+            },
+            "routes": result_routes,
+        }
+
+    @staticmethod
+    def _summarize(stats: Dict) -> Dict:
+        count = stats["count"]
+        max_ms = round(stats["max_us"] / 1000, 2)
+
+        def percentile(quantile: float) -> Optional[float]:
+            # 桶上界不超过实际最大耗时
+            value = _percentile(stats["buckets"], count, quantile)
+            return min(value, max_ms) if value is not None else (max_ms if count else None)
+
+        return {
+            "count": count,
+            "errors": stats["errors"],
+            "avg_ms": round(stats["duration_us"] / count / 1000, 2) if count else 0,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": max_ms,
+            "buckets": dict(zip([f"le_{bound}ms" for bound in BUCKET_BOUNDS_MS] + ["inf"], stats["buckets"])),
+        }
+
+    def reset(self):
+        """清零所有 worker 的统计（递增纪元，各 worker 下次写入时清零自己的槽）"""
+        if not self._ensure_slot():
+            return
+        with self._locked():
+            self._words[H_EPOCH] += 1
+        self._reset_slot()
+
+
+# 创建全局指标实例
+metrics_store = MetricsStore(settings.METRICS_FILE)
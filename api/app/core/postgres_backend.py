@@ -0,0 +1,263 @@
+"""
+PostgreSQL 后端支持 - 备份、恢复和试题搜索
+
+备份文件格式（流式 COPY，不依赖 pg_dump）：
+    MAGIC
+    每张表：头帧（JSON: 表名、列名） + 若干数据帧（COPY BINARY 输出） + 空帧
+    帧 = 4 字节大端长度 + 内容
+备份在只读的可重复读事务中执行，得到一致的快照且不阻塞写入。
+
+恢复在一个事务中完成：清空全部表，把外键临时设为延迟检查后按备份逐表 COPY，
+最后检查外键、恢复约束并重置自增序列。事务提交前其他连接看到的仍是旧数据。
+"""
+import json
+import logging
+import struct
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Tuple
+import aiofiles
+from tortoise import Tortoise
+from app.core.backup_jobs import Job
+from app.core.log_store import CREATE_PARTITION_SQL, ID_COLUMNS, TABLE_PREFIX
+
+logger = logging.getLogger(__name__)
+
+DUMP_MAGIC = b"HQXX-PGDUMP 1\n"
+
+_FRAME = struct.Struct(">I")
+
+# 恢复时等待其他连接释放表锁的最长时间
+LOCK_TIMEOUT = "30s"
+
+# 试题搜索使用的三元组索引（gin_trgm_ops 支持 ILIKE '%关键词%'，对中文同样有效）
+TRGM_INDEXES = {
+    "idx_questions_title_trgm": "title",
+    "idx_questions_content_trgm": "content",
+    "idx_questions_tags_trgm": "tags",
+}
+
+
+# pg_trgm 是否可用（启动时检查）
+_trigram_enabled = False
+
+
+class DumpFormatError(ValueError):
+    """备份文件不是 PostgreSQL 备份或已损坏"""
+
+
+def is_postgres() -> bool:
+    return Tortoise.get_connection("default").capabilities.dialect == "postgres"
+
+
+def is_dump(path: Path) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(DUMP_MAGIC)) == DUMP_MAGIC
+
+
+def _frame(data: bytes) -> bytes:
+    return _FRAME.pack(len(data)) + data
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+async def _tables(conn) -> List[Tuple[str, List[str]]]:
+    """当前 schema 中的全部表及其列"""
+    rows = await conn.fetch(
+        "SELECT table_name, array_agg(column_name::text ORDER BY ordinal_position) AS columns "
+        "FROM information_schema.columns "
+        "WHERE table_schema = current_schema() "
+        "AND table_name IN (SELECT tablename FROM pg_tables WHERE schemaname = current_schema()) "
+        "GROUP BY table_name ORDER BY table_name"
+    )
+    return [(row["table_name"], list(row["columns"])) for row in rows]
+
+
+async def dump_database(job: Job, dest: Path, span: Tuple[float, float] = (0.0, 100.0)) -> int:
+    """把当前数据库导出到 dest，进度映射到 span 区间，返回文件大小"""
+    tmp_path = dest.with_name(f".{dest.name}.tmp")
+    start, end = span
+    client = Tortoise.get_connection("default")
+    try:
+        async with client.acquire_connection() as conn:
+            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                await conn.execute("SET LOCAL statement_timeout = 0")
+                tables = await _tables(conn)
+                async with aiofiles.open(tmp_path, "wb") as f:
+                    await f.write(DUMP_MAGIC)
+
+                    async def sink(data: bytes):
+                        await f.write(_frame(data))
+
+                    for index, (table, columns) in enumerate(tables):
+                        header = json.dumps({"table": table, "columns": columns}).encode()
+                        await f.write(_frame(header))
+                        await conn.copy_from_table(table, columns=columns, output=sink, format="binary")
+                        await f.write(_frame(b""))
+                        job.update(progress=start + (end - start) * (index + 1) / max(len(tables), 1))
+    except Exception:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    tmp_path.replace(dest)
+    return dest.stat().st_size
+
+
+class _DumpReader:
+    """按帧读取备份文件"""
+
+    def __init__(self, f):
+        self.f = f
+
+    async def frame(self) -> Optional[bytes]:
+        """下一帧，文件结束时返回 None"""
+        size = await self.f.read(_FRAME.size)
+        if not size:
+            return None
+        if len(size) != _FRAME.size:
+            raise DumpFormatError("Truncated backup file")
+        (length,) = _FRAME.unpack(size)
+        data = await self.f.read(length)
+        if len(data) != length:
+            raise DumpFormatError("Truncated backup file")
+        return data
+
+    async def table_data(self) -> AsyncIterator[bytes]:
+        """当前表的 COPY 数据，读到空帧结束"""
+        while True:
+            data = await self.frame()
+            if data is None:
+                raise DumpFormatError("Truncated backup file")
+            if not data:
+                return
+            yield data
+
+
+async def load_dump(job: Job, source: Path, span: Tuple[float, float] = (0.0, 100.0)):
+    """用备份文件整体替换当前数据库的数据"""
+    start, end = span
+    total_size = source.stat().st_size
+    client = Tortoise.get_connection("default")
+
+    async with client.acquire_connection() as conn:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL statement_timeout = 0")
+            await conn.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+
+            existing = {table for table, _ in await _tables(conn)}
+            if existing:
+                await conn.execute(
+                    f"TRUNCATE {', '.join(_quote(table) for table in sorted(existing))} RESTART IDENTITY CASCADE"
+                )
+
+            # 外键临时改为延迟检查，表之间（包括分类的自引用）无需按依赖顺序导入
+            foreign_keys = await conn.fetch(
+                "SELECT conrelid::regclass::text AS table_name, quote_ident(conname) AS name "
+                "FROM pg_constraint WHERE contype = 'f' AND NOT condeferrable "
+                "AND connamespace = current_schema()::regnamespace"
+            )
+            for fk in foreign_keys:
+                await conn.execute(
+                    f"ALTER TABLE {fk['table_name']} ALTER CONSTRAINT {fk['name']} DEFERRABLE INITIALLY DEFERRED"
+                )
+            await conn.execute("SET CONSTRAINTS ALL DEFERRED")
+
+            async with aiofiles.open(source, "rb") as f:
+                if await f.read(len(DUMP_MAGIC)) != DUMP_MAGIC:
+                    raise DumpFormatError("Not a PostgreSQL backup")
+                reader = _DumpReader(f)
+                while True:
+                    header = await reader.frame()
+                    if header is None:
+                        break
+                    info = json.loads(header)
+                    table, columns = info["table"], info["columns"]
+                    if table not in existing and table.startswith(TABLE_PREFIX):
+                        await conn.execute(CREATE_PARTITION_SQL.format(table=table, id_column=ID_COLUMNS["postgres"]))
+                        existing.add(table)
+                    if table in existing:
+                        await conn.copy_to_table(table, columns=columns, source=reader.table_data(), format="binary")
+                    else:
+                        logger.warning(f"恢复时跳过当前数据库中不存在的表: {table}")
+                        async for _ in reader.table_data():
+                            pass
+                    job.update(progress=start + (end - start) * await f.tell() / max(total_size, 1))
+
+            # 检查外键并恢复为立即检查
+            await conn.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            for fk in foreign_keys:
+                await conn.execute(f"ALTER TABLE {fk['table_name']} ALTER CONSTRAINT {fk['name']} NOT DEFERRABLE")
+
+            # 自增序列从已有的最大ID继续
+            sequences = await conn.fetch(
+                "SELECT table_name, column_name FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND column_default LIKE 'nextval(%'"
+            )
+            for row in sequences:
+                table, column = _quote(row["table_name"]), _quote(row["column_name"])
+                await conn.execute(
+                    f"SELECT setval(pg_get_serial_sequence($1, $2), COALESCE(MAX({column}), 1), MAX({column}) IS NOT NULL) "
+                    f"FROM {table}",
+                    table, row["column_name"]
+                )
+
+
+async def ensure_search_indexes():
+    """迁移时为试题搜索创建三元组索引（需要 pg_trgm 扩展）"""
+    global _trigram_enabled
+    if not is_postgres():
+        return
+    client = Tortoise.get_connection("default")
+    try:
+        await client.execute_script("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except Exception as e:
+        logger.warning(f"无法启用 pg_trgm 扩展，试题搜索将使用顺序扫描: {e}")
+        return
+    for name, column in TRGM_INDEXES.items():
+        await client.execute_script(
+            f'CREATE INDEX IF NOT EXISTS "{name}" ON "questions" USING gin ("{column}" gin_trgm_ops)'
+        )
+    _trigram_enabled = True
+
+
+async def detect_search_indexes():
+    """启动时检查 pg_trgm 是否已由迁移启用（不执行DDL）"""
+    global _trigram_enabled
+    if not is_postgres():
+        return
+    rows = await Tortoise.get_connection("default").execute_query_dict(
+        "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+    )
+    _trigram_enabled = bool(rows)
+
+
+def _like(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+async def search_question_ids(terms: List[str], limit: int) -> List[int]:
+    """
+    每个关键词都出现在标题、内容或标签中的激活试题ID，按标题相似度和创建时间排序
+
+    ILIKE 由三元组索引支持，不需要全表扫描；pg_trgm 不可用时只按创建时间排序。
+    """
+    clauses = []
+    params: list = []
+    for term in terms:
+        params.append(_like(term))
+        placeholder = f"${len(params)}"
+        clauses.append(
+            f'("title" ILIKE {placeholder} OR "content" ILIKE {placeholder} OR "tags" ILIKE {placeholder})'
+        )
+    order = '"created_at" DESC'
+    if _trigram_enabled:
+        params.append(" ".join(terms))
+        order = f'similarity("title", ${len(params)}) DESC, {order}'
+    params.append(limit)
+    rows = await Tortoise.get_connection("default").execute_query_dict(
+        f'SELECT "id" FROM "questions" WHERE "is_active" AND {" AND ".join(clauses)} '
+        f'ORDER BY {order} LIMIT ${len(params)}',
+        params
+    )
+    return [row["id"] for row in rows]
@@ -0,0 +1,110 @@
+"""
+热点查询执行计划检查
+
+复合索引在 app.migrate.INDEXES 中声明，由 python -m app.migrate（或 AUTO_MIGRATE）创建。
+迁移时对热点查询执行 EXPLAIN QUERY PLAN，计划中出现全表扫描时记录警告，
+便于在模型或查询改动后及时发现缺失的索引。
+"""
+import logging
+import re
+from typing import List, Optional, Tuple
+from tortoise import Tortoise
+from app.models.system_log import LogPartition
+
+logger = logging.getLogger(__name__)
+
+# (名称, SQL, 参数)；参数只用于生成计划，取值不影响结果
+HOT_QUERIES: List[Tuple[str, str, list]] = [
+    (
+        "public_random_question",
+        'SELECT * FROM "questions" WHERE "semester_id" = ? AND "grade_id" = ? AND "subject_id" = ? '
+        'AND "category_id" = ? AND "is_active" = ? AND "is_published" = ? AND "difficulty" = ?',
+        [1, 1, 1, 1, 1, 1, 1],
+    ),
+    (
+        "public_question_list",
+        'SELECT * FROM "questions" WHERE "is_active" = ? AND "is_published" = ? AND "semester_id" = ? '
+        'ORDER BY "created_at" DESC LIMIT 20',
+        [1, 1, 1],
+    ),
+    (
+        "admin_question_list",
+        'SELECT * FROM "questions" ORDER BY "created_at" DESC LIMIT 20',
+        [],
+    ),
+    (
+        "admin_question_list_by_category",
+        'SELECT * FROM "questions" WHERE "category_id" IN (?, ?) ORDER BY "created_at" DESC LIMIT 20',
+        [1, 2],
+    ),
+    (
+        "question_counts",
+        'SELECT "semester_id", "grade_id", "subject_id", "category_id", COUNT(*) FROM "questions" '
+        'WHERE "semester_id" = ? GROUP BY "grade_id", "subject_id", "category_id"',
+        [1],
+    ),
+    (
+        "category_descendants",
+        'SELECT "descendant_id" FROM "category_closure" WHERE "ancestor_id" = ?',
+        [1],
+    ),
+    (
+        "log_counters_range",
+        'SELECT * FROM "log_counters" WHERE "day" >= ? AND "day" <= ?',
+        ["2024-01-01", "2024-01-31"],
+    ),
+]
+
+# SQLite 全表扫描的计划行：“SCAN questions”（旧版本为 “SCAN TABLE questions”），
+# 带 USING INDEX 的是按索引顺序扫描，不算全表扫描
+_FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\S+)(?: AS \S+)?$")
+
+
+async def _log_queries() -> List[Tuple[str, str, list]]:
+    """最新日志分区上的日志查询（分区表名是动态的）"""
+    partition = await LogPartition.all().order_by("-key").first()
+    if not partition:
+        return []
+    table = partition.table_name
+    return [
+        (
+            "logs_by_module_user",
+            f'SELECT * FROM "{table}" WHERE "module" = ? AND "user" LIKE ? '
+            f'ORDER BY "timestamp" DESC, "id" DESC LIMIT 20',
+            ["auth", "%admin%"],
+        ),
+        (
+            "logs_by_time",
+            f'SELECT * FROM "{table}" WHERE "timestamp" >= ? ORDER BY "timestamp" DESC, "id" DESC LIMIT 20',
+            ["2024-01-01 00:00:00.000000"],
+        ),
+    ]
+
+
+async def explain(sql: str, params: Optional[list] = None) -> List[str]:
+    """返回查询计划的各行说明"""
+    rows = await Tortoise.get_connection("default").execute_query_dict(f"EXPLAIN QUERY PLAN {sql}", params or [])
+    return [row["detail"] for row in rows]
+
+
+async def check_query_plans() -> List[dict]:
+    """检查热点查询的执行计划，返回出现全表扫描的查询（仅支持 SQLite）"""
+    client = Tortoise.get_connection("default")
+    if client.capabilities.dialect != "sqlite":
+        return []
+
+    # 让 SQLite 按需更新统计信息，计划与线上一致
+    await client.execute_script("PRAGMA optimize")
+
+    problems = []
+    for name, sql, params in HOT_QUERIES + await _log_queries():
+        try:
+            plan = await explain(sql, params)
+        except Exception as e:
+            logger.warning(f"热点查询 {name} 无法生成执行计划: {e}")
+            continue
+        scans = [match.group(1) for match in map(_FULL_SCAN.match, plan) if match]
+        if scans:
+            logger.warning(f"热点查询 {name} 对 {', '.join(scans)} 执行全表扫描，请检查索引: {' | '.join(plan)}")
+            problems.append({"name": name, "tables": scans, "plan": plan})
+    return problems
@@ -0,0 +1,260 @@
+"""
+已发布试题的静态快照包
+
+每个 (学期, 年级, 学科, 分类) 的已发布试题渲染为一个按内容哈希命名的JSON文件，
+并预先生成 .gz 压缩版本，由 Nginx 直接作为静态文件提供；
+manifest.json 记录每组试题当前对应的文件，前台只需请求清单接口。
+
+清单接口允许客户端缓存 MANIFEST_MAX_AGE 秒，被替换或移除的快照文件不立即删除：
+替换时刷新文件修改时间，之后由定时的缓存预热任务清理超过 RETIRED_BUNDLE_MAX_AGE 的未引用文件，
+持有旧清单的客户端在此期间仍能取到文件。
+
+多个 worker 可能同时重建快照包：修改清单时持有快照目录下 .manifest.lock 的文件锁，
+并在持锁后重新读取清单，避免互相覆盖对方写入的条目。
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows 下不支持文件锁，按单进程处理
+    fcntl = None
+
+from app.config import settings
+from app.models.question import Question
+
+logger = logging.getLogger(__name__)
+
+# 快照包中每道试题包含的字段（不含查看次数等频繁变化的数据）
+BUNDLE_FIELDS = (
+    "id", "title", "content", "answer", "difficulty", "question_type",
+    "semester_id", "grade_id", "subject_id", "category_id",
+    "tags", "source", "author", "created_at", "updated_at",
+)
+
+# 确定快照包的字段
+KEY_FIELDS = ("semester_id", "grade_id", "subject_id", "category_id")
+
+MANIFEST_NAME = "manifest.json"
+
+# 清单文件锁（以点开头，Nginx 不提供访问）
+MANIFEST_LOCK_NAME = ".manifest.lock"
+
+# 清单接口的客户端缓存时间（秒）
+MANIFEST_MAX_AGE = 30
+
+# 被替换的快照文件至少保留的时间（秒），远大于清单缓存时间，覆盖客户端取清单后再取文件的间隔
+RETIRED_BUNDLE_MAX_AGE = 300
+
+BundleKey = Tuple[int, int, int, int]
+
+
+def _key_name(key: BundleKey) -> str:
+    return "-".join(str(part) for part in key)
+
+
+def _field(row, name: str):
+    return row.get(name) if isinstance(row, dict) else getattr(row, name, None)
+
+
+def _write_atomic(path: Path, data: bytes):
+    """先写临时文件再重命名，避免 Nginx 读到写了一半的文件"""
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+class QuestionBundles:
+    """快照包构建与清单管理"""
+
+    def __init__(self, directory: str, url_prefix: str):
+        self.directory = Path(directory)
+        self.url_prefix = url_prefix.rstrip("/")
+        self._lock = asyncio.Lock()
+        self._manifest: Optional[dict] = None
+        self._manifest_mtime = 0.0
+
+    @staticmethod
+    def keys(rows: Iterable) -> Set[BundleKey]:
+        """从已发布的试题（对象或字典）中收集涉及的快照包"""
+        keys = set()
+        for row in rows:
+            if not _field(row, "is_published"):
+                continue
+            key = tuple(_field(row, field) for field in KEY_FIELDS)
+            if all(key):
+                keys.add(key)
+        return keys
+
+    def _manifest_path(self) -> Path:
+        return self.directory / MANIFEST_NAME
+
+    def manifest(self, reload: bool = False) -> dict:
+        """读取清单，文件被其他进程更新后自动重新加载（reload 时总是重新读取）"""
+        path = self._manifest_path()
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            return {"version": None, "bundles": {}}
+        if reload or self._manifest is None or mtime != self._manifest_mtime:
+            self._manifest = json.loads(path.read_text(encoding="utf-8"))
+            self._manifest_mtime = mtime
+        return self._manifest
+
+    @asynccontextmanager
+    async def _manifest_locked(self):
+        """进程内锁 + 跨进程文件锁，保证同一时间只有一处修改清单"""
+        async with self._lock:
+            await asyncio.to_thread(self.directory.mkdir, parents=True, exist_ok=True)
+            fd = os.open(self.directory / MANIFEST_LOCK_NAME, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                # 关闭文件即释放文件锁
+                os.close(fd)
+
+    async def _render(self, key: BundleKey) -> Optional[Tuple[bytes, int]]:
+        """渲染一组已发布试题，没有试题时返回 None"""
+        rows = await Question.filter(
+            **dict(zip(KEY_FIELDS, key)), is_active=True, is_published=True
+        ).order_by("-created_at").values(*BUNDLE_FIELDS)
+        if not rows:
+            return None
+        body = json.dumps(rows, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+        return body, len(rows)
+
+    def _store(self, key: BundleKey, body: bytes, count: int, old_entry: Optional[dict]) -> dict:
+        """写入快照文件及其压缩版本，返回清单条目"""
+        digest = hashlib.sha256(body).hexdigest()[:16]
+        if old_entry and old_entry.get("hash") == digest:
+            return old_entry
+
+        filename = f"{_key_name(key)}.{digest}.json"
+        _write_atomic(self.directory / filename, body)
+        _write_atomic(self.directory / f"{filename}.gz", gzip.compress(body, compresslevel=9, mtime=0))
+        return {
+            "file": filename,
+            "url": f"{self.url_prefix}/{filename}",
+            "hash": digest,
+            "count": count,
+            "size": len(body),
+        }
+
+    def _retire(self, entry: Optional[dict]):
+        """标记旧版本文件：刷新修改时间，保留期从替换时开始计算"""
+        if not entry:
+            return
+        for name in (entry["file"], f"{entry['file']}.gz"):
+            try:
+                os.utime(self.directory / name)
+            except FileNotFoundError:
+                pass
+
+    def _collect_garbage(self, manifest: dict, min_age: float) -> int:
+        """删除清单未引用且超过保留时间的快照文件，返回删除的文件数"""
+        referenced: Set[str] = set()
+        for entry in manifest.get("bundles", {}).values():
+            referenced.update((entry["file"], f"{entry['file']}.gz"))
+
+        removed = 0
+        now = time.time()
+        for path in self.directory.glob("*.json*"):
+            name = path.name
+            if name == MANIFEST_NAME or name in referenced or not name.endswith((".json", ".json.gz")):
+                continue
+            try:
+                if now - path.stat().st_mtime < min_age:
+                    continue
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            removed += 1
+        return removed
+
+    async def collect_garbage(self, min_age: float = RETIRED_BUNDLE_MAX_AGE) -> int:
+        """清理被替换的旧快照文件（由定时任务调用），返回删除的文件数"""
+        if not self._manifest_path().exists():
+            return 0
+        async with self._manifest_locked():
+            manifest = self.manifest(reload=True)
+            removed = await asyncio.to_thread(self._collect_garbage, manifest, min_age)
+        if removed:
+            logger.info(f"已清理旧试题快照文件: {removed} 个")
+        return removed
+
+    async def rebuild(self, keys: Optional[Iterable[BundleKey]] = None) -> dict:
+        """
+        重建指定快照包，keys 为空时重建全部
+
+        内容未变化的快照包保留原文件；全部重建时会移除已无试题的快照包。
+        """
+        async with self._manifest_locked():
+            # 其他 worker 可能刚写入新清单，持锁后重新读取
+            manifest = self.manifest(reload=True)
+            bundles: Dict[str, dict] = dict(manifest.get("bundles", {}))
+
+            if keys is None:
+                rows = await Question.filter(is_active=True, is_published=True).distinct().values(*KEY_FIELDS)
+                keys = {tuple(row[field] for field in KEY_FIELDS) for row in rows}
+                stale = set(bundles) - {_key_name(key) for key in keys}
+            else:
+                stale = set()
+
+            replaced = []
+            for key in keys:
+                name = _key_name(key)
+                old_entry = bundles.get(name)
+                rendered = await self._render(key)
+                if rendered is None:
+                    stale.add(name)
+                    continue
+                entry = await asyncio.to_thread(self._store, key, rendered[0], rendered[1], old_entry)
+                if entry is not old_entry:
+                    replaced.append(old_entry)
+                bundles[name] = entry
+
+            removed = [entry for entry in (bundles.pop(name, None) for name in stale) if entry]
+            if not replaced and not removed and manifest.get("version"):
+                return manifest
+
+            manifest = {"version": str(time.time_ns()), "bundles": bundles}
+            body = json.dumps(manifest, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            await asyncio.to_thread(_write_atomic, self._manifest_path(), body)
+
+            # 缓存了旧清单的客户端仍会请求旧文件，保留到 collect_garbage 清理
+            for entry in replaced + removed:
+                await asyncio.to_thread(self._retire, entry)
+
+        logger.info(f"试题快照包已更新: {len(bundles)} 个, 移除 {len(removed)} 个")
+        return manifest
+
+    async def ensure_built(self):
+        """启动时检查清单，不存在时全部重建"""
+        if not self._manifest_path().exists():
+            await self.rebuild()
+
+    async def rebuild_for(self, *row_groups: Iterable):
+        """按试题写入前后的数据重建涉及的快照包（只处理已发布的试题）"""
+        keys: Set[BundleKey] = set()
+        for rows in row_groups:
+            keys |= self.keys(rows)
+        if keys:
+            try:
+                await self.rebuild(keys)
+            except OSError as e:
+                # 快照包只是加速手段，写入失败不影响试题保存
+                logger.error(f"试题快照包更新失败: {e}")
+
+
+# 创建全局快照包实例
+question_bundles = QuestionBundles(settings.SNAPSHOT_DIR, settings.SNAPSHOT_URL_PREFIX)
@@ -0,0 +1,127 @@
+"""
+试题数量统计 - 按学期、年级、学科、分类维护试题总数和激活数
+
+试题写入后只重新聚合受影响的ID，读取时一次查询即可取出多个对象的数量，
+避免在搜索、统计接口中逐个执行 count()。
+"""
+import logging
+from typing import Dict, Iterable, List, Optional, Set
+from tortoise.functions import Count
+from tortoise.transactions import in_transaction
+from app.models.question import Question, QuestionCount
+
+logger = logging.getLogger(__name__)
+
+# 维护数量的类型
+COUNT_KINDS = ("semester", "grade", "subject", "category")
+
+# 影响数量的试题字段
+COUNT_FIELDS = ("semester_id", "grade_id", "subject_id", "category_id", "is_active")
+
+
+def _field(row, name: str):
+    return row.get(name) if isinstance(row, dict) else getattr(row, name, None)
+
+
+class QuestionCounts:
+    """试题数量维护与读取"""
+
+    @staticmethod
+    def affects(update_data: dict) -> bool:
+        """更新数据是否会影响试题数量"""
+        return any(field in update_data for field in COUNT_FIELDS)
+
+    @staticmethod
+    def refs(rows: Iterable) -> Dict[str, Set[int]]:
+        """从试题（对象或字典）中收集涉及的学期、年级、学科、分类ID"""
+        refs: Dict[str, Set[int]] = {kind: set() for kind in COUNT_KINDS}
+        for row in rows:
+            for kind in COUNT_KINDS:
+                value = _field(row, f"{kind}_id")
+                if value:
+                    refs[kind].add(value)
+        return refs
+
+    @staticmethod
+    async def _aggregate(kind: str, ids: Optional[Set[int]], conn) -> Dict[int, dict]:
+        """按 (类型ID, 是否激活) 分组统计，ids 为空时统计全部"""
+        fk_field = f"{kind}_id"
+        query = Question.all().using_db(conn)
+        if ids is not None:
+            query = query.filter(**{f"{fk_field}__in": list(ids)})
+        rows = await query.annotate(count=Count("id")).group_by(fk_field, "is_active").values(
+            fk_field, "is_active", "count"
+        )
+
+        counts: Dict[int, dict] = {}
+        for row in rows:
+            item = counts.setdefault(row[fk_field], {"question_count": 0, "active_question_count": 0})
+            item["question_count"] += row["count"]
+            if row["is_active"]:
+                item["active_question_count"] += row["count"]
+        return counts
+
+    @staticmethod
+    async def refresh(refs: Dict[str, Set[int]]):
+        """重新统计指定ID的数量"""
+        if not any(refs.values()):
+            return
+        async with in_transaction("default") as conn:
+            for kind, ids in refs.items():
+                if not ids:
+                    continue
+                counts = await QuestionCounts._aggregate(kind, ids, conn)
+                await QuestionCount.filter(kind=kind, target_id__in=list(ids)).using_db(conn).delete()
+                await QuestionCount.bulk_create([
+                    QuestionCount(kind=kind, target_id=target_id, **count)
+                    for target_id, count in counts.items()
+                ], using_db=conn)
+
+    @staticmethod
+    async def refresh_for(*row_groups: Iterable):
+        """按试题写入前后的数据重新统计，可同时传入多组试题"""
+        refs: Dict[str, Set[int]] = {kind: set() for kind in COUNT_KINDS}
+        for rows in row_groups:
+            for kind, ids in QuestionCounts.refs(rows).items():
+                refs[kind] |= ids
+        await QuestionCounts.refresh(refs)
+
+    @staticmethod
+    async def rebuild():
+        """全量重建（启动时补齐，或级联删除试题之后）"""
+        async with in_transaction("default") as conn:
+            await QuestionCount.all().using_db(conn).delete()
+            for kind in COUNT_KINDS:
+                counts = await QuestionCounts._aggregate(kind, None, conn)
+                await QuestionCount.bulk_create([
+                    QuestionCount(kind=kind, target_id=target_id, **count)
+                    for target_id, count in counts.items()
+                ], batch_size=1000, using_db=conn)
+        logger.info("试题数量统计重建完成")
+
+    @staticmethod
+    async def ensure_built():
+        """启动时检查统计表，为空且已有试题时重建（兼容升级前的数据）"""
+        if not await QuestionCount.all().exists() and await Question.all().exists():
+            await QuestionCounts.rebuild()
+
+    @staticmethod
+    async def get(kind: str, ids: Optional[List[int]] = None) -> Dict[int, dict]:
+        """
+        读取数量，返回 {ID: {"question_count", "active_question_count"}}
+
+        没有试题的ID不在结果中，读取方按 0 处理。
+        """
+        query = QuestionCount.filter(kind=kind)
+        if ids is not None:
+            if not ids:
+                return {}
+            query = query.filter(target_id__in=ids)
+        rows = await query.values("target_id", "question_count", "active_question_count")
+        return {
+            row["target_id"]: {
+                "question_count": row["question_count"],
+                "active_question_count": row["active_question_count"],
+            }
+            for row in rows
+        }
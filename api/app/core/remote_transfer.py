@@ -0,0 +1,295 @@
+"""
+远程传输 - 备份文件流式上传到 WebDAV / FTP
+
+- 文件按块从磁盘读出，不整体读入内存
+- FTP 使用阻塞的 ftplib，放到工作线程执行
+- 网络错误按指数退避重试
+- 先上传为 .part 临时文件，完成后再重命名；FTP 重试时从已上传的位置续传，
+  WebDAV 没有标准的断点续传方式，目标文件已完整存在时跳过上传
+- 可限制上传带宽（默认取 BACKUP_UPLOAD_RATE_LIMIT）
+
+服务器地址全部来自配置参数，可直接指向本地的 WebDAV/FTP 测试服务器。
+"""
+import asyncio
+import ftplib
+import logging
+import os
+import random
+import time
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from urllib.parse import quote
+import aiofiles
+import httpx
+from app.config import settings
+from app.core.http_clients import http_clients
+
+logger = logging.getLogger(__name__)
+
+# 每次读取、发送的块大小
+CHUNK_SIZE = 1024 * 1024
+
+# 重试次数与退避时间（秒）
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+
+FTP_TIMEOUT = 60
+
+PART_SUFFIX = ".part"
+
+ProgressCallback = Callable[[int, int], None]
+
+
+class TransferError(Exception):
+    """远程传输失败"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class RateLimiter:
+    """按平均速率限制传输带宽，rate 为每秒字节数，0 表示不限制"""
+
+    def __init__(self, rate: int = 0):
+        self.rate = rate
+        self._started = time.monotonic()
+        self._sent = 0
+
+    def delay(self, nbytes: int) -> float:
+        """记录发送的字节数，返回为保持速率需要等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        self._sent += nbytes
+        expected = self._sent / self.rate
+        return max(expected - (time.monotonic() - self._started), 0.0)
+
+
+def _limiter(rate_limit: Optional[int]) -> RateLimiter:
+    return RateLimiter(settings.BACKUP_UPLOAD_RATE_LIMIT if rate_limit is None else rate_limit)
+
+
+def _backoff(attempt: int) -> float:
+    return min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX) * random.uniform(0.8, 1.2)
+
+
+async def _with_retry(operation: Callable[[], Awaitable], what: str):
+    """执行传输操作，网络错误时按指数退避重试"""
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return await operation()
+        except (httpx.TransportError, OSError, EOFError, ftplib.error_temp, TransferError) as e:
+            if isinstance(e, TransferError) and not e.retryable:
+                raise
+            if attempt == MAX_ATTEMPTS - 1:
+                raise TransferError(f"{what} failed after {MAX_ATTEMPTS} attempts: {e}", retryable=False) from e
+            delay = _backoff(attempt)
+            logger.warning(f"{what} 失败，{delay:.1f} 秒后重试: {e}")
+            await asyncio.sleep(delay)
+
+
+async def iter_file(
+    path: Path,
+    offset: int = 0,
+    chunk_size: int = CHUNK_SIZE,
+    limiter: Optional[RateLimiter] = None,
+    progress: Optional[ProgressCallback] = None,
+) -> AsyncIterator[bytes]:
+    """从 offset 开始按块读取文件"""
+    total = os.path.getsize(path)
+    sent = offset
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(offset)
+        while True:
+            chunk = await f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+            sent += len(chunk)
+            if progress:
+                progress(sent, total)
+            if limiter:
+                delay = limiter.delay(len(chunk))
+                if delay:
+                    await asyncio.sleep(delay)
+
+
+def _join_url(*parts: str) -> str:
+    base = parts[0].rstrip("/")
+    path = "/".join(quote(part.strip("/")) for part in parts[1:] if part.strip("/"))
+    return f"{base}/{path}" if path else base
+
+
+async def upload_webdav(
+    path: Path,
+    filename: str,
+    config: dict,
+    rate_limit: Optional[int] = None,
+    progress: Optional[ProgressCallback] = None,
+) -> str:
+    """流式上传文件到 WebDAV，返回远程地址"""
+    size = os.path.getsize(path)
+    directory = config.get("path", "")
+    remote_url = _join_url(config["url"], directory, filename)
+    part_url = _join_url(config["url"], directory, f"{filename}{PART_SUFFIX}")
+    auth = httpx.BasicAuth(config["username"], config["password"])
+    client = http_clients.get("transfer")
+
+    # 目标文件已完整上传（如上次重命名后中断）时跳过
+    head = await client.head(remote_url, auth=auth)
+    if head.status_code == 200 and head.headers.get("content-length") == str(size):
+        if progress:
+            progress(size, size)
+        return remote_url
+
+    # 逐级创建目录，已存在时服务器返回 405
+    segments = [segment for segment in directory.strip("/").split("/") if segment]
+    for i in range(1, len(segments) + 1):
+        response = await client.request("MKCOL", _join_url(config["url"], *segments[:i]), auth=auth)
+        if response.status_code not in (201, 301, 405):
+            raise TransferError(f"WebDAV MKCOL failed: HTTP {response.status_code}", retryable=False)
+
+    async def put():
+        response = await client.put(
+            part_url,
+            auth=auth,
+            content=iter_file(path, limiter=_limiter(rate_limit), progress=progress),
+            headers={"Content-Type": "application/octet-stream", "Content-Length": str(size)},
+        )
+        if response.status_code >= 500:
+            raise TransferError(f"WebDAV upload failed: HTTP {response.status_code}")
+        if response.status_code not in (200, 201, 204):
+            raise TransferError(f"WebDAV upload failed: HTTP {response.status_code}", retryable=False)
+
+    async def move():
+        response = await client.request(
+            "MOVE", part_url, auth=auth, headers={"Destination": remote_url, "Overwrite": "T"}
+        )
+        if response.status_code >= 500:
+            raise TransferError(f"WebDAV move failed: HTTP {response.status_code}")
+        if response.status_code not in (201, 204):
+            raise TransferError(f"WebDAV move failed: HTTP {response.status_code}", retryable=False)
+
+    await _with_retry(put, "WebDAV upload")
+    await _with_retry(move, "WebDAV move")
+    return remote_url
+
+
+def _ftp_connect(config: dict) -> ftplib.FTP:
+    ftp = ftplib.FTP(timeout=FTP_TIMEOUT)
+    ftp.connect(config["host"], int(config.get("port") or 21))
+    ftp.login(config["username"], config["password"])
+    return ftp
+
+
+def _ftp_chdir(ftp: ftplib.FTP, directory: str, create: bool = True):
+    """切换到目标目录，不存在时逐级创建"""
+    if not directory:
+        return
+    try:
+        ftp.cwd(directory)
+        return
+    except ftplib.error_perm:
+        if not create:
+            raise
+    if directory.startswith("/"):
+        ftp.cwd("/")
+    for segment in (s for s in directory.split("/") if s):
+        try:
+            ftp.cwd(segment)
+        except ftplib.error_perm:
+            ftp.mkd(segment)
+            ftp.cwd(segment)
+
+
+def _ftp_size(ftp: ftplib.FTP, name: str) -> Optional[int]:
+    try:
+        ftp.voidcmd("TYPE I")
+        return ftp.size(name)
+    except ftplib.error_perm:
+        return None
+
+
+def _ftp_upload_sync(path: Path, filename: str, config: dict,
+                     limiter: RateLimiter, progress: Optional[ProgressCallback]):
+    """在工作线程中上传，已有 .part 文件时从其末尾续传"""
+    size = os.path.getsize(path)
+    part_name = f"{filename}{PART_SUFFIX}"
+    ftp = _ftp_connect(config)
+    try:
+        _ftp_chdir(ftp, config.get("path", ""))
+
+        if _ftp_size(ftp, filename) == size:
+            if progress:
+                progress(size, size)
+            return
+
+        offset = _ftp_size(ftp, part_name) or 0
+        if offset > size:
+            ftp.delete(part_name)
+            offset = 0
+
+        sent = offset
+
+        def on_block(block: bytes):
+            nonlocal sent
+            sent += len(block)
+            if progress:
+                progress(sent, size)
+            delay = limiter.delay(len(block))
+            if delay:
+                time.sleep(delay)
+
+        with open(path, "rb") as f:
+            f.seek(offset)
+            # REST 续传，服务器不支持时 storbinary 会抛出 error_perm
+            ftp.storbinary(f"STOR {part_name}", f, blocksize=CHUNK_SIZE // 16,
+                           callback=on_block, rest=offset or None)
+
+        if _ftp_size(ftp, filename) is not None:
+            ftp.delete(filename)
+        ftp.rename(part_name, filename)
+    finally:
+        try:
+            ftp.quit()
+        except ftplib.all_errors:
+            ftp.close()
+
+
+async def upload_ftp(
+    path: Path,
+    filename: str,
+    config: dict,
+    rate_limit: Optional[int] = None,
+    progress: Optional[ProgressCallback] = None,
+) -> str:
+    """上传文件到 FTP（工作线程执行），返回远程地址"""
+    limiter = _limiter(rate_limit)
+
+    async def upload():
+        try:
+            await asyncio.to_thread(_ftp_upload_sync, path, filename, config, limiter, progress)
+        except ftplib.error_perm as e:
+            raise TransferError(f"FTP upload failed: {e}", retryable=False) from e
+
+    await _with_retry(upload, "FTP upload")
+    directory = config.get("path", "").strip("/")
+    return f"ftp://{config['host']}/{directory}/{filename}" if directory else f"ftp://{config['host']}/{filename}"
+
+
+def _ftp_check_sync(config: dict):
+    ftp = _ftp_connect(config)
+    try:
+        _ftp_chdir(ftp, config.get("path", ""))
+    finally:
+        try:
+            ftp.quit()
+        except ftplib.all_errors:
+            ftp.close()
+
+
+async def check_ftp(config: dict):
+    """测试 FTP 连接和目录访问（工作线程执行）"""
+    await asyncio.to_thread(_ftp_check_sync, config)
+
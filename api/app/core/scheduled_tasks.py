@@ -0,0 +1,98 @@
+"""
+内置定时任务：自动备份、日志保留清理、缓存预热
+"""
+import json
+import logging
+from datetime import timedelta
+from typing import Optional
+from app.config import settings
+from app.core.backup_jobs import Job, job_manager
+from app.core.log_store import log_store, utcnow
+from app.core.question_bundles import question_bundles
+from app.core.question_counts import QuestionCounts
+from app.core.scheduler import ScheduledTask, Scheduler
+from app.core.taxonomy import taxonomy
+from app.models.system_config import SystemConfig, ConfigKey
+from app.models.system_log import LogModule
+from app.utils.logger import SystemLogger
+
+logger = logging.getLogger(__name__)
+
+
+async def _config_value(key: str, default=None):
+    config = await SystemConfig.filter(config_key=key, is_active=True).first()
+    if not config:
+        return default
+    try:
+        return json.loads(config.config_value)
+    except (json.JSONDecodeError, TypeError):
+        return config.config_value
+
+
+async def auto_backup_params() -> Optional[dict]:
+    """按备份配置生成备份任务参数，未开启自动备份时跳过"""
+    if not await _config_value(ConfigKey.BACKUP_AUTO, False):
+        return None
+    method = await _config_value(ConfigKey.BACKUP_METHOD, "local")
+    return {
+        "method": method,
+        "webdav_config": await _config_value(ConfigKey.BACKUP_WEBDAV) if method == "webdav" else None,
+        "ftp_config": await _config_value(ConfigKey.BACKUP_FTP) if method == "ftp" else None,
+    }
+
+
+async def log_retention_params() -> Optional[dict]:
+    if settings.LOG_RETENTION_DAYS <= 0:
+        return None
+    return {"days": settings.LOG_RETENTION_DAYS}
+
+
+async def run_log_retention(job: Job, days: int) -> dict:
+    """删除保留期之前的日志并校正日志计数"""
+    job.update(stage="purging")
+    deleted = await log_store.purge_before(utcnow() - timedelta(days=days))
+    job.update(progress=60, stage="reconciling")
+    corrected = await log_store.reconcile()
+    if deleted:
+        await SystemLogger.info(
+            module=LogModule.SYSTEM,
+            message=f"定时清理系统日志，删除 {deleted} 条记录",
+            details={"deleted_count": deleted, "days": days},
+            user="scheduler"
+        )
+    return {"deleted_count": deleted, "corrected_count": corrected}
+
+
+async def run_cache_warmup(job: Job) -> dict:
+    """预热分类体系快照，补齐缺失的试题数量和快照包，清理被替换的旧快照文件"""
+    job.update(stage="taxonomy")
+    snapshot = await taxonomy.current()
+    job.update(progress=40, stage="question_counts")
+    await QuestionCounts.ensure_built()
+    job.update(progress=70, stage="bundles")
+    await question_bundles.ensure_built()
+    removed = await question_bundles.collect_garbage()
+    return {"taxonomy_version": snapshot.version, "removed_bundle_files": removed}
+
+
+def setup_scheduled_tasks(scheduler: Scheduler):
+    """注册内置任务类型和定时任务（备份任务类型由系统路由注册）"""
+    job_manager.register("log_retention", run_log_retention)
+    job_manager.register("cache_warmup", run_cache_warmup)
+
+    scheduler.add(ScheduledTask(
+        "auto_backup", settings.BACKUP_CRON, "backup",
+        params=auto_backup_params, jitter=300, description="自动备份（需在备份配置中开启）"
+    ))
+    scheduler.add(ScheduledTask(
+        "log_retention", settings.LOG_RETENTION_CRON, "log_retention",
+        params=log_retention_params, jitter=300,
+        description=(
+            f"清理 {settings.LOG_RETENTION_DAYS} 天前的系统日志" if settings.LOG_RETENTION_DAYS > 0
+            else "清理系统日志（未设置 LOG_RETENTION_DAYS，不执行）"
+        )
+    ))
+    scheduler.add(ScheduledTask(
+        "cache_warmup", settings.CACHE_WARMUP_CRON, "cache_warmup",
+        jitter=30, description="预热分类体系快照和试题快照包，清理旧快照文件"
+    ))
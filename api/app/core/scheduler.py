@@ -0,0 +1,264 @@
+"""
+进程内定时任务调度
+
+- 使用 cron 表达式（分 时 日 月 周）指定运行时间，按本地时间计算
+- 每次运行前随机延迟（jitter），避免多个任务或多台机器同时启动
+- 多个工作进程中只有取得文件锁的进程执行任务，该进程退出后由其他进程接替
+- 任务通过后台任务引擎提交，运行记录可在任务列表中查询
+"""
+import asyncio
+import logging
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+try:
+    import fcntl
+except ImportError:  # Windows 下不支持文件锁，按单进程处理
+    fcntl = None
+
+from app.config import settings
+from app.core.backup_jobs import Job, JobConflictError, job_manager
+
+logger = logging.getLogger(__name__)
+
+# 未取得锁的进程重新尝试的间隔（秒）
+LEADER_RETRY_SECONDS = 60
+
+# 调度循环单次最长休眠时间（秒），便于及时响应停止
+MAX_SLEEP_SECONDS = 60
+
+
+class CronError(ValueError):
+    """cron 表达式格式错误"""
+
+
+class CronExpression:
+    """
+    五段 cron 表达式：分 时 日 月 周
+
+    每段支持 *、数字、范围 a-b、步长 */n 或 a-b/n 以及逗号分隔的列表；
+    周的取值为 0-6（0 为周日，7 也视为周日）。日与周都不是 * 时，满足其一即可。
+    """
+
+    RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        fields = expression.split()
+        if len(fields) != 5:
+            raise CronError(f"Invalid cron expression: {expression}")
+        parsed = [self._parse(field, low, high) for field, (low, high) in zip(fields, self.RANGES)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {0 if day == 7 else day for day in weekdays}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> Set[int]:
+        values: Set[int] = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step_text = part.split("/", 1)
+                if not step_text.isdigit() or int(step_text) == 0:
+                    raise CronError(f"Invalid cron step: {field}")
+                step = int(step_text)
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start_text, end_text = part.split("-", 1)
+                if not (start_text.isdigit() and end_text.isdigit()):
+                    raise CronError(f"Invalid cron range: {field}")
+                start, end = int(start_text), int(end_text)
+            elif part.isdigit():
+                start = end = int(part)
+            else:
+                raise CronError(f"Invalid cron field: {field}")
+            if start < low or end > high or start > end:
+                raise CronError(f"Cron value out of range: {field}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        # Python 的 weekday() 周一为 0，cron 周日为 0
+        weekday = (moment.weekday() + 1) % 7
+        day_ok = moment.day in self.days
+        weekday_ok = weekday in self.weekdays
+        if self.any_day:
+            return weekday_ok
+        if self.any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, moment: datetime) -> datetime:
+        """moment 之后的下一个运行时间（精确到分钟）"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                month_start = (candidate.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                candidate = month_start
+                continue
+            if not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+                continue
+            if candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+                continue
+            return candidate
+        raise CronError(f"Cron expression never matches: {self.expression}")
+
+
+class ScheduledTask:
+    """定时任务：到期时提交对应类型的后台任务"""
+
+    def __init__(
+        self,
+        name: str,
+        cron: str,
+        job_kind: str,
+        params: Optional[Callable[[], Awaitable[Optional[dict]]]] = None,
+        jitter: int = 0,
+        description: str = "",
+    ):
+        self.name = name
+        self.cron = CronExpression(cron)
+        self.job_kind = job_kind
+        # 返回任务参数，返回 None 表示本次跳过（如未开启自动备份）
+        self.params = params
+        self.jitter = jitter
+        self.description = description
+        self.next_run = self.cron.next_after(datetime.now())
+        self.last_run: Optional[datetime] = None
+        self.last_job_id: Optional[str] = None
+        self.last_skipped: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        last_job = job_manager.get(self.last_job_id) if self.last_job_id else None
+        return {
+            "name": self.name,
+            "cron": self.cron.expression,
+            "job_kind": self.job_kind,
+            "description": self.description,
+            "jitter": self.jitter,
+            "next_run": self.next_run.isoformat(),
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            "last_status": last_job.status if last_job else None,
+            "last_job_id": self.last_job_id,
+            "last_skipped": self.last_skipped,
+        }
+
+
+class Scheduler:
+    """定时任务调度器"""
+
+    def __init__(self, lock_path: str):
+        self.lock_path = lock_path
+        self._tasks: Dict[str, ScheduledTask] = {}
+        self._runner: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        self._lock_file = None
+
+    def add(self, task: ScheduledTask):
+        self._tasks[task.name] = task
+
+    def tasks(self) -> List[ScheduledTask]:
+        return sorted(self._tasks.values(), key=lambda task: task.next_run)
+
+    def get(self, name: str) -> Optional[ScheduledTask]:
+        return self._tasks.get(name)
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock_file is not None
+
+    def _try_lock(self) -> bool:
+        """尝试取得调度锁，只有一个进程能持有"""
+        if self._lock_file is not None:
+            return True
+        if fcntl is None:
+            self._lock_file = True
+            return True
+        os.makedirs(os.path.dirname(os.path.abspath(self.lock_path)), exist_ok=True)
+        lock_file = open(self.lock_path, "a+")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._lock_file = lock_file
+        return True
+
+    def _release_lock(self):
+        if self._lock_file not in (None, True):
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+        self._lock_file = None
+
+    def start(self):
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+        self._release_lock()
+
+    async def _run(self):
+        while not self._try_lock():
+            await asyncio.sleep(LEADER_RETRY_SECONDS)
+        logger.info(f"定时任务调度已启动（进程 {os.getpid()}），共 {len(self._tasks)} 个任务")
+
+        while True:
+            now = datetime.now()
+            for task in self.tasks():
+                if task.next_run <= now:
+                    task.next_run = task.cron.next_after(now)
+                    running = asyncio.create_task(self.run_task(task))
+                    self._running.add(running)
+                    running.add_done_callback(self._running.discard)
+            upcoming = min((task.next_run for task in self._tasks.values()), default=None)
+            delay = (upcoming - datetime.now()).total_seconds() if upcoming else MAX_SLEEP_SECONDS
+            await asyncio.sleep(min(max(delay, 1), MAX_SLEEP_SECONDS))
+
+    async def run_task(self, task: ScheduledTask, jitter: bool = True) -> Optional[Job]:
+        """运行一次定时任务，返回提交的后台任务（跳过时返回 None）"""
+        if jitter and task.jitter:
+            await asyncio.sleep(random.uniform(0, task.jitter))
+
+        task.last_run = datetime.now()
+        task.last_skipped = None
+        try:
+            params = await task.params() if task.params else {}
+            if params is None:
+                task.last_skipped = "disabled"
+                return None
+            job = job_manager.submit(task.job_kind, created_by="scheduler", **params)
+        except JobConflictError as e:
+            task.last_skipped = str(e)
+            logger.info(f"定时任务 {task.name} 跳过: {e}")
+            return None
+        except Exception as e:
+            task.last_skipped = str(e)
+            logger.exception(f"定时任务 {task.name} 提交失败")
+            return None
+        task.last_job_id = job.id
+        return job
+
+
+# 创建全局调度器实例
+scheduler = Scheduler(settings.SCHEDULER_LOCK_FILE)
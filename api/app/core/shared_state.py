@@ -0,0 +1,125 @@
+"""
+多进程共享状态 - 多个 uvicorn worker 之间需要全局一致的状态
+
+配置了Redis时状态存放在Redis中，所有 worker 读写同一份数据：
+- 文档：按类型和键存放的 JSON（后台任务状态、各 worker 的性能统计）
+- 锁：SET NX 加过期时间，持有者进程退出后自动释放
+
+未配置Redis时退化为进程内状态，只适用于单 worker 部署。
+"""
+import json
+import logging
+import os
+import socket
+from typing import Dict, Optional
+from redis.exceptions import RedisError
+from app.core.cache import cache_manager
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "hqxx:shared"
+
+
+class SharedState:
+    """跨 worker 共享状态"""
+
+    def __init__(self):
+        self._docs: Dict[str, Dict[str, dict]] = {}
+        self._locks: Dict[str, str] = {}
+
+    @property
+    def worker_id(self) -> str:
+        # 每个 worker 是独立进程，按进程号区分（fork 后进程号变化，因此不缓存）
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    @property
+    def redis(self):
+        return cache_manager.redis_client
+
+    @property
+    def is_shared(self) -> bool:
+        """状态是否在 worker 之间共享"""
+        return self.redis is not None
+
+    def _key(self, kind: str, key: str = "") -> str:
+        return f"{KEY_PREFIX}:{kind}:{key}"
+
+    def put(self, kind: str, key: str, doc: dict, ttl: int):
+        """保存文档，ttl 秒后过期"""
+        if self.redis is not None:
+            try:
+                self.redis.setex(self._key(kind, key), ttl, json.dumps(doc, ensure_ascii=False, default=str))
+                return
+            except RedisError as e:
+                logger.warning(f"共享状态写入失败，使用进程内状态: {e}")
+        self._docs.setdefault(kind, {})[key] = doc
+
+    def get(self, kind: str, key: str) -> Optional[dict]:
+        if self.redis is not None:
+            try:
+                data = self.redis.get(self._key(kind, key))
+                if data:
+                    return json.loads(data)
+            except (RedisError, ValueError) as e:
+                logger.warning(f"共享状态读取失败: {e}")
+        return self._docs.get(kind, {}).get(key)
+
+    def all(self, kind: str) -> Dict[str, dict]:
+        """某类型的全部文档"""
+        docs = dict(self._docs.get(kind, {}))
+        if self.redis is not None:
+            prefix = self._key(kind)
+            try:
+                keys = list(self.redis.scan_iter(match=f"{prefix}*", count=100))
+                for key, data in zip(keys, self.redis.mget(keys) if keys else []):
+                    if data:
+                        docs[key[len(prefix):]] = json.loads(data)
+            except (RedisError, ValueError) as e:
+                logger.warning(f"共享状态读取失败: {e}")
+        return docs
+
+    def delete(self, kind: str, key: str):
+        if self.redis is not None:
+            try:
+                self.redis.delete(self._key(kind, key))
+            except RedisError as e:
+                logger.warning(f"共享状态删除失败: {e}")
+        self._docs.get(kind, {}).pop(key, None)
+
+    def acquire(self, name: str, owner: str, ttl: int) -> bool:
+        """取得锁，已被其他持有者持有时返回 False"""
+        if self.redis is not None:
+            try:
+                return bool(self.redis.set(self._key("lock", name), owner, nx=True, ex=ttl))
+            except RedisError as e:
+                logger.warning(f"共享锁不可用，使用进程内锁: {e}")
+        if self._locks.get(name, owner) != owner:
+            return False
+        self._locks[name] = owner
+        return True
+
+    def refresh(self, name: str, owner: str, ttl: int):
+        """延长自己持有的锁的过期时间"""
+        if self.redis is not None:
+            try:
+                key = self._key("lock", name)
+                if self.redis.get(key) == owner:
+                    self.redis.expire(key, ttl)
+            except RedisError as e:
+                logger.warning(f"共享锁续期失败: {e}")
+
+    def release(self, name: str, owner: str):
+        """释放自己持有的锁"""
+        if self.redis is not None:
+            try:
+                key = self._key("lock", name)
+                if self.redis.get(key) == owner:
+                    self.redis.delete(key)
+            except RedisError as e:
+                logger.warning(f"共享锁释放失败: {e}")
+        if self._locks.get(name) == owner:
+            del self._locks[name]
+
+
+# 创建全局共享状态实例
+shared_state = SharedState()
@@ -0,0 +1,218 @@
+"""
+分类体系快照 - 学期、年级、学科、分类的进程内只读快照
+
+这几类数据很少变化，却在每次试题读写时都要关联或校验。
+快照在启动时一次加载，写入后通过版本号失效；配置了Redis时版本号
+在多个进程间共享，未配置时退化为进程内版本号加定时刷新。
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+from app.core.cache import cache_manager
+from app.models.semester import Semester
+from app.models.grade import Grade
+from app.models.subject import Subject
+from app.models.category import Category
+
+logger = logging.getLogger(__name__)
+
+# 快照最长使用时间（秒），防止未配置Redis的多进程部署长期读到旧数据
+SNAPSHOT_MAX_AGE = 300
+
+# 版本号在缓存中的键和有效期
+VERSION_ENDPOINT = "taxonomy_version"
+VERSION_TTL = 30 * 24 * 3600
+
+
+def _is_semester_active_by_time(semester: Semester, today: date) -> bool:
+    """学期是否在有效时间范围内，未设置时间的学期始终有效"""
+    if semester.start_date and today < semester.start_date:
+        return False
+    if semester.end_date and today > semester.end_date:
+        return False
+    return True
+
+
+def _brief(item) -> Optional[dict]:
+    """试题响应中关联对象的简要信息"""
+    if item is None:
+        return None
+    return {"id": item.id, "name": item.name, "code": item.code}
+
+
+class TaxonomySnapshot:
+    """某一版本的分类体系数据，创建后不再修改"""
+
+    def __init__(self, version: str, semesters: List[Semester], grades: List[Grade],
+                 subjects: List[Subject], categories: List[Category]):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.semesters: Dict[int, Semester] = {item.id: item for item in semesters}
+        self.grades: Dict[int, Grade] = {item.id: item for item in grades}
+        self.subjects: Dict[int, Subject] = {item.id: item for item in subjects}
+        self.categories: Dict[int, Category] = {item.id: item for item in categories}
+        # 公开数据按日期缓存（学期的时间有效性与日期相关）
+        self._public: Optional[Tuple[date, bytes, str]] = None
+
+    def get(self, kind: str, item_id: Optional[int]):
+        """按类型取对象，kind 为 semester/grade/subject/category"""
+        if item_id is None:
+            return None
+        items = {
+            "semester": self.semesters,
+            "grade": self.grades,
+            "subject": self.subjects,
+            "category": self.categories,
+        }[kind]
+        return items.get(item_id)
+
+    def refs(self, question) -> dict:
+        """试题关联的学期、年级、学科、分类简要信息，替代 prefetch_related"""
+        return {
+            "semester": _brief(self.semesters.get(question.semester_id)),
+            "grade": _brief(self.grades.get(question.grade_id)),
+            "subject": _brief(self.subjects.get(question.subject_id)),
+            "category": _brief(self.categories.get(question.category_id)),
+        }
+
+    def public_payload(self, today: date) -> Tuple[bytes, str]:
+        """前台启动所需的完整分类体系，返回 (JSON内容, ETag)"""
+        if self._public and self._public[0] == today:
+            return self._public[1], self._public[2]
+
+        categories_by_subject: Dict[int, List[dict]] = {}
+        for category in sorted(self.categories.values(), key=lambda c: (c.level, c.sort_order, c.id)):
+            if not category.is_active:
+                continue
+            categories_by_subject.setdefault(category.subject_id, []).append({
+                "id": category.id,
+                "name": category.name,
+                "code": category.code,
+                "subject_id": category.subject_id,
+                "parent_id": category.parent_id,
+                "level": category.level,
+                "sort_order": category.sort_order,
+                "description": category.description,
+            })
+
+        payload = {
+            "version": self.version,
+            "semesters": [
+                {
+                    "id": semester.id,
+                    "name": semester.name,
+                    "code": semester.code,
+                    "start_date": semester.start_date.isoformat() if semester.start_date else None,
+                    "end_date": semester.end_date.isoformat() if semester.end_date else None,
+                    "sort_order": semester.sort_order,
+                    "description": semester.description,
+                    "is_time_active": _is_semester_active_by_time(semester, today),
+                }
+                for semester in sorted(self.semesters.values(), key=lambda s: (s.sort_order, s.id))
+                if semester.is_active
+            ],
+            "grades": [
+                {
+                    "id": grade.id,
+                    "name": grade.name,
+                    "code": grade.code,
+                    "level": grade.level,
+                    "sort_order": grade.sort_order,
+                    "description": grade.description,
+                }
+                for grade in sorted(self.grades.values(), key=lambda g: (g.sort_order, g.level))
+                if grade.is_active
+            ],
+            "subjects": [
+                {
+                    "id": subject.id,
+                    "name": subject.name,
+                    "code": subject.code,
+                    "icon": subject.icon,
+                    "color": subject.color,
+                    "sort_order": subject.sort_order,
+                    "description": subject.description,
+                    "categories": categories_by_subject.get(subject.id, []),
+                }
+                for subject in sorted(self.subjects.values(), key=lambda s: (s.sort_order, s.id))
+                if subject.is_active
+            ],
+        }
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        self._public = (today, body, etag)
+        return body, etag
+
+
+class TaxonomyManager:
+    """分类体系快照管理器"""
+
+    def __init__(self):
+        self._snapshot: Optional[TaxonomySnapshot] = None
+        self._local_version = ""
+        self._lock = asyncio.Lock()
+
+    def _shared_version(self) -> str:
+        return cache_manager.get(VERSION_ENDPOINT) or self._local_version
+
+    def _is_fresh(self, snapshot: Optional[TaxonomySnapshot]) -> bool:
+        return (
+            snapshot is not None
+            and snapshot.version == self._shared_version()
+            and time.monotonic() - snapshot.loaded_at < SNAPSHOT_MAX_AGE
+        )
+
+    async def load(self) -> TaxonomySnapshot:
+        """从数据库加载新快照（四次查询）"""
+        version = self._shared_version()
+        snapshot = TaxonomySnapshot(
+            version,
+            await Semester.all(),
+            await Grade.all(),
+            await Subject.all(),
+            await Category.all(),
+        )
+        self._snapshot = snapshot
+        logger.debug(
+            f"分类体系快照已加载: 版本 {version or '-'}, 学期 {len(snapshot.semesters)}, "
+            f"年级 {len(snapshot.grades)}, 学科 {len(snapshot.subjects)}, 分类 {len(snapshot.categories)}"
+        )
+        return snapshot
+
+    async def current(self) -> TaxonomySnapshot:
+        """获取当前快照，版本变化或过期时重新加载"""
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot):
+            return snapshot
+        async with self._lock:
+            if self._is_fresh(self._snapshot):
+                return self._snapshot
+            return await self.load()
+
+    def invalidate(self):
+        """分类体系数据写入后调用，更新版本号使所有进程的快照失效"""
+        self._local_version = str(time.time_ns())
+        cache_manager.set(VERSION_ENDPOINT, {}, self._local_version, VERSION_TTL)
+        self._snapshot = None
+
+    async def find(self, kind: str, item_id: Optional[int]):
+        """
+        按ID查找对象，快照中不存在时重新加载一次再查
+
+        其他进程刚写入的数据可能尚未反映到本进程快照中。
+        """
+        snapshot = await self.current()
+        item = snapshot.get(kind, item_id)
+        if item is None and item_id is not None:
+            async with self._lock:
+                snapshot = await self.load()
+            item = snapshot.get(kind, item_id)
+        return item
+
+
+# 创建全局分类体系实例
+taxonomy = TaxonomyManager()
@@ -0,0 +1,7 @@
+from app.core.db_router import use_read_connections
+
+
+async def read_only_db():
+    """只读接口的路由依赖：本次请求的读查询使用只读连接"""
+    with use_read_connections():
+        yield
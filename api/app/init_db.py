@@ -5,6 +5,7 @@
 import asyncio
 from tortoise import Tortoise
 from app.config import TORTOISE_ORM
+from app.migrate import migrate_schema
 from app.models.admin import Admin
 from app.models.semester import Semester
 from app.models.grade import Grade
@@ -17,8 +18,8 @@ async def init_db():
     # 初始化Tortoise ORM
     await Tortoise.init(config=TORTOISE_ORM)
     
-    # 生成数据库表
-    await Tortoise.generate_schemas()
+    # 生成数据库表和索引（与 python -m app.migrate 相同，可重复执行）
+    await migrate_schema()
     
     # 创建默认超级管理员
     admin_exists = await Admin.filter(username="admin").exists()
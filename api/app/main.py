@@ -1,10 +1,19 @@
+import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 from tortoise.contrib.fastapi import register_tortoise
 from app.config import settings, TORTOISE_ORM
 from app.core.cache import cache_manager
+from app.core.derived_data import prepare_derived_data
+from app.core.http_clients import http_clients
+from app.core.image_pipeline import image_pipeline
+from app.core.postgres_backend import detect_search_indexes
+from app.core.scheduler import scheduler
+from app.core.scheduled_tasks import setup_scheduled_tasks
 from app.routers import auth, semesters, grades, subjects, categories, questions, templates, upload, analytics, system, search, roles, public
 from app.middleware.performance import PerformanceMiddleware
+from app.migrate import migrate_schema
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -43,15 +52,49 @@ app.include_router(roles.router, prefix=settings.API_V1_STR)
 # 公开API路由（无需认证）
 app.include_router(public.router, prefix=settings.API_V1_STR)
 
-# 注册Tortoise ORM
+# 试题快照包（生产环境由Nginx直接提供，这里用于开发环境）
+os.makedirs(settings.SNAPSHOT_DIR, exist_ok=True)
+app.mount(settings.SNAPSHOT_URL_PREFIX, StaticFiles(directory=settings.SNAPSHOT_DIR), name="snapshots")
+
+# 图床不可用时保存在本地的图片（生产环境由Nginx直接提供）
+os.makedirs(settings.IMAGE_LOCAL_DIR, exist_ok=True)
+app.mount(settings.IMAGE_LOCAL_URL_PREFIX, StaticFiles(directory=settings.IMAGE_LOCAL_DIR), name="local_images")
+
+# 注册内置定时任务
+setup_scheduled_tasks(scheduler)
+
+# 注册Tortoise ORM（表结构由 python -m app.migrate 或 AUTO_MIGRATE 创建）
 register_tortoise(
     app,
     config=TORTOISE_ORM,
-    generate_schemas=True,
+    generate_schemas=False,
     add_exception_handlers=True,
 )
 
 
+@app.on_event("startup")
+async def prepare_data():
+    """启动时准备派生数据（在Tortoise初始化之后执行）"""
+    # Redis在后台连接，连接成功前使用内存缓存，不阻塞启动
+    cache_manager.connect_in_background()
+    if settings.AUTO_MIGRATE:
+        await migrate_schema()
+    else:
+        await detect_search_indexes()
+    await prepare_derived_data()
+    if settings.SCHEDULER_ENABLED:
+        scheduler.start()
+
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    """停止定时任务调度并释放调度锁，关闭Redis连接、共享HTTP客户端和图片处理进程池"""
+    await scheduler.stop()
+    await http_clients.close()
+    image_pipeline.shutdown()
+    cache_manager.close()
+
+
 @app.get("/")
 async def root():
     """根路径"""
@@ -1,28 +1,40 @@
 import time
-import psutil
-from typing import Dict, List
-from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from datetime import datetime
 from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
+from app.core.metrics import metrics_store
+from app.core.shared_state import shared_state
 from app.utils.logger import SystemLogger, LogModule
 
+# 各 worker 发布慢请求的间隔（秒）和有效期
+PUBLISH_INTERVAL = 5
+WORKER_TTL = 300
+
+# 发布到共享状态的慢请求（超过该耗时，最多保留条数）
+SHARED_SLOW_THRESHOLD = 0.1
+SHARED_SLOW_LIMIT = 100
+
+# 性能统计中按请求数列出的路由数
+TOP_ROUTES = 20
+
 
 class PerformanceMonitor:
-    """性能监控器"""
+    """
+    性能监控器
+
+    请求数、错误数和耗时分布写入共享内存指标（metrics_store），所有 worker 汇总；
+    慢请求明细保存在本进程中，多 worker 部署时定期发布到共享状态。
+    """
     
     def __init__(self):
         self.request_times: List[Dict] = []
-        self.error_count = 0
-        self.total_requests = 0
-        self.start_time = datetime.now()
+        self._published_at = 0.0
     
-    def add_request(self, path: str, method: str, duration: float, status_code: int):
-        """添加请求记录"""
-        self.total_requests += 1
-        
-        if status_code >= 400:
-            self.error_count += 1
-        
+    def add_request(self, path: str, method: str, duration: float, status_code: int, route: Optional[str] = None):
+        """添加请求记录，route 为路由模板（未匹配路由时为 None）"""
+        metrics_store.record(f"{method} {route or '<unmatched>'}", duration, status_code >= 400)
+
         # 记录请求时间
         self.request_times.append({
             'path': path,
@@ -35,54 +47,86 @@ class PerformanceMonitor:
         # 保持最近1000条记录
         if len(self.request_times) > 1000:
             self.request_times.pop(0)
+
+        if shared_state.is_shared and time.monotonic() - self._published_at >= PUBLISH_INTERVAL:
+            self.publish()
+
+    def publish(self):
+        """把本 worker 的慢请求发布到共享状态"""
+        self._published_at = time.monotonic()
+        slow_requests = [
+            {**req, 'timestamp': req['timestamp'].isoformat()}
+            for req in self.request_times if req['duration'] > SHARED_SLOW_THRESHOLD
+        ]
+        shared_state.put("slow_requests", shared_state.worker_id, {
+            'requests': slow_requests[-SHARED_SLOW_LIMIT:]
+        }, WORKER_TTL)
     
     def get_stats(self) -> Dict:
-        """获取性能统计"""
+        """获取性能统计（所有 worker 的汇总）"""
         now = datetime.now()
-        
-        # 最近5分钟的请求
-        recent_requests = [
-            req for req in self.request_times 
-            if now - req['timestamp'] <= timedelta(minutes=5)
-        ]
-        
-        # 计算平均响应时间
-        avg_response_time = 0
-        if recent_requests:
-            avg_response_time = sum(req['duration'] for req in recent_requests) / len(recent_requests)
-        
-        # 计算错误率
-        recent_errors = sum(1 for req in recent_requests if req['status_code'] >= 400)
-        error_rate = (recent_errors / len(recent_requests) * 100) if recent_requests else 0
+        snapshot = metrics_store.snapshot()
+        totals = snapshot['totals']
+        recent = snapshot['recent']
+
+        # 最近5分钟的错误率
+        error_rate = (recent['errors'] / recent['count'] * 100) if recent['count'] else 0
         
         # 系统资源使用
+        import psutil
+
         cpu_percent = psutil.cpu_percent(interval=1)
         memory = psutil.virtual_memory()
         disk = psutil.disk_usage('/')
+
+        started_at = datetime.fromtimestamp(snapshot['started_at']) if snapshot['started_at'] else now
+        routes = sorted(snapshot['routes'].items(), key=lambda item: item[1]['count'], reverse=True)
         
         return {
             'requests': {
-                'total': self.total_requests,
-                'recent_5min': len(recent_requests),
-                'error_count': self.error_count,
+                'total': totals['count'],
+                'recent_5min': recent['count'],
+                'error_count': totals['errors'],
                 'error_rate': round(error_rate, 2)
             },
             'performance': {
-                'avg_response_time': round(avg_response_time * 1000, 2),  # 转换为毫秒
+                'avg_response_time': recent['avg_ms'],  # 毫秒
+                'p50_response_time': totals['p50_ms'],
+                'p95_response_time': totals['p95_ms'],
+                'p99_response_time': totals['p99_ms'],
                 'cpu_usage': cpu_percent,
                 'memory_usage': memory.percent,
                 'disk_usage': disk.percent
             },
-            'uptime': str(now - self.start_time).split('.')[0],
+            'routes': [
+                {'route': route, **{key: value for key, value in stats.items() if key != 'buckets'}}
+                for route, stats in routes[:TOP_ROUTES]
+            ],
+            'latency_buckets': totals['buckets'],
+            'workers': snapshot['live_workers'],
+            'uptime': str(now - started_at).split('.')[0],
             'timestamp': now.isoformat()
         }
+
+    def reset(self):
+        """清零所有 worker 的性能统计和本进程的请求记录"""
+        metrics_store.reset()
+        self.request_times.clear()
+        if shared_state.is_shared:
+            shared_state.delete("slow_requests", shared_state.worker_id)
     
     def get_slow_requests(self, threshold: float = 1.0) -> List[Dict]:
-        """获取慢请求列表"""
-        return [
-            req for req in self.request_times 
+        """获取慢请求列表（包括其他 worker 发布的慢请求），按时间排序"""
+        slow_requests = [
+            {**req, 'timestamp': req['timestamp'].isoformat()}
+            for req in self.request_times
             if req['duration'] > threshold
         ]
+        if shared_state.is_shared:
+            for worker_id, published in shared_state.all("slow_requests").items():
+                if worker_id != shared_state.worker_id:
+                    slow_requests.extend(req for req in published['requests'] if req['duration'] > threshold)
+        return sorted(slow_requests, key=lambda req: req['timestamp'])
 
 
 # 全局性能监控实例
@@ -105,12 +149,14 @@ class PerformanceMiddleware(BaseHTTPMiddleware):
         # 添加响应头
         response.headers["X-Process-Time"] = str(process_time)
         
-        # 记录性能数据
+        # 记录性能数据（按路由模板统计，避免路径参数造成大量不同的键）
+        route = request.scope.get("route")
         performance_monitor.add_request(
             path=request.url.path,
             method=request.method,
             duration=process_time,
-            status_code=response.status_code
+            status_code=response.status_code,
+            route=getattr(route, "path", None)
         )
         
         # 记录慢请求
@@ -145,6 +191,8 @@ class HealthChecker:
     @staticmethod
     def check_disk_space(threshold: float = 90.0):
         """检查磁盘空间"""
+        import psutil
+
         try:
             disk = psutil.disk_usage('/')
             if disk.percent > threshold:
@@ -156,6 +204,8 @@ class HealthChecker:
     @staticmethod
     def check_memory(threshold: float = 90.0):
         """检查内存使用"""
+        import psutil
+
         try:
             memory = psutil.virtual_memory()
             if memory.percent > threshold:
@@ -0,0 +1,65 @@
+"""
+数据库迁移 - 建表、建索引并检查热点查询的执行计划
+
+部署时在启动服务之前执行（所有操作都可以重复执行）：
+    python -m app.migrate
+
+AUTO_MIGRATE=false 时服务启动不再生成表结构，启动只需连接数据库；
+开发环境默认 AUTO_MIGRATE=true，启动时自动执行同样的迁移。
+"""
+import asyncio
+import logging
+from tortoise import Tortoise
+from app.config import TORTOISE_ORM
+from app.core.log_store import log_store
+from app.core.postgres_backend import ensure_search_indexes
+from app.core.query_plans import check_query_plans
+
+logger = logging.getLogger(__name__)
+
+# 热点查询使用的复合索引：(索引名, 表名, 列)
+# 不在模型 Meta.indexes 中声明：Tortoise 0.23 为其生成的 CREATE INDEX 不带 IF NOT EXISTS，
+# 索引已存在时 generate_schemas(safe=True) 会失败，迁移无法重复执行
+INDEXES = [
+    # 公开接口的随机抽题和试题列表：激活、发布 + 学期/年级/学科/分类/难度等值过滤
+    ("idx_questions_public", "questions",
+     ("is_active", "is_published", "semester_id", "grade_id", "subject_id", "category_id", "difficulty")),
+    # 管理端试题列表按学期/年级/学科/分类筛选，以及试题数量统计
+    ("idx_questions_taxonomy", "questions", ("semester_id", "grade_id", "subject_id", "category_id")),
+    ("idx_questions_category", "questions", ("category_id",)),
+    # 默认按创建时间倒序分页
+    ("idx_questions_created_at", "questions", ("created_at",)),
+    # 升级时按模块、用户汇总登录统计（随后旧日志迁移到月分区）
+    ("idx_system_logs_module_user_ts", "system_logs", ("module", "user", "timestamp")),
+]
+
+
+async def ensure_indexes():
+    """创建缺失的复合索引（可重复执行）"""
+    client = Tortoise.get_connection("default")
+    for name, table, columns in INDEXES:
+        column_sql = ", ".join(f'"{column}"' for column in columns)
+        await client.execute_script(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({column_sql})')
+
+
+async def migrate_schema():
+    """在已初始化的 Tortoise 上补齐表、索引和日志分区（可重复执行）"""
+    await Tortoise.generate_schemas(safe=True)
+    await ensure_indexes()
+    await log_store.ensure_partitions()
+    await ensure_search_indexes()
+    await check_query_plans()
+
+
+async def main():
+    await Tortoise.init(config=TORTOISE_ORM)
+    try:
+        await migrate_schema()
+    finally:
+        await Tortoise.close_connections()
+    print("✅ 数据库迁移完成")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
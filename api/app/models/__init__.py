@@ -1,26 +1,33 @@
-from .admin import Admin
+from .admin import Admin, AdminLoginActivity
 from .semester import Semester
 from .grade import Grade
 from .subject import Subject
-from .category import Category
-from .question import Question
+from .category import Category, CategoryClosure
+from .question import Question, QuestionCount
 from .template import Template
-from .system_log import SystemLog
+from .system_log import SystemLog, LogPartition, LogCounter
 from .system_config import SystemConfig
 from .role import Role, Permission, RolePermission, AdminRole
+from .uploaded_image import UploadedImage
 
 __all__ = [
     "Admin",
+    "AdminLoginActivity",
     "Semester",
     "Grade",
     "Subject",
     "Category",
+    "CategoryClosure",
     "Question",
+    "QuestionCount",
     "Template",
     "SystemLog",
+    "LogPartition",
+    "LogCounter",
     "SystemConfig",
     "Role",
     "Permission",
     "RolePermission",
     "AdminRole",
+    "UploadedImage",
 ]
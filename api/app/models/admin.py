@@ -1,4 +1,5 @@
 from tortoise import fields
+from tortoise.models import Model
 from .base import BaseModel
 
 
@@ -19,3 +20,20 @@ class Admin(BaseModel):
     
     def __str__(self):
         return self.username
+
+
+class AdminLoginActivity(Model):
+    """管理员登录统计（由登录日志同步维护，按用户名主键读取）"""
+    username = fields.CharField(max_length=50, pk=True, description="用户名")
+    last_login_at = fields.DatetimeField(null=True, description="最后登录时间")
+    last_ip = fields.CharField(max_length=45, null=True, description="最后登录IP")
+    login_count = fields.IntField(default=0, description="登录成功次数")
+    failed_count = fields.IntField(default=0, description="登录失败次数")
+    last_failed_at = fields.DatetimeField(null=True, description="最后失败时间")
+
+    class Meta:
+        table = "admin_login_activity"
+        table_description = "管理员登录统计表"
+
+    def __str__(self):
+        return self.username
@@ -1,3 +1,4 @@
+from tortoise.models import Model
 from tortoise import fields
 from .base import BaseModel
 
@@ -21,3 +22,19 @@ class Category(BaseModel):
     
     def __str__(self):
         return self.name
+
+
+class CategoryClosure(Model):
+    """分类层级闭包表 - 记录每个分类与其所有祖先的关系（含自身）"""
+    id = fields.IntField(pk=True)
+    ancestor = fields.ForeignKeyField("models.Category", related_name="descendant_links", description="祖先分类")
+    descendant = fields.ForeignKeyField("models.Category", related_name="ancestor_links", description="后代分类")
+    depth = fields.IntField(default=0, description="层级距离(自身为0)")
+    
+    class Meta:
+        table = "category_closure"
+        table_description = "分类层级闭包表"
+        unique_together = (("ancestor", "descendant"),)
+    
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
@@ -1,4 +1,5 @@
 from tortoise import fields
+from tortoise.models import Model
 from .base import BaseModel
 
 
@@ -31,6 +32,22 @@ class Question(BaseModel):
         table = "questions"
         table_description = "试题表"
         ordering = ["-created_at"]
+        # 复合索引由 app.migrate 创建（见 app.migrate.INDEXES）
     
     def __str__(self):
         return self.title
+
+
+class QuestionCount(Model):
+    """学期/年级/学科/分类的试题数量（随试题写入维护）"""
+    id = fields.IntField(pk=True)
+    kind = fields.CharField(max_length=20, description="类型(semester/grade/subject/category)")
+    target_id = fields.IntField(description="学期/年级/学科/分类ID")
+    question_count = fields.IntField(default=0, description="试题总数")
+    active_question_count = fields.IntField(default=0, description="激活的试题数")
+    updated_at = fields.DatetimeField(auto_now=True, description="更新时间")
+
+    class Meta:
+        table = "question_counts"
+        table_description = "试题数量统计表"
+        unique_together = (("kind", "target_id"),)
@@ -19,6 +19,7 @@ class SystemLog(Model):
     class Meta:
         table = "system_logs"
         ordering = ["-timestamp"]
+        # 升级时按模块、用户汇总登录统计的索引由 app.migrate 创建（随后旧日志迁移到月分区）
     
     def __str__(self):
         return f"[{self.level.upper()}] {self.module}: {self.message}"
@@ -40,3 +41,38 @@ class LogModule:
     UPLOAD = "upload"
     TEMPLATES = "templates"
     ANALYTICS = "analytics"
+
+
+class LogPartition(Model):
+    """系统日志月分区登记表（含各级别计数）"""
+    key = fields.CharField(max_length=6, pk=True, description="分区月份(YYYYMM)")
+    table_name = fields.CharField(max_length=50, description="分区表名")
+    total_count = fields.IntField(default=0, description="日志总数")
+    info_count = fields.IntField(default=0, description="info日志数")
+    warning_count = fields.IntField(default=0, description="warning日志数")
+    error_count = fields.IntField(default=0, description="error日志数")
+    debug_count = fields.IntField(default=0, description="debug日志数")
+
+    class Meta:
+        table = "log_partitions"
+        table_description = "系统日志分区表"
+
+    def __str__(self):
+        return self.table_name
+
+
+class LogCounter(Model):
+    """系统日志按 (日期, 级别, 模块) 的计数"""
+    id = fields.IntField(pk=True)
+    day = fields.DateField(description="日期(UTC)")
+    level = fields.CharField(max_length=20, description="日志级别")
+    module = fields.CharField(max_length=50, description="模块名称")
+    count = fields.IntField(default=0, description="日志数")
+
+    class Meta:
+        table = "log_counters"
+        table_description = "系统日志计数表"
+        unique_together = (("day", "level", "module"),)
+
+    def __str__(self):
+        return f"{self.day} {self.level} {self.module}: {self.count}"
@@ -0,0 +1,28 @@
+from tortoise.models import Model
+from tortoise import fields
+
+
+class UploadedImage(Model):
+    """已上传图片的去重索引（按原图内容 SHA-256、图床目录和处理方式）"""
+    id = fields.IntField(pk=True)
+    sha256 = fields.CharField(max_length=64, description="原图内容SHA-256")
+    variant = fields.CharField(max_length=50, description="图床目录和处理方式(目录/预设:格式:缩略图)")
+    url = fields.CharField(max_length=500, description="图片地址")
+    thumbnail_url = fields.CharField(max_length=500, null=True, description="缩略图地址")
+    cdn_id = fields.CharField(max_length=100, null=True, description="图床图片ID")
+    name = fields.CharField(max_length=255, description="文件名")
+    size = fields.IntField(description="上传的文件大小")
+    original_size = fields.IntField(description="原图大小")
+    mime = fields.CharField(max_length=50, description="文件类型")
+    is_local = fields.BooleanField(default=False, description="图床不可用时保存在本地")
+    hit_count = fields.IntField(default=0, description="重复上传命中次数")
+    last_hit_at = fields.DatetimeField(null=True, description="最近命中时间")
+    created_at = fields.DatetimeField(auto_now_add=True, description="创建时间")
+
+    class Meta:
+        table = "uploaded_images"
+        table_description = "图片上传去重索引表"
+        unique_together = (("sha256", "variant"),)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.variant}) -> {self.url}"
@@ -9,8 +9,10 @@ from app.models.subject import Subject
 from app.models.category import Category
 from app.models.admin import Admin
 from app.dependencies.auth import get_current_active_admin
+from app.dependencies.database import read_only_db
+from app.core.question_counts import QuestionCounts
 
-router = APIRouter(prefix="/analytics", tags=["数据分析"])
+router = APIRouter(prefix="/analytics", tags=["数据分析"], dependencies=[Depends(read_only_db)])
 
 
 @router.get("/dashboard", summary="获取仪表板统计数据")
@@ -45,11 +47,12 @@ async def get_dashboard_stats():
             "percentage": round((count / total_questions * 100) if total_questions > 0 else 0, 1)
         })
     
-    # 学科题目分布
+    # 学科题目分布（数量取自统计表）
     subject_stats = []
     subjects = await Subject.all()
+    subject_counts = await QuestionCounts.get("subject")
     for subject in subjects:
-        question_count = await Question.filter(subject_id=subject.id).count()
+        question_count = subject_counts.get(subject.id, {}).get("question_count", 0)
         subject_stats.append({
             "subject_id": subject.id,
             "subject_name": subject.name,
@@ -57,11 +60,12 @@ async def get_dashboard_stats():
             "percentage": round((question_count / total_questions * 100) if total_questions > 0 else 0, 1)
         })
     
-    # 年级题目分布
+    # 年级题目分布（数量取自统计表）
     grade_stats = []
     grades = await Grade.all()
+    grade_counts = await QuestionCounts.get("grade")
     for grade in grades:
-        question_count = await Question.filter(grade_id=grade.id).count()
+        question_count = grade_counts.get(grade.id, {}).get("question_count", 0)
         grade_stats.append({
             "grade_id": grade.id,
             "grade_name": grade.name,
@@ -159,17 +163,19 @@ async def get_category_stats():
     
     categories = await Category.all().prefetch_related("subject")
     category_stats = []
+
+    # 数量取自统计表，平均难度一次分组查询
+    counts = await QuestionCounts.get("category")
+    difficulty_rows = await Question.all().annotate(
+        avg_difficulty=Avg("difficulty")
+    ).group_by("category_id").values("category_id", "avg_difficulty")
+    avg_difficulties = {row["category_id"]: row["avg_difficulty"] or 0 for row in difficulty_rows}
     
     for category in categories:
-        question_count = await Question.filter(category_id=category.id).count()
-        active_question_count = await Question.filter(
-            category_id=category.id, 
-            is_active=True
-        ).count()
-        
-        # 计算平均难度
-        questions = await Question.filter(category_id=category.id)
-        avg_difficulty = sum(q.difficulty for q in questions) / len(questions) if questions else 0
+        count = counts.get(category.id, {})
+        question_count = count.get("question_count", 0)
+        active_question_count = count.get("active_question_count", 0)
+        avg_difficulty = avg_difficulties.get(category.id, 0)
         
         category_stats.append({
             "category_id": category.id,
@@ -190,6 +196,14 @@ async def get_category_stats():
     }
 
 
+async def _views_by(fk_field: str) -> Dict[int, int]:
+    """按外键分组汇总查看次数"""
+    rows = await Question.all().annotate(total_views=Sum("view_count")).group_by(fk_field).values(
+        fk_field, "total_views"
+    )
+    return {row[fk_field]: row["total_views"] or 0 for row in rows}
+
+
 @router.get("/usage/summary", summary="获取使用情况汇总")
 async def get_usage_summary():
     """获取系统使用情况汇总"""
@@ -201,10 +215,11 @@ async def get_usage_summary():
     # 最活跃的学科
     subject_usage = []
     subjects = await Subject.all()
+    subject_counts = await QuestionCounts.get("subject")
+    subject_views_map = await _views_by("subject_id")
     for subject in subjects:
-        questions = await Question.filter(subject_id=subject.id)
-        subject_views = sum(q.view_count for q in questions)
-        question_count = len(questions)
+        subject_views = subject_views_map.get(subject.id, 0)
+        question_count = subject_counts.get(subject.id, {}).get("question_count", 0)
         
         subject_usage.append({
             "subject_name": subject.name,
@@ -218,10 +233,11 @@ async def get_usage_summary():
     # 最活跃的年级
     grade_usage = []
     grades = await Grade.all()
+    grade_counts = await QuestionCounts.get("grade")
+    grade_views_map = await _views_by("grade_id")
     for grade in grades:
-        questions = await Question.filter(grade_id=grade.id)
-        grade_views = sum(q.view_count for q in questions)
-        question_count = len(questions)
+        grade_views = grade_views_map.get(grade.id, 0)
+        question_count = grade_counts.get(grade.id, {}).get("question_count", 0)
         
         grade_usage.append({
             "grade_name": grade.name,
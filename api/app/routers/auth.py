@@ -2,9 +2,9 @@ from datetime import timedelta, datetime
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from pydantic import BaseModel
 from fastapi.security import OAuth2PasswordRequestForm
-from app.models.admin import Admin
+from app.models.admin import Admin, AdminLoginActivity
 from app.models.question import Question
-from app.models.system_log import SystemLog, LogLevel
+from app.models.system_log import LogLevel
 from app.schemas.auth import Token, AdminLogin, AdminCreate, AdminResponse, AdminUpdate, AdminPermissionsResponse, RoleInfo
 from app.utils.auth import verify_password, get_password_hash, create_access_token, verify_token_with_detail
 from app.dependencies.auth import get_current_active_admin, get_current_superuser
@@ -171,23 +171,13 @@ async def get_user_stats(current_admin: Admin = Depends(get_current_active_admin
     # 获取用户创建的试题数量
     created_questions = await Question.filter(created_by=current_admin.username).count()
 
-    # 获取用户登录次数（从系统日志中统计）
-    total_login_count = await SystemLog.filter(
-        module="auth",
-        message__icontains="登录成功",
-        user=current_admin.username
-    ).count()
-
-    # 计算最后登录时间（天数）
-    last_login_log = await SystemLog.filter(
-        module="auth",
-        message__icontains="登录成功",
-        user=current_admin.username
-    ).order_by("-timestamp").first()
+    # 登录次数和最后登录时间（登录统计表，按主键读取）
+    activity = await AdminLoginActivity.get_or_none(username=current_admin.username)
+    total_login_count = activity.login_count if activity else 0
 
     last_login_days = 0
-    if last_login_log:
-        days_diff = (datetime.now() - last_login_log.timestamp).days
+    if activity and activity.last_login_at:
+        days_diff = (datetime.now() - activity.last_login_at).days
         last_login_days = max(0, days_diff)
 
     # 计算加入天数
@@ -1,7 +1,7 @@
-from typing import List
+from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 from app.models.category import Category
-from app.models.subject import Subject
+from app.models.question import Question
 from app.schemas.common import (
     CategoryCreate, CategoryUpdate, CategoryResponse,
     MessageResponse, BatchUpdateRequest, BatchDeleteRequest,
@@ -10,9 +10,50 @@ from app.schemas.common import (
 from app.dependencies.auth import get_current_active_admin
 from app.utils.permissions import PermissionManager
 from app.models.role import PermissionCode
+from app.core.batch import BatchEngine
+from app.core.taxonomy import taxonomy
+from app.core.question_counts import QuestionCounts
+from app.core.question_bundles import question_bundles
+from app.core.category_tree import CategoryTree, CategoryTreeError
+from tortoise.transactions import in_transaction
 
 router = APIRouter(prefix="/categories", tags=["题目分类管理"])
 
+# 批量操作引擎（分类代码在同一学科下唯一）
+category_batch = BatchEngine(
+    Category, "Category",
+    protected_fields=("parent_id", "level"),  # 层级变更需通过分类树维护
+    unique_fields=("code",),
+    unique_scope="subject_id",
+    dependencies=(
+        (Question, "category_id", "Category has {count} questions"),
+        (Category, "parent_id", "Category has {count} child categories"),
+    ),
+    on_change=taxonomy.invalidate
+)
+
+# 分类详情中本分类、父分类和子分类返回的字段
+CATEGORY_FIELDS = (
+    "id", "name", "code", "subject_id", "parent_id", "level", "is_active",
+    "sort_order", "description", "created_at", "updated_at",
+)
+SUBJECT_FIELDS = (
+    "id", "name", "code", "icon", "color", "is_active", "sort_order", "description", "created_at", "updated_at",
+)
+
+
+async def _category_detail(category_id: int) -> Optional[dict]:
+    """分类详情：学科、父分类和子分类只返回自身字段，不序列化未加载的关联"""
+    category = await Category.filter(id=category_id).prefetch_related("subject", "parent", "children").first()
+    if not category:
+        return None
+    return {
+        **{field: getattr(category, field) for field in CATEGORY_FIELDS},
+        "subject": {field: getattr(category.subject, field) for field in SUBJECT_FIELDS},
+        "parent": {field: getattr(category.parent, field) for field in CATEGORY_FIELDS} if category.parent else None,
+        "children": [{field: getattr(child, field) for field in CATEGORY_FIELDS} for child in category.children],
+    }
+
 
 @router.get("/", summary="获取分类列表")
 async def get_categories(
@@ -39,10 +80,12 @@ async def get_categories(
         query = query.filter(name__icontains=search) | query.filter(code__icontains=search)
 
     categories = await query.offset(skip).limit(limit).order_by("sort_order", "id")
+    counts = await QuestionCounts.get("category", [category.id for category in categories])
 
     # 手动构建响应数据
     result = []
     for category in categories:
+        count = counts.get(category.id, {})
         result.append({
             "id": category.id,
             "name": category.name,
@@ -53,6 +96,8 @@ async def get_categories(
             "is_active": category.is_active,
             "sort_order": category.sort_order,
             "description": category.description,
+            "question_count": count.get("question_count", 0),
+            "active_question_count": count.get("active_question_count", 0),
             "created_at": category.created_at,
             "updated_at": category.updated_at
         })
@@ -60,12 +105,23 @@ async def get_categories(
     return result
 
 
+@router.get("/tree", summary="获取分类树")
+async def get_category_tree(
+    subject_id: int = Query(None, description="学科ID"),
+    root_id: int = Query(None, description="子树根分类ID，不传则返回整棵树"),
+    is_active: bool = Query(None, description="是否激活")
+):
+    """一次返回整棵分类树（或指定分类的子树）"""
+    if root_id is not None and not await Category.filter(id=root_id).exists():
+        raise HTTPException(status_code=404, detail="Category not found")
+
+    return await CategoryTree.get_tree(root_id=root_id, subject_id=subject_id, is_active=is_active)
+
+
 @router.get("/{category_id}", response_model=CategoryResponse, summary="获取分类详情")
 async def get_category(category_id: int):
     """获取分类详情"""
-    category = await Category.filter(id=category_id).prefetch_related(
-        "subject", "parent", "children"
-    ).first()
+    category = await _category_detail(category_id)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     return category
@@ -82,13 +138,13 @@ async def create_category(
         raise HTTPException(status_code=403, detail="Permission denied")
 
     # 检查学科是否存在
-    subject = await Subject.filter(id=category_data.subject_id).first()
+    subject = await taxonomy.find("subject", category_data.subject_id)
     if not subject:
         raise HTTPException(status_code=400, detail="Subject not found")
     
     # 检查父分类是否存在（如果指定了）
     if category_data.parent_id:
-        parent = await Category.filter(id=category_data.parent_id).first()
+        parent = await taxonomy.find("category", category_data.parent_id)
         if not parent:
             raise HTTPException(status_code=400, detail="Parent category not found")
     
@@ -100,8 +156,11 @@ async def create_category(
     if existing:
         raise HTTPException(status_code=400, detail="Category code already exists in this subject")
     
-    category = await Category.create(**category_data.dict())
-    return await Category.filter(id=category.id).prefetch_related("subject", "parent").first()
+    async with in_transaction("default") as conn:
+        category = await Category.create(**category_data.dict(), using_db=conn)
+        await CategoryTree.insert_node(category, using_db=conn)
+    taxonomy.invalidate()
+    return await _category_detail(category.id)
 
 
 @router.put("/{category_id}", summary="更新分类")
@@ -121,13 +180,13 @@ async def update_category(
     
     # 检查学科是否存在（如果要更新）
     if category_data.subject_id:
-        subject = await Subject.filter(id=category_data.subject_id).first()
+        subject = await taxonomy.find("subject", category_data.subject_id)
         if not subject:
             raise HTTPException(status_code=400, detail="Subject not found")
     
     # 检查父分类是否存在（如果要更新）
     if category_data.parent_id:
-        parent = await Category.filter(id=category_data.parent_id).first()
+        parent = await taxonomy.find("category", category_data.parent_id)
         if not parent:
             raise HTTPException(status_code=400, detail="Parent category not found")
     
@@ -143,13 +202,25 @@ async def update_category(
         if existing:
             raise HTTPException(status_code=400, detail="Category code already exists in this subject")
     
-    # 更新分类数据
+    # 更新分类数据（层级字段由分类树维护）
     update_data = category_data.model_dump(exclude_unset=True)
+    new_parent_id = update_data.pop("parent_id", category.parent_id)
+    update_data.pop("level", None)
+
+    # 父分类变化时移动整棵子树
+    if new_parent_id != category.parent_id:
+        try:
+            await CategoryTree.move(category_id, new_parent_id)
+        except CategoryTreeError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        await category.refresh_from_db(fields=["parent_id", "level"])
+
     for field, value in update_data.items():
         setattr(category, field, value)
     await category.save()
+    taxonomy.invalidate()
     
-    return await Category.filter(id=category_id).prefetch_related("subject", "parent").first()
+    return await _category_detail(category_id)
 
 
 @router.delete("/{category_id}", response_model=MessageResponse, summary="删除分类")
@@ -166,7 +237,14 @@ async def delete_category(
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     
-    await category.delete()
+    # 连同所有子分类一起删除
+    has_questions = await Question.filter(category_id__in=CategoryTree.descendant_ids(category_id)).exists()
+    await CategoryTree.delete_subtree(category_id)
+    taxonomy.invalidate()
+    if has_questions:
+        # 级联删除了试题，重新统计数量并重建快照包
+        await QuestionCounts.rebuild()
+        await question_bundles.rebuild()
     return {"message": "Category deleted successfully"}
 
 
@@ -180,36 +258,7 @@ async def batch_update_categories(
     if not current_admin.is_superuser and not await PermissionManager.has_permission(current_admin, PermissionCode.BASIC_DATA_EDIT):
         raise HTTPException(status_code=403, detail="Permission denied")
 
-    success_count = 0
-    failed_count = 0
-    failed_items = []
-
-    for category_id in request.get_ids():
-        try:
-            category = await Category.filter(id=category_id).first()
-            if not category:
-                failed_count += 1
-                failed_items.append({"id": category_id, "error": "Category not found"})
-                continue
-
-            # 更新分类数据
-            for field, value in request.update_data.items():
-                if hasattr(category, field):
-                    setattr(category, field, value)
-
-            await category.save()
-            success_count += 1
-        except Exception as e:
-            failed_count += 1
-            failed_items.append({"id": category_id, "error": str(e)})
-
-    return BatchOperationResponse(
-        success_count=success_count,
-        failed_count=failed_count,
-        total_count=len(request.get_ids()),
-        message=f"批量更新完成：成功 {success_count} 个，失败 {failed_count} 个",
-        failed_items=failed_items
-    )
+    return await category_batch.update(request.get_ids(), request.update_data)
 
 
 @router.post("/batch-delete", response_model=BatchOperationResponse, summary="批量删除分类")
@@ -222,31 +271,8 @@ async def batch_delete_categories(
     if not current_admin.is_superuser and not await PermissionManager.has_permission(current_admin, PermissionCode.BASIC_DATA_EDIT):
         raise HTTPException(status_code=403, detail="Permission denied")
 
-    success_count = 0
-    failed_count = 0
-    failed_items = []
-
-    for category_id in request.get_ids():
-        try:
-            category = await Category.filter(id=category_id).first()
-            if not category:
-                failed_count += 1
-                failed_items.append({"id": category_id, "error": "Category not found"})
-                continue
-
-            await category.delete()
-            success_count += 1
-        except Exception as e:
-            failed_count += 1
-            failed_items.append({"id": category_id, "error": str(e)})
-
-    return BatchOperationResponse(
-        success_count=success_count,
-        failed_count=failed_count,
-        total_count=len(request.get_ids()),
-        message=f"批量删除完成：成功 {success_count} 个，失败 {failed_count} 个",
-        failed_items=failed_items
-    )
+    result, _ = await category_batch.delete(request.get_ids())
+    return result
 
 
 @router.post("/batch-copy", response_model=BatchOperationResponse, summary="批量复制分类")
@@ -259,56 +285,12 @@ async def batch_copy_categories(
     if not current_admin.is_superuser and not await PermissionManager.has_permission(current_admin, PermissionCode.BASIC_DATA_EDIT):
         raise HTTPException(status_code=403, detail="Permission denied")
 
-    success_count = 0
-    failed_count = 0
-    failed_items = []
-    copy_count = request.copy_data.get('copy_count', 1)
-    name_suffix = request.copy_data.get('name_suffix', '_副本')
-
-    for category_id in request.get_ids():
-        try:
-            category = await Category.filter(id=category_id).first()
-            if not category:
-                failed_count += 1
-                failed_items.append({"id": category_id, "error": "Category not found"})
-                continue
-
-            for i in range(copy_count):
-                # 创建副本
-                copy_name = f"{category.name}{name_suffix}"
-                if copy_count > 1:
-                    copy_name += f"_{i+1}"
-
-                copy_code = f"{category.code}_copy"
-                if copy_count > 1:
-                    copy_code += f"_{i+1}"
-
-                # 确保代码在同一学科下唯一性
-                counter = 1
-                original_copy_code = copy_code
-                while await Category.filter(subject_id=category.subject_id, code=copy_code).exists():
-                    copy_code = f"{original_copy_code}_{counter}"
-                    counter += 1
-
-                await Category.create(
-                    name=copy_name,
-                    code=copy_code,
-                    subject_id=category.subject_id,
-                    parent_id=category.parent_id,
-                    level=category.level,
-                    is_active=category.is_active,
-                    sort_order=category.sort_order,
-                    description=category.description
-                )
-                success_count += 1
-        except Exception as e:
-            failed_count += 1
-            failed_items.append({"id": category_id, "error": str(e)})
-
-    return BatchOperationResponse(
-        success_count=success_count,
-        failed_count=failed_count,
-        total_count=len(request.get_ids()) * copy_count,
-        message=f"批量复制完成：成功 {success_count} 个，失败 {failed_count} 个",
-        failed_items=failed_items
+    result = await category_batch.copy(
+        request.get_ids(),
+        copy_count=request.copy_data.get('copy_count', 1),
+        name_suffix=request.copy_data.get('name_suffix', '_副本')
     )
+    # 为新复制的分类补齐层级关系
+    await CategoryTree.link_missing()
+    return result
+
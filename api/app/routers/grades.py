@@ -1,6 +1,7 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, Query
 from app.models.grade import Grade
+from app.models.question import Question
 from app.schemas.common import (
     GradeCreate, GradeUpdate, GradeResponse,
     MessageResponse, BatchUpdateRequest, BatchDeleteRequest,
@@ -9,9 +10,21 @@ from app.schemas.common import (
 from app.dependencies.auth import get_current_active_admin
 from app.utils.permissions import PermissionManager
 from app.models.role import PermissionCode
+from app.core.batch import BatchEngine
+from app.core.taxonomy import taxonomy
+from app.core.question_counts import QuestionCounts
+from app.core.question_bundles import question_bundles
 
 router = APIRouter(prefix="/grades", tags=["年级管理"])
 
+# 批量操作引擎
+grade_batch = BatchEngine(
+    Grade, "Grade",
+    unique_fields=("name", "code"),
+    dependencies=((Question, "grade_id", "Grade has {count} questions"),),
+    on_change=taxonomy.invalidate
+)
+
 
 @router.get("/", response_model=List[GradeResponse], summary="获取年级列表")
 async def get_grades(
@@ -62,6 +75,7 @@ async def create_grade(
         raise HTTPException(status_code=400, detail="Grade code already exists")
     
     grade = await Grade.create(**grade_data.dict())
+    taxonomy.invalidate()
     return grade
 
 
@@ -91,6 +105,7 @@ async def update_grade(
     for field, value in update_data.items():
         setattr(grade, field, value)
     await grade.save()
+    taxonomy.invalidate()
     return grade
 
 
@@ -108,7 +123,13 @@ async def delete_grade(
     if not grade:
         raise HTTPException(status_code=404, detail="Grade not found")
     
+    has_questions = await Question.filter(grade_id=grade_id).exists()
     await grade.delete()
+    taxonomy.invalidate()
+    if has_questions:
+        # 级联删除了试题，重新统计数量并重建快照包
+        await QuestionCounts.rebuild()
+        await question_bundles.rebuild()
     return {"message": "Grade deleted successfully"}
 
 
@@ -122,36 +143,7 @@ async def batch_update_grades(
     if not current_admin.is_superuser and not await PermissionManager.has_permission(current_admin, PermissionCode.BASIC_DATA_EDIT):
         raise HTTPException(status_code=403, detail="Permission denied")
 
-    success_count = 0
-    failed_count = 0
-    failed_items = []
-
-    for grade_id in request.get_ids():
-        try:
-            grade = await Grade.filter(id=grade_id).first()
-            if not grade:
-                failed_count += 1
-                failed_items.append({"id": grade_id, "error": "Grade not found"})
-                continue
-
-            # 更新年级数据
-            for field, value in request.update_data.items():
-                if hasattr(grade, field):
-                    setattr(grade, field, value)
-
-            await grade.save()
-            success_count += 1
-        except Exception as e:
-            failed_count += 1
-            failed_items.append({"id": grade_id, "error": str(e)})
-
-    return BatchOperationResponse(
-        success_count=success_count,
-        failed_count=failed_count,
-        total_count=len(request.get_ids()),
-        message=f"批量更新完成：成功 {success_count} 个，失败 {failed_count} 个",
-        failed_items=failed_items
-    )
+    return await grade_batch.update(request.get_ids(), request.update_data)
 
 
 @router.post("/batch-delete", response_model=BatchOperationResponse, summary="批量删除年级")
@@ -164,31 +156,8 @@ async def batch_delete_grades(
     if not current_admin.is_superuser and not await PermissionManager.has_permission(current_admin, PermissionCode.BASIC_DATA_EDIT):
         raise HTTPException(status_code=403, detail="Permission denied")
 
-    success_count = 0
-    failed_count = 0
-    failed_items = []
-
-    for grade_id in request.get_ids():
-        try:
-            grade = await Grade.filter(id=grade_id).first()
-            if not grade:
-                failed_count += 1
-                failed_items.append({"id": grade_id, "error": "Grade not found"})
-                continue
-
-            await grade.delete()
-            success_count += 1
-        except Exception as e:
-            failed_count += 1
-            failed_items.append({"id": grade_id, "error": str(e)})
-
-    return BatchOperationResponse(
-        success_count=success_count,
-        failed_count=failed_count,
-        total_count=len(request.get_ids()),
-        message=f"批量删除完成：成功 {success_count} 个，失败 {failed_count} 个",
-        failed_items=failed_items
-    )
+    result, _ = await grade_batch.delete(request.get_ids())
+    return result
 
 
 @router.post("/batch-copy", response_model=BatchOperationResponse, summary="批量复制年级")
@@ -201,54 +170,9 @@ async def batch_copy_grades(
     if not current_admin.is_superuser and not await PermissionManager.has_permission(current_admin, PermissionCode.BASIC_DATA_EDIT):
         raise HTTPException(status_code=403, detail="Permission denied")
 
-    success_count = 0
-    failed_count = 0
-    failed_items = []
-    copy_count = request.copy_data.get('copy_count', 1)
-    name_suffix = request.copy_data.get('name_suffix', '_副本')
-
-    for grade_id in request.get_ids():
-        try:
-            grade = await Grade.filter(id=grade_id).first()
-            if not grade:
-                failed_count += 1
-                failed_items.append({"id": grade_id, "error": "Grade not found"})
-                continue
-
-            for i in range(copy_count):
-                # 创建副本
-                copy_name = f"{grade.name}{name_suffix}"
-                if copy_count > 1:
-                    copy_name += f"_{i+1}"
-
-                copy_code = f"{grade.code}_copy"
-                if copy_count > 1:
-                    copy_code += f"_{i+1}"
-
-                # 确保代码唯一性
-                counter = 1
-                original_copy_code = copy_code
-                while await Grade.filter(code=copy_code).exists():
-                    copy_code = f"{original_copy_code}_{counter}"
-                    counter += 1
-
-                await Grade.create(
-                    name=copy_name,
-                    code=copy_code,
-                    level=grade.level,
-                    is_active=grade.is_active,
-                    sort_order=grade.sort_order,
-                    description=grade.description
-                )
-                success_count += 1
-        except Exception as e:
-            failed_count += 1
-            failed_items.append({"id": grade_id, "error": str(e)})
-
-    return BatchOperationResponse(
-        success_count=success_count,
-        failed_count=failed_count,
-        total_count=len(request.get_ids()) * copy_count,
-        message=f"批量复制完成：成功 {success_count} 个，失败 {failed_count} 个",
-        failed_items=failed_items
+    return await grade_batch.copy(
+        request.get_ids(),
+        copy_count=request.copy_data.get('copy_count', 1),
+        name_suffix=request.copy_data.get('name_suffix', '_副本')
     )
+
@@ -5,7 +5,7 @@ import random
 import logging
 from datetime import date
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from fastapi.responses import JSONResponse
 from app.models.question import Question
 from app.models.semester import Semester
@@ -13,10 +13,13 @@ from app.models.grade import Grade
 from app.models.subject import Subject
 from app.models.category import Category
 from app.core.cache import cache_manager
+from app.core.taxonomy import taxonomy
+from app.core.question_bundles import question_bundles, KEY_FIELDS, MANIFEST_MAX_AGE
+from app.dependencies.database import read_only_db
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/public", tags=["公开接口"])
+router = APIRouter(prefix="/public", tags=["公开接口"], dependencies=[Depends(read_only_db)])
 
 def add_cache_headers(response: Response, cache_seconds: int = 300):
     """添加缓存头"""
@@ -53,8 +56,9 @@ async def validate_semester_time(semester_id: int) -> dict:
         logger.warning(f"学期时间验证失败：未指定学期ID")
         return {"valid": False, "message": "未指定学期"}
 
-    semester = await Semester.filter(id=semester_id, is_active=True).first()
-    if not semester:
+    snapshot = await taxonomy.current()
+    semester = snapshot.semesters.get(semester_id)
+    if not semester or not semester.is_active:
         logger.warning(f"学期时间验证失败：学期 {semester_id} 不存在或已停用")
         return {"valid": False, "message": "学期不存在或已停用"}
 
@@ -86,6 +90,23 @@ async def validate_semester_time(semester_id: int) -> dict:
     return {"valid": True, "message": "学期时间有效"}
 
 
+@router.get("/taxonomy", summary="获取完整分类体系（公开）")
+async def get_public_taxonomy(request: Request):
+    """
+    获取学期、年级、学科及各学科分类 - 公开接口
+
+    一次返回前台启动所需的全部选项，只包含已激活的数据；
+    内容由分类体系快照生成，客户端可通过 If-None-Match 协商缓存。
+    """
+    snapshot = await taxonomy.current()
+    body, etag = snapshot.public_payload(date.today())
+    headers = {"Cache-Control": "public, max-age=300", "ETag": etag}
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @router.get("/semesters/", summary="获取学期列表（公开）")
 async def get_public_semesters(
     response: Response,
@@ -144,8 +165,9 @@ async def check_semester_status(semester_id: int):
     semester_validation = await validate_semester_time(semester_id)
 
     if semester_validation["valid"]:
-        semester = await Semester.filter(id=semester_id, is_active=True).first()
-        if not semester:
+        snapshot = await taxonomy.current()
+        semester = snapshot.semesters.get(semester_id)
+        if not semester or not semester.is_active:
             return {
                 "valid": False,
                 "message": "学期不存在或已停用",
@@ -301,7 +323,7 @@ async def get_public_random_question(
         category_id=category_id,
         is_active=True,
         is_published=True
-    ).prefetch_related("semester", "grade", "subject", "category")
+    )
 
     if difficulty is not None:
         query = query.filter(difficulty=difficulty)
@@ -323,6 +345,7 @@ async def get_public_random_question(
     question.view_count += 1
     await question.save()
 
+    snapshot = await taxonomy.current()
     return {
         "id": question.id,
         "title": question.title,
@@ -342,29 +365,57 @@ async def get_public_random_question(
         "view_count": question.view_count,
         "created_at": question.created_at,
         "updated_at": question.updated_at,
-        "semester": {
-            "id": question.semester.id,
-            "name": question.semester.name,
-            "code": question.semester.code
-        } if question.semester else None,
-        "grade": {
-            "id": question.grade.id,
-            "name": question.grade.name,
-            "code": question.grade.code
-        } if question.grade else None,
-        "subject": {
-            "id": question.subject.id,
-            "name": question.subject.name,
-            "code": question.subject.code
-        } if question.subject else None,
-        "category": {
-            "id": question.category.id,
-            "name": question.category.name,
-            "code": question.category.code
-        } if question.category else None
+        **snapshot.refs(question)
     }
 
 
+@router.get("/questions/manifest", summary="获取试题快照包清单（公开）")
+async def get_public_question_manifest(
+    response: Response,
+    semester_id: int = Query(None, description="学期ID"),
+    grade_id: int = Query(None, description="年级ID"),
+    subject_id: int = Query(None, description="学科ID"),
+    category_id: int = Query(None, description="分类ID")
+):
+    """
+    获取已发布试题的快照包清单 - 公开接口
+
+    每个 (学期, 年级, 学科, 分类) 对应一个静态JSON文件，文件名包含内容哈希，
+    可长期缓存；只返回当前时间范围内学期的快照包。
+    """
+
+    # 如果指定了学期ID，先验证学期时间有效性
+    if semester_id is not None:
+        semester_validation = await validate_semester_time(semester_id)
+        if not semester_validation["valid"]:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "message": semester_validation["message"],
+                    "code": semester_validation.get("code", "SEMESTER_INVALID"),
+                    "type": "semester_time_error"
+                }
+            )
+
+    snapshot = await taxonomy.current()
+    filters = dict(zip(KEY_FIELDS, (semester_id, grade_id, subject_id, category_id)))
+    manifest = question_bundles.manifest()
+
+    bundles = {}
+    for name, entry in manifest["bundles"].items():
+        key = dict(zip(KEY_FIELDS, (int(part) for part in name.split("-"))))
+        if any(value is not None and key[field] != value for field, value in filters.items()):
+            continue
+        semester = snapshot.semesters.get(key["semester_id"])
+        if not semester or not semester.is_active or not is_semester_active_by_time(semester):
+            continue
+        bundles[name] = {**key, "url": entry["url"], "hash": entry["hash"], "count": entry["count"]}
+
+    # 清单变化频繁，只允许短时间缓存（被替换的快照文件会保留更长时间）
+    response.headers["Cache-Control"] = f"public, max-age={MANIFEST_MAX_AGE}"
+    return {"version": manifest["version"], "bundles": bundles}
+
+
 @router.get("/questions/", summary="获取试题列表（公开）")
 async def get_public_questions(
     semester_id: int = Query(None, description="学期ID"),
@@ -394,7 +445,7 @@ async def get_public_questions(
     query = Question.filter(
         is_active=True,
         is_published=True
-    ).prefetch_related("semester", "grade", "subject", "category")
+    )
 
     if semester_id is not None:
         query = query.filter(semester_id=semester_id)
@@ -416,6 +467,8 @@ async def get_public_questions(
 
     questions = await query.offset(skip).limit(limit).order_by("-created_at")
 
+    snapshot = await taxonomy.current()
+
     # 手动序列化
     result = []
     for question in questions:
@@ -438,26 +491,7 @@ async def get_public_questions(
             "view_count": question.view_count,
             "created_at": question.created_at,
             "updated_at": question.updated_at,
-            "semester": {
-                "id": question.semester.id,
-                "name": question.semester.name,
-                "code": question.semester.code
-            } if question.semester else None,
-            "grade": {
-                "id": question.grade.id,
-                "name": question.grade.name,
-                "code": question.grade.code
-            } if question.grade else None,
-            "subject": {
-                "id": question.subject.id,
-                "name": question.subject.name,
-                "code": question.subject.code
-            } if question.subject else None,
-            "category": {
-                "id": question.category.id,
-                "name": question.category.name,
-                "code": question.category.code
-            } if question.category else None
+            **snapshot.refs(question)
         }
         result.append(question_dict)
 
@@ -2,10 +2,6 @@ import random
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query, Body
 from app.models.question import Question
-from app.models.semester import Semester
-from app.models.grade import Grade
-from app.models.subject import Subject
-from app.models.category import Category
 from app.schemas.common import (
     QuestionCreate, QuestionUpdate, QuestionResponse,
     MessageResponse
@@ -13,17 +9,31 @@ from app.schemas.common import (
 from app.dependencies.auth import get_current_active_admin
 from app.utils.permissions import PermissionManager
 from app.models.role import PermissionCode, RoleCode
+from app.core.batch import CopyConflictError, copy_questions
+from app.core.category_tree import CategoryTree
+from app.core.question_counts import QuestionCounts, COUNT_FIELDS
+from app.core.question_bundles import question_bundles, KEY_FIELDS
+from app.core.taxonomy import taxonomy
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/questions", tags=["试题管理"])
 
 
+async def validate_taxonomy_refs(data: dict, message: str = "{Kind} not found"):
+    """校验数据中的学期、年级、学科、分类ID是否存在（值为空的跳过）"""
+    for kind in ("semester", "grade", "subject", "category"):
+        item_id = data.get(f"{kind}_id")
+        if item_id and not await taxonomy.find(kind, item_id):
+            raise HTTPException(status_code=400, detail=message.format(kind=kind, Kind=kind.capitalize()))
+
+
 @router.get("/", summary="获取试题列表")
 async def get_questions(
     semester_id: int = Query(None, description="学期ID"),
     grade_id: int = Query(None, description="年级ID"),
     subject_id: int = Query(None, description="学科ID"),
     category_id: int = Query(None, description="分类ID"),
+    include_descendants: bool = Query(False, description="是否包含子分类下的试题"),
     is_active: bool = Query(None, description="是否激活"),
     is_published: bool = Query(None, description="是否发布"),
     difficulty: int = Query(None, ge=1, le=5, description="难度等级"),
@@ -37,7 +47,7 @@ async def get_questions(
     # 检查角色：教师及以上角色可以查看试题
     if not current_admin.is_superuser and not await PermissionManager.has_any_role(current_admin, [RoleCode.SUPER_ADMIN, RoleCode.ADMIN, RoleCode.TEACHER, RoleCode.SUBJECT_ADMIN]):
         raise HTTPException(status_code=403, detail="Role required: teacher or above")
-    query = Question.all().prefetch_related("semester", "grade", "subject", "category")
+    query = Question.all()
 
     if semester_id is not None:
         query = query.filter(semester_id=semester_id)
@@ -49,7 +59,10 @@ async def get_questions(
         query = query.filter(subject_id=subject_id)
 
     if category_id is not None:
-        query = query.filter(category_id=category_id)
+        if include_descendants:
+            query = query.filter(category_id__in=CategoryTree.descendant_ids(category_id))
+        else:
+            query = query.filter(category_id=category_id)
 
     if is_active is not None:
         query = query.filter(is_active=is_active)
@@ -71,8 +84,9 @@ async def get_questions(
 
     # 执行分页查询
     questions = await query.offset(skip).limit(limit).order_by("-created_at")
+    snapshot = await taxonomy.current()
 
-    # 手动序列化避免循环引用
+    # 手动序列化避免循环引用，关联数据取自分类体系快照
     result = []
     for question in questions:
         question_dict = {
@@ -94,26 +108,7 @@ async def get_questions(
             "view_count": question.view_count,
             "created_at": question.created_at,
             "updated_at": question.updated_at,
-            "semester": {
-                "id": question.semester.id,
-                "name": question.semester.name,
-                "code": question.semester.code
-            } if question.semester else None,
-            "grade": {
-                "id": question.grade.id,
-                "name": question.grade.name,
-                "code": question.grade.code
-            } if question.grade else None,
-            "subject": {
-                "id": question.subject.id,
-                "name": question.subject.name,
-                "code": question.subject.code
-            } if question.subject else None,
-            "category": {
-                "id": question.category.id,
-                "name": question.category.name,
-                "code": question.category.code
-            } if question.category else None
+            **snapshot.refs(question)
         }
         result.append(question_dict)
 
@@ -144,7 +139,7 @@ async def get_random_question(
         category_id=category_id,
         is_active=True,
         is_published=True
-    ).prefetch_related("semester", "grade", "subject", "category")
+    )
 
     if difficulty is not None:
         query = query.filter(difficulty=difficulty)
@@ -166,6 +161,7 @@ async def get_random_question(
     question.view_count += 1
     await question.save()
 
+    snapshot = await taxonomy.current()
     return {
         "id": question.id,
         "title": question.title,
@@ -185,26 +181,7 @@ async def get_random_question(
         "view_count": question.view_count,
         "created_at": question.created_at,
         "updated_at": question.updated_at,
-        "semester": {
-            "id": question.semester.id,
-            "name": question.semester.name,
-            "code": question.semester.code
-        } if question.semester else None,
-        "grade": {
-            "id": question.grade.id,
-            "name": question.grade.name,
-            "code": question.grade.code
-        } if question.grade else None,
-        "subject": {
-            "id": question.subject.id,
-            "name": question.subject.name,
-            "code": question.subject.code
-        } if question.subject else None,
-        "category": {
-            "id": question.category.id,
-            "name": question.category.name,
-            "code": question.category.code
-        } if question.category else None
+        **snapshot.refs(question)
     }
 
 
@@ -217,9 +194,7 @@ async def get_question(
     # 检查权限
     if not current_admin.is_superuser and not await PermissionManager.has_permission(current_admin, PermissionCode.QUESTIONS_VIEW):
         raise HTTPException(status_code=403, detail="Permission denied")
-    question = await Question.filter(id=question_id).prefetch_related(
-        "semester", "grade", "subject", "category"
-    ).first()
+    question = await Question.filter(id=question_id).first()
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
 
@@ -228,6 +203,7 @@ async def get_question(
     await question.save()
 
     # 返回与列表API一致的格式
+    snapshot = await taxonomy.current()
     return {
         "id": question.id,
         "title": question.title,
@@ -247,26 +223,7 @@ async def get_question(
         "view_count": question.view_count,
         "created_at": question.created_at,
         "updated_at": question.updated_at,
-        "semester": {
-            "id": question.semester.id,
-            "name": question.semester.name,
-            "code": question.semester.code
-        } if question.semester else None,
-        "grade": {
-            "id": question.grade.id,
-            "name": question.grade.name,
-            "code": question.grade.code
-        } if question.grade else None,
-        "subject": {
-            "id": question.subject.id,
-            "name": question.subject.name,
-            "code": question.subject.code
-        } if question.subject else None,
-        "category": {
-            "id": question.category.id,
-            "name": question.category.name,
-            "code": question.category.code
-        } if question.category else None
+        **snapshot.refs(question)
     }
 
 
@@ -279,43 +236,14 @@ async def create_question(
     # 检查权限
     if not current_admin.is_superuser and not await PermissionManager.has_permission(current_admin, PermissionCode.QUESTIONS_CREATE):
         raise HTTPException(status_code=403, detail="Permission denied")
-    # 验证关联数据是否存在
-    semester = await Semester.filter(id=question_data.semester_id).first()
-    if not semester:
-        raise HTTPException(status_code=400, detail="Semester not found")
-
-    grade = await Grade.filter(id=question_data.grade_id).first()
-    if not grade:
-        raise HTTPException(status_code=400, detail="Grade not found")
-
-    subject = await Subject.filter(id=question_data.subject_id).first()
-    if not subject:
-        raise HTTPException(status_code=400, detail="Subject not found")
-
-    category = await Category.filter(id=question_data.category_id).first()
-    if not category:
-        raise HTTPException(status_code=400, detail="Category not found")
-
-    # 创建试题时需要使用对象而不是ID
-    question_dict = question_data.dict()
-    question_dict['semester'] = semester
-    question_dict['grade'] = grade
-    question_dict['subject'] = subject
-    question_dict['category'] = category
-
-    # 移除ID字段，因为我们使用对象
-    del question_dict['semester_id']
-    del question_dict['grade_id']
-    del question_dict['subject_id']
-    del question_dict['category_id']
-
-    question = await Question.create(**question_dict)
-
-    # 重新获取完整数据
-    question = await Question.filter(id=question.id).prefetch_related(
-        "semester", "grade", "subject", "category"
-    ).first()
+    # 验证关联数据是否存在（查询分类体系快照）
+    await validate_taxonomy_refs(question_data.model_dump())
 
+    question = await Question.create(**question_data.dict())
+    await QuestionCounts.refresh_for([question])
+    await question_bundles.rebuild_for([question])
+
+    snapshot = await taxonomy.current()
     return {
         "id": question.id,
         "title": question.title,
@@ -335,26 +263,7 @@ async def create_question(
         "view_count": question.view_count,
         "created_at": question.created_at,
         "updated_at": question.updated_at,
-        "semester": {
-            "id": question.semester.id,
-            "name": question.semester.name,
-            "code": question.semester.code
-        } if question.semester else None,
-        "grade": {
-            "id": question.grade.id,
-            "name": question.grade.name,
-            "code": question.grade.code
-        } if question.grade else None,
-        "subject": {
-            "id": question.subject.id,
-            "name": question.subject.name,
-            "code": question.subject.code
-        } if question.subject else None,
-        "category": {
-            "id": question.category.id,
-            "name": question.category.name,
-            "code": question.category.code
-        } if question.category else None
+        **snapshot.refs(question)
     }
 
 
@@ -375,45 +284,19 @@ async def update_question(
 
     update_data = question_data.model_dump(exclude_unset=True)
 
-    # 验证并设置关联数据（如果要更新）
-    if question_data.semester_id:
-        semester = await Semester.filter(id=question_data.semester_id).first()
-        if not semester:
-            raise HTTPException(status_code=400, detail="Semester not found")
-        update_data['semester'] = semester
-        del update_data['semester_id']
-
-    if question_data.grade_id:
-        grade = await Grade.filter(id=question_data.grade_id).first()
-        if not grade:
-            raise HTTPException(status_code=400, detail="Grade not found")
-        update_data['grade'] = grade
-        del update_data['grade_id']
-
-    if question_data.subject_id:
-        subject = await Subject.filter(id=question_data.subject_id).first()
-        if not subject:
-            raise HTTPException(status_code=400, detail="Subject not found")
-        update_data['subject'] = subject
-        del update_data['subject_id']
-
-    if question_data.category_id:
-        category = await Category.filter(id=question_data.category_id).first()
-        if not category:
-            raise HTTPException(status_code=400, detail="Category not found")
-        update_data['category'] = category
-        del update_data['category_id']
+    # 验证关联数据（如果要更新）
+    await validate_taxonomy_refs(update_data)
 
     # 更新题目数据
+    before = {field: getattr(question, field) for field in (*COUNT_FIELDS, "is_published")}
     for field, value in update_data.items():
         setattr(question, field, value)
     await question.save()
+    if QuestionCounts.affects(update_data):
+        await QuestionCounts.refresh_for([before, question])
+    await question_bundles.rebuild_for([before, question])
 
-    # 重新获取完整数据
-    question = await Question.filter(id=question_id).prefetch_related(
-        "semester", "grade", "subject", "category"
-    ).first()
-
+    snapshot = await taxonomy.current()
     return {
         "id": question.id,
         "title": question.title,
@@ -433,26 +316,7 @@ async def update_question(
         "view_count": question.view_count,
         "created_at": question.created_at,
         "updated_at": question.updated_at,
-        "semester": {
-            "id": question.semester.id,
-            "name": question.semester.name,
-            "code": question.semester.code
-        } if question.semester else None,
-        "grade": {
-            "id": question.grade.id,
-            "name": question.grade.name,
-            "code": question.grade.code
-        } if question.grade else None,
-        "subject": {
-            "id": question.subject.id,
-            "name": question.subject.name,
-            "code": question.subject.code
-        } if question.subject else None,
-        "category": {
-            "id": question.category.id,
-            "name": question.category.name,
-            "code": question.category.code
-        } if question.category else None
+        **snapshot.refs(question)
     }
 
 
@@ -471,6 +335,8 @@ async def delete_question(
         raise HTTPException(status_code=404, detail="Question not found")
 
     await question.delete()
+    await QuestionCounts.refresh_for([question])
+    await question_bundles.rebuild_for([question])
     return {"message": "Question deleted successfully"}
 
 
@@ -513,28 +379,16 @@ async def batch_update_questions(
     # 验证更新数据中的关联字段
     update_data = request.update_data.copy()
 
-    if 'semester_id' in update_data:
-        semester = await Semester.filter(id=update_data['semester_id']).first()
-        if not semester:
-            raise HTTPException(status_code=400, detail="Semester not found")
-
-    if 'grade_id' in update_data:
-        grade = await Grade.filter(id=update_data['grade_id']).first()
-        if not grade:
-            raise HTTPException(status_code=400, detail="Grade not found")
-
-    if 'subject_id' in update_data:
-        subject = await Subject.filter(id=update_data['subject_id']).first()
-        if not subject:
-            raise HTTPException(status_code=400, detail="Subject not found")
-
-    if 'category_id' in update_data:
-        category = await Category.filter(id=update_data['category_id']).first()
-        if not category:
-            raise HTTPException(status_code=400, detail="Category not found")
+    await validate_taxonomy_refs(update_data)
 
     # 执行批量更新
     await Question.filter(id__in=request.question_ids).update(**update_data)
+    if QuestionCounts.affects(update_data):
+        await QuestionCounts.refresh_for(questions, [update_data])
+    await question_bundles.rebuild_for(
+        questions,
+        await Question.filter(id__in=request.question_ids).values(*KEY_FIELDS, "is_published")
+    )
 
     return {
         "message": f"Successfully updated {len(request.question_ids)} questions",
@@ -562,6 +416,8 @@ async def batch_delete_questions(
 
     # 执行批量删除
     deleted_count = await Question.filter(id__in=request.question_ids).delete()
+    await QuestionCounts.refresh_for(questions)
+    await question_bundles.rebuild_for(questions)
 
     return {
         "message": f"Successfully deleted {deleted_count} questions",
@@ -582,66 +438,35 @@ async def batch_copy_questions(
     if not request.question_ids:
         raise HTTPException(status_code=400, detail="No question IDs provided")
 
-    # 获取原始题目
-    original_questions = await Question.filter(id__in=request.question_ids).prefetch_related(
-        "semester", "grade", "subject", "category"
-    )
-
-    if len(original_questions) != len(request.question_ids):
+    # 验证题目是否存在
+    existing_count = await Question.filter(id__in=request.question_ids).count()
+    if existing_count != len(set(request.question_ids)):
         raise HTTPException(status_code=400, detail="Some questions not found")
 
     # 验证目标关联数据
-    target_semester = None
-    target_grade = None
-    target_subject = None
-    target_category = None
-
-    if request.target_semester_id:
-        target_semester = await Semester.filter(id=request.target_semester_id).first()
-        if not target_semester:
-            raise HTTPException(status_code=400, detail="Target semester not found")
-
-    if request.target_grade_id:
-        target_grade = await Grade.filter(id=request.target_grade_id).first()
-        if not target_grade:
-            raise HTTPException(status_code=400, detail="Target grade not found")
-
-    if request.target_subject_id:
-        target_subject = await Subject.filter(id=request.target_subject_id).first()
-        if not target_subject:
-            raise HTTPException(status_code=400, detail="Target subject not found")
-
-    if request.target_category_id:
-        target_category = await Category.filter(id=request.target_category_id).first()
-        if not target_category:
-            raise HTTPException(status_code=400, detail="Target category not found")
-
-    # 复制题目
-    copied_questions = []
-    for original in original_questions:
-        question_data = {
-            "title": f"{original.title} (副本)",
-            "content": original.content,
-            "answer": original.answer,
-            "difficulty": original.difficulty,
-            "question_type": original.question_type,
-            "semester": target_semester or original.semester,
-            "grade": target_grade or original.grade,
-            "subject": target_subject or original.subject,
-            "category": target_category or original.category,
-            "is_active": original.is_active,
-            "is_published": False,  # 复制的题目默认未发布
-            "tags": original.tags,
-            "source": original.source,
-            "author": original.author,
-            "view_count": 0  # 重置查看次数
-        }
-
-        copied_question = await Question.create(**question_data)
-        copied_questions.append(copied_question)
+    await validate_taxonomy_refs({
+        "semester_id": request.target_semester_id,
+        "grade_id": request.target_grade_id,
+        "subject_id": request.target_subject_id,
+        "category_id": request.target_category_id,
+    }, message="Target {kind} not found")
+
+    # 复制题目（单个事务内批量写入）
+    try:
+        id_map = await copy_questions(
+            request.question_ids,
+            target_semester_id=request.target_semester_id,
+            target_grade_id=request.target_grade_id,
+            target_subject_id=request.target_subject_id,
+            target_category_id=request.target_category_id,
+        )
+    except CopyConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    copied_question_ids = [id_map[qid] for qid in dict.fromkeys(request.question_ids) if qid in id_map]
+    await QuestionCounts.refresh_for(await Question.filter(id__in=copied_question_ids).values(*COUNT_FIELDS))
 
     return {
-        "message": f"Successfully copied {len(copied_questions)} questions",
-        "copied_count": len(copied_questions),
-        "copied_question_ids": [q.id for q in copied_questions]
+        "message": f"Successfully copied {len(copied_question_ids)} questions",
+        "copied_count": len(copied_question_ids),
+        "copied_question_ids": copied_question_ids
     }
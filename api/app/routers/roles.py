@@ -8,9 +8,17 @@ from app.models.role import Role, Permission, RolePermission, AdminRole, Permiss
 from app.dependencies.auth import get_current_active_admin
 from app.utils.permissions import PermissionManager, require_permission
 from app.utils.logger import SystemLogger, LogModule
+from app.core.batch import BatchEngine
 
 router = APIRouter(prefix="/roles", tags=["角色权限管理"])
 
+# 批量操作引擎
+role_batch = BatchEngine(
+    Role, "Role",
+    protected_fields=("code", "is_system"),
+    dependencies=((AdminRole, "role_id", "Cannot delete role with assigned admins"),)
+)
+
 
 class RoleResponse(BaseModel):
     id: int
@@ -315,41 +323,10 @@ async def batch_update_roles(
     if not await PermissionManager.has_permission(current_admin, PermissionCode.ADMINS_EDIT):
         raise HTTPException(status_code=403, detail="Permission denied")
 
-    success_count = 0
-    failed_count = 0
-    failed_items = []
-
-    for role_id in request.get_ids():
-        try:
-            role = await Role.get_or_none(id=role_id)
-            if not role:
-                failed_count += 1
-                failed_items.append({"id": role_id, "error": "Role not found"})
-                continue
-
-            # 系统角色不能修改
-            if role.is_system:
-                failed_count += 1
-                failed_items.append({"id": role_id, "error": "Cannot modify system role"})
-                continue
-
-            # 更新角色数据
-            for field, value in request.update_data.items():
-                if hasattr(role, field) and field not in ['id', 'code', 'is_system', 'created_at', 'updated_at']:
-                    setattr(role, field, value)
-
-            await role.save()
-            success_count += 1
-        except Exception as e:
-            failed_count += 1
-            failed_items.append({"id": role_id, "error": str(e)})
-
-    return BatchOperationResponse(
-        success_count=success_count,
-        failed_count=failed_count,
-        total_count=len(request.get_ids()),
-        message=f"批量更新完成：成功 {success_count} 个，失败 {failed_count} 个",
-        failed_items=failed_items
+    return await role_batch.update(
+        request.get_ids(),
+        request.update_data,
+        reject={"is_system": "Cannot modify system role"}
     )
 
 
@@ -363,51 +340,20 @@ async def batch_delete_roles(
     if not await PermissionManager.has_permission(current_admin, PermissionCode.ADMINS_DELETE):
         raise HTTPException(status_code=403, detail="Permission denied")
 
-    success_count = 0
-    failed_count = 0
-    failed_items = []
-
-    for role_id in request.get_ids():
-        try:
-            role = await Role.get_or_none(id=role_id)
-            if not role:
-                failed_count += 1
-                failed_items.append({"id": role_id, "error": "Role not found"})
-                continue
-
-            # 系统角色不能删除
-            if role.is_system:
-                failed_count += 1
-                failed_items.append({"id": role_id, "error": "Cannot delete system role"})
-                continue
-
-            # 检查是否有管理员使用该角色
-            admin_count = await AdminRole.filter(role=role).count()
-            if admin_count > 0:
-                failed_count += 1
-                failed_items.append({"id": role_id, "error": "Cannot delete role with assigned admins"})
-                continue
-
-            await role.delete()
-            success_count += 1
+    result, deleted_roles = await role_batch.delete(
+        request.get_ids(),
+        reject={"is_system": "Cannot delete system role"}
+    )
 
-            await SystemLogger.warning(
-                module=LogModule.SYSTEM,
-                message=f"批量删除角色: {role.name}",
-                details={"role_id": role.id, "role_code": role.code},
-                user=current_admin.username
-            )
-        except Exception as e:
-            failed_count += 1
-            failed_items.append({"id": role_id, "error": str(e)})
+    for role in deleted_roles:
+        await SystemLogger.warning(
+            module=LogModule.SYSTEM,
+            message=f"批量删除角色: {role['name']}",
+            details={"role_id": role["id"], "role_code": role["code"]},
+            user=current_admin.username
+        )
 
-    return BatchOperationResponse(
-        success_count=success_count,
-        failed_count=failed_count,
-        total_count=len(request.get_ids()),
-        message=f"批量删除完成：成功 {success_count} 个，失败 {failed_count} 个",
-        failed_items=failed_items
-    )
+    return result
 
 
 @router.post("/batch-activate", response_model=BatchOperationResponse, summary="批量激活角色")
@@ -420,32 +366,7 @@ async def batch_activate_roles(
     if not await PermissionManager.has_permission(current_admin, PermissionCode.ADMINS_EDIT):
         raise HTTPException(status_code=403, detail="Permission denied")
 
-    success_count = 0
-    failed_count = 0
-    failed_items = []
-
-    for role_id in request.get_ids():
-        try:
-            role = await Role.get_or_none(id=role_id)
-            if not role:
-                failed_count += 1
-                failed_items.append({"id": role_id, "error": "Role not found"})
-                continue
-
-            role.is_active = True
-            await role.save()
-            success_count += 1
-        except Exception as e:
-            failed_count += 1
-            failed_items.append({"id": role_id, "error": str(e)})
-
-    return BatchOperationResponse(
-        success_count=success_count,
-        failed_count=failed_count,
-        total_count=len(request.get_ids()),
-        message=f"批量激活完成：成功 {success_count} 个，失败 {failed_count} 个",
-        failed_items=failed_items
-    )
+    return await role_batch.update(request.get_ids(), {"is_active": True}, action="激活")
 
 
 @router.post("/batch-deactivate", response_model=BatchOperationResponse, summary="批量禁用角色")
@@ -458,37 +379,11 @@ async def batch_deactivate_roles(
     if not await PermissionManager.has_permission(current_admin, PermissionCode.ADMINS_EDIT):
         raise HTTPException(status_code=403, detail="Permission denied")
 
-    success_count = 0
-    failed_count = 0
-    failed_items = []
-
-    for role_id in request.get_ids():
-        try:
-            role = await Role.get_or_none(id=role_id)
-            if not role:
-                failed_count += 1
-                failed_items.append({"id": role_id, "error": "Role not found"})
-                continue
-
-            # 系统角色不能禁用
-            if role.is_system:
-                failed_count += 1
-                failed_items.append({"id": role_id, "error": "Cannot deactivate system role"})
-                continue
-
-            role.is_active = False
-            await role.save()
-            success_count += 1
-        except Exception as e:
-            failed_count += 1
-            failed_items.append({"id": role_id, "error": str(e)})
-
-    return BatchOperationResponse(
-        success_count=success_count,
-        failed_count=failed_count,
-        total_count=len(request.get_ids()),
-        message=f"批量禁用完成：成功 {success_count} 个，失败 {failed_count} 个",
-        failed_items=failed_items
+    return await role_batch.update(
+        request.get_ids(),
+        {"is_active": False},
+        reject={"is_system": "Cannot deactivate system role"},
+        action="禁用"
     )
 
 
@@ -8,8 +8,11 @@ from app.models.category import Category
 from app.models.grade import Grade
 from app.models.semester import Semester
 from app.dependencies.auth import get_current_active_admin
+from app.dependencies.database import read_only_db
+from app.core.postgres_backend import is_postgres, search_question_ids
+from app.core.question_counts import QuestionCounts
 
-router = APIRouter(prefix="/search", tags=["搜索功能"])
+router = APIRouter(prefix="/search", tags=["搜索功能"], dependencies=[Depends(read_only_db)])
 
 
 class SearchResult(BaseModel):
@@ -82,24 +85,32 @@ async def global_search(
 
 async def search_questions(search_terms: List[str], limit: int) -> List[Dict[str, Any]]:
     """搜索试题"""
-    
-    # 构建查询条件
-    query = Question.filter(is_active=True)
-    
-    # 多关键词搜索
-    for term in search_terms:
-        query = query.filter(
-            title__icontains=term
-        ).union(
-            Question.filter(content__icontains=term, is_active=True)
-        ).union(
-            Question.filter(tags__icontains=term, is_active=True)
+
+    if is_postgres():
+        # PostgreSQL 使用三元组索引搜索，保持按相似度排序的结果顺序
+        ids = await search_question_ids(search_terms, limit)
+        questions = await Question.filter(id__in=ids).prefetch_related(
+            "subject", "grade", "category", "semester"
         )
-    
-    # 获取结果并预加载关联数据
-    questions = await query.prefetch_related(
-        "subject", "grade", "category", "semester"
-    ).limit(limit).order_by("-created_at")
+        questions.sort(key=lambda question: ids.index(question.id))
+    else:
+        # 构建查询条件
+        query = Question.filter(is_active=True)
+
+        # 多关键词搜索
+        for term in search_terms:
+            query = query.filter(
+                title__icontains=term
+            ).union(
+                Question.filter(content__icontains=term, is_active=True)
+            ).union(
+                Question.filter(tags__icontains=term, is_active=True)
+            )
+
+        # 获取结果并预加载关联数据
+        questions = await query.prefetch_related(
+            "subject", "grade", "category", "semester"
+        ).limit(limit).order_by("-created_at")
     
     # 转换为字典格式
     result = []
@@ -150,10 +161,12 @@ async def search_subjects(search_terms: List[str], limit: int) -> List[Dict[str,
     
     subjects = await query.limit(limit).order_by("sort_order", "name")
     
+    # 题目数量取自统计表，一次查询
+    counts = await QuestionCounts.get("subject", [subject.id for subject in subjects])
+
     result = []
     for subject in subjects:
-        # 统计该学科的题目数量
-        question_count = await Question.filter(subject_id=subject.id, is_active=True).count()
+        question_count = counts.get(subject.id, {}).get("active_question_count", 0)
         
         result.append({
             "id": subject.id,
@@ -185,10 +198,12 @@ async def search_categories(search_terms: List[str], limit: int) -> List[Dict[st
     
     categories = await query.prefetch_related("subject").limit(limit).order_by("sort_order", "name")
     
+    # 题目数量取自统计表，一次查询
+    counts = await QuestionCounts.get("category", [category.id for category in categories])
+
     result = []
     for category in categories:
-        # 统计该分类的题目数量
-        question_count = await Question.filter(category_id=category.id, is_active=True).count()
+        question_count = counts.get(category.id, {}).get("active_question_count", 0)
         
         result.append({
             "id": category.id,
@@ -222,10 +237,12 @@ async def search_grades(search_terms: List[str], limit: int) -> List[Dict[str, A
     
     grades = await query.limit(limit).order_by("sort_order", "name")
     
+    # 题目数量取自统计表，一次查询
+    counts = await QuestionCounts.get("grade", [grade.id for grade in grades])
+
     result = []
     for grade in grades:
-        # 统计该年级的题目数量
-        question_count = await Question.filter(grade_id=grade.id, is_active=True).count()
+        question_count = counts.get(grade.id, {}).get("active_question_count", 0)
         
         result.append({
             "id": grade.id,
@@ -254,10 +271,12 @@ async def search_semesters(search_terms: List[str], limit: int) -> List[Dict[str
     
     semesters = await query.limit(limit).order_by("-start_date", "name")
     
+    # 题目数量取自统计表，一次查询
+    counts = await QuestionCounts.get("semester", [semester.id for semester in semesters])
+
     result = []
     for semester in semesters:
-        # 统计该学期的题目数量
-        question_count = await Question.filter(semester_id=semester.id, is_active=True).count()
+        question_count = counts.get(semester.id, {}).get("active_question_count", 0)
         
         result.append({
             "id": semester.id,
@@ -1,6 +1,7 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, Query
 from app.models.semester import Semester
+from app.models.question import Question
 from app.schemas.common import (
     SemesterCreate, SemesterUpdate, SemesterResponse,
     PaginatedResponse, MessageResponse, BatchUpdateRequest,
@@ -9,9 +10,21 @@ from app.schemas.common import (
 from app.dependencies.auth import get_current_active_admin
 from app.utils.permissions import PermissionManager
 from app.models.role import PermissionCode
+from app.core.batch import BatchEngine
+from app.core.taxonomy import taxonomy
+from app.core.question_counts import QuestionCounts
+from app.core.question_bundles import question_bundles
 
 router = APIRouter(prefix="/semesters", tags=["学期管理"])
 
+# 批量操作引擎
+semester_batch = BatchEngine(
+    Semester, "Semester",
+    unique_fields=("name", "code"),
+    dependencies=((Question, "semester_id", "Semester has {count} questions"),),
+    on_change=taxonomy.invalidate
+)
+
 
 @router.get("/", response_model=List[SemesterResponse], summary="获取学期列表")
 async def get_semesters(
@@ -87,6 +100,7 @@ async def create_semester(
         raise HTTPException(status_code=400, detail="Semester code already exists")
     
     semester = await Semester.create(**semester_data.dict())
+    taxonomy.invalidate()
 
     return {
         "id": semester.id,
@@ -127,6 +141,7 @@ async def update_semester(
     for field, value in update_data.items():
         setattr(semester, field, value)
     await semester.save()
+    taxonomy.invalidate()
 
     return {
         "id": semester.id,
@@ -155,7 +170,13 @@ async def delete_semester(
     if not semester:
         raise HTTPException(status_code=404, detail="Semester not found")
     
+    has_questions = await Question.filter(semester_id=semester_id).exists()
     await semester.delete()
+    taxonomy.invalidate()
+    if has_questions:
+        # 级联删除了试题，重新统计数量并重建快照包
+        await QuestionCounts.rebuild()
+        await question_bundles.rebuild()
     return {"message": "Semester deleted successfully"}
 
 
@@ -169,36 +190,7 @@ async def batch_update_semesters(
     if not current_admin.is_superuser and not await PermissionManager.has_permission(current_admin, PermissionCode.BASIC_DATA_EDIT):
         raise HTTPException(status_code=403, detail="Permission denied")
 
-    success_count = 0
-    failed_count = 0
-    failed_items = []
-
-    for semester_id in request.get_ids():
-        try:
-            semester = await Semester.filter(id=semester_id).first()
-            if not semester:
-                failed_count += 1
-                failed_items.append({"id": semester_id, "error": "Semester not found"})
-                continue
-
-            # 更新学期数据
-            for field, value in request.update_data.items():
-                if hasattr(semester, field):
-                    setattr(semester, field, value)
-
-            await semester.save()
-            success_count += 1
-        except Exception as e:
-            failed_count += 1
-            failed_items.append({"id": semester_id, "error": str(e)})
-
-    return BatchOperationResponse(
-        success_count=success_count,
-        failed_count=failed_count,
-        total_count=len(request.get_ids()),
-        message=f"批量更新完成：成功 {success_count} 个，失败 {failed_count} 个",
-        failed_items=failed_items
-    )
+    return await semester_batch.update(request.get_ids(), request.update_data)
 
 
 @router.post("/batch-delete", response_model=BatchOperationResponse, summary="批量删除学期")
@@ -211,31 +203,8 @@ async def batch_delete_semesters(
     if not current_admin.is_superuser and not await PermissionManager.has_permission(current_admin, PermissionCode.BASIC_DATA_EDIT):
         raise HTTPException(status_code=403, detail="Permission denied")
 
-    success_count = 0
-    failed_count = 0
-    failed_items = []
-
-    for semester_id in request.get_ids():
-        try:
-            semester = await Semester.filter(id=semester_id).first()
-            if not semester:
-                failed_count += 1
-                failed_items.append({"id": semester_id, "error": "Semester not found"})
-                continue
-
-            await semester.delete()
-            success_count += 1
-        except Exception as e:
-            failed_count += 1
-            failed_items.append({"id": semester_id, "error": str(e)})
-
-    return BatchOperationResponse(
-        success_count=success_count,
-        failed_count=failed_count,
-        total_count=len(request.get_ids()),
-        message=f"批量删除完成：成功 {success_count} 个，失败 {failed_count} 个",
-        failed_items=failed_items
-    )
+    result, _ = await semester_batch.delete(request.get_ids())
+    return result
 
 
 @router.post("/batch-copy", response_model=BatchOperationResponse, summary="批量复制学期")
@@ -248,55 +217,9 @@ async def batch_copy_semesters(
     if not current_admin.is_superuser and not await PermissionManager.has_permission(current_admin, PermissionCode.BASIC_DATA_EDIT):
         raise HTTPException(status_code=403, detail="Permission denied")
 
-    success_count = 0
-    failed_count = 0
-    failed_items = []
-    copy_count = request.copy_data.get('copy_count', 1)
-    name_suffix = request.copy_data.get('name_suffix', '_副本')
-
-    for semester_id in request.get_ids():
-        try:
-            semester = await Semester.filter(id=semester_id).first()
-            if not semester:
-                failed_count += 1
-                failed_items.append({"id": semester_id, "error": "Semester not found"})
-                continue
-
-            for i in range(copy_count):
-                # 创建副本
-                copy_name = f"{semester.name}{name_suffix}"
-                if copy_count > 1:
-                    copy_name += f"_{i+1}"
-
-                copy_code = f"{semester.code}_copy"
-                if copy_count > 1:
-                    copy_code += f"_{i+1}"
-
-                # 确保代码唯一性
-                counter = 1
-                original_copy_code = copy_code
-                while await Semester.filter(code=copy_code).exists():
-                    copy_code = f"{original_copy_code}_{counter}"
-                    counter += 1
-
-                await Semester.create(
-                    name=copy_name,
-                    code=copy_code,
-                    start_date=semester.start_date,
-                    end_date=semester.end_date,
-                    is_active=semester.is_active,
-                    sort_order=semester.sort_order,
-                    description=semester.description
-                )
-                success_count += 1
-        except Exception as e:
-            failed_count += 1
-            failed_items.append({"id": semester_id, "error": str(e)})
-
-    return BatchOperationResponse(
-        success_count=success_count,
-        failed_count=failed_count,
-        total_count=len(request.get_ids()) * copy_count,
-        message=f"批量复制完成：成功 {success_count} 个，失败 {failed_count} 个",
-        failed_items=failed_items
+    return await semester_batch.copy(
+        request.get_ids(),
+        copy_count=request.copy_data.get('copy_count', 1),
+        name_suffix=request.copy_data.get('name_suffix', '_副本')
     )
+
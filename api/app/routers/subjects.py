@@ -1,6 +1,8 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, Query
 from app.models.subject import Subject
+from app.models.question import Question
+from app.models.category import Category
 from app.schemas.common import (
     SubjectCreate, SubjectUpdate, SubjectResponse,
     MessageResponse, BatchUpdateRequest, BatchDeleteRequest,
@@ -9,9 +11,24 @@ from app.schemas.common import (
 from app.dependencies.auth import get_current_active_admin
 from app.utils.permissions import PermissionManager
 from app.models.role import PermissionCode
+from app.core.batch import BatchEngine
+from app.core.taxonomy import taxonomy
+from app.core.question_counts import QuestionCounts
+from app.core.question_bundles import question_bundles
 
 router = APIRouter(prefix="/subjects", tags=["学科管理"])
 
+# 批量操作引擎
+subject_batch = BatchEngine(
+    Subject, "Subject",
+    unique_fields=("name", "code"),
+    dependencies=(
+        (Question, "subject_id", "Subject has {count} questions"),
+        (Category, "subject_id", "Subject has {count} categories"),
+    ),
+    on_change=taxonomy.invalidate
+)
+
 
 @router.get("/", response_model=List[SubjectResponse], summary="获取学科列表")
 async def get_subjects(
@@ -58,6 +75,7 @@ async def create_subject(
         raise HTTPException(status_code=400, detail="Subject code already exists")
     
     subject = await Subject.create(**subject_data.dict())
+    taxonomy.invalidate()
     return subject
 
 
@@ -87,6 +105,7 @@ async def update_subject(
     for field, value in update_data.items():
         setattr(subject, field, value)
     await subject.save()
+    taxonomy.invalidate()
     return subject
 
 
@@ -104,7 +123,13 @@ async def delete_subject(
     if not subject:
         raise HTTPException(status_code=404, detail="Subject not found")
     
+    has_questions = await Question.filter(subject_id=subject_id).exists()
     await subject.delete()
+    taxonomy.invalidate()
+    if has_questions:
+        # 级联删除了试题，重新统计数量并重建快照包
+        await QuestionCounts.rebuild()
+        await question_bundles.rebuild()
     return {"message": "Subject deleted successfully"}
 
 
@@ -118,36 +143,7 @@ async def batch_update_subjects(
     if not current_admin.is_superuser and not await PermissionManager.has_permission(current_admin, PermissionCode.BASIC_DATA_EDIT):
         raise HTTPException(status_code=403, detail="Permission denied")
 
-    success_count = 0
-    failed_count = 0
-    failed_items = []
-
-    for subject_id in request.get_ids():
-        try:
-            subject = await Subject.filter(id=subject_id).first()
-            if not subject:
-                failed_count += 1
-                failed_items.append({"id": subject_id, "error": "Subject not found"})
-                continue
-
-            # 更新学科数据
-            for field, value in request.update_data.items():
-                if hasattr(subject, field):
-                    setattr(subject, field, value)
-
-            await subject.save()
-            success_count += 1
-        except Exception as e:
-            failed_count += 1
-            failed_items.append({"id": subject_id, "error": str(e)})
-
-    return BatchOperationResponse(
-        success_count=success_count,
-        failed_count=failed_count,
-        total_count=len(request.get_ids()),
-        message=f"批量更新完成：成功 {success_count} 个，失败 {failed_count} 个",
-        failed_items=failed_items
-    )
+    return await subject_batch.update(request.get_ids(), request.update_data)
 
 
 @router.post("/batch-delete", response_model=BatchOperationResponse, summary="批量删除学科")
@@ -160,31 +156,8 @@ async def batch_delete_subjects(
     if not current_admin.is_superuser and not await PermissionManager.has_permission(current_admin, PermissionCode.BASIC_DATA_EDIT):
         raise HTTPException(status_code=403, detail="Permission denied")
 
-    success_count = 0
-    failed_count = 0
-    failed_items = []
-
-    for subject_id in request.get_ids():
-        try:
-            subject = await Subject.filter(id=subject_id).first()
-            if not subject:
-                failed_count += 1
-                failed_items.append({"id": subject_id, "error": "Subject not found"})
-                continue
-
-            await subject.delete()
-            success_count += 1
-        except Exception as e:
-            failed_count += 1
-            failed_items.append({"id": subject_id, "error": str(e)})
-
-    return BatchOperationResponse(
-        success_count=success_count,
-        failed_count=failed_count,
-        total_count=len(request.get_ids()),
-        message=f"批量删除完成：成功 {success_count} 个，失败 {failed_count} 个",
-        failed_items=failed_items
-    )
+    result, _ = await subject_batch.delete(request.get_ids())
+    return result
 
 
 @router.post("/batch-copy", response_model=BatchOperationResponse, summary="批量复制学科")
@@ -197,55 +170,9 @@ async def batch_copy_subjects(
     if not current_admin.is_superuser and not await PermissionManager.has_permission(current_admin, PermissionCode.BASIC_DATA_EDIT):
         raise HTTPException(status_code=403, detail="Permission denied")
 
-    success_count = 0
-    failed_count = 0
-    failed_items = []
-    copy_count = request.copy_data.get('copy_count', 1)
-    name_suffix = request.copy_data.get('name_suffix', '_副本')
-
-    for subject_id in request.get_ids():
-        try:
-            subject = await Subject.filter(id=subject_id).first()
-            if not subject:
-                failed_count += 1
-                failed_items.append({"id": subject_id, "error": "Subject not found"})
-                continue
-
-            for i in range(copy_count):
-                # 创建副本
-                copy_name = f"{subject.name}{name_suffix}"
-                if copy_count > 1:
-                    copy_name += f"_{i+1}"
-
-                copy_code = f"{subject.code}_copy"
-                if copy_count > 1:
-                    copy_code += f"_{i+1}"
-
-                # 确保代码唯一性
-                counter = 1
-                original_copy_code = copy_code
-                while await Subject.filter(code=copy_code).exists():
-                    copy_code = f"{original_copy_code}_{counter}"
-                    counter += 1
-
-                await Subject.create(
-                    name=copy_name,
-                    code=copy_code,
-                    icon=subject.icon,
-                    color=subject.color,
-                    is_active=subject.is_active,
-                    sort_order=subject.sort_order,
-                    description=subject.description
-                )
-                success_count += 1
-        except Exception as e:
-            failed_count += 1
-            failed_items.append({"id": subject_id, "error": str(e)})
-
-    return BatchOperationResponse(
-        success_count=success_count,
-        failed_count=failed_count,
-        total_count=len(request.get_ids()) * copy_count,
-        message=f"批量复制完成：成功 {success_count} 个，失败 {failed_count} 个",
-        failed_items=failed_items
+    return await subject_batch.copy(
+        request.get_ids(),
+        copy_count=request.copy_data.get('copy_count', 1),
+        name_suffix=request.copy_data.get('name_suffix', '_副本')
     )
+
@@ -3,13 +3,22 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 import json
+import asyncio
+from pathlib import Path
+from app.config import settings
 from app.models.admin import Admin
 from app.models.question import Question
 from app.models.semester import Semester
 from app.models.grade import Grade
 from app.models.subject import Subject
 from app.models.category import Category
-from app.models.system_log import SystemLog, LogLevel, LogModule
+from app.models.system_log import LogModule
+from app.core.log_store import log_store, utcnow as log_utcnow
+from app.core.backup_jobs import Job, JobConflictError, job_manager, backup_extension, copy_database
+from app.core.backup_archive import backup_archive
+from app.core.http_clients import get_http_client
+from app.core.database_restore import restore_database
+from app.core.scheduler import scheduler
 from app.models.system_config import SystemConfig, ConfigType, ConfigKey
 from app.dependencies.auth import get_current_active_admin
 from app.utils.auth import get_password_hash
@@ -583,194 +592,198 @@ async def health_check():
         }
 
 
-@router.post("/backup", summary="数据备份")
+@router.post("/backup", status_code=202, summary="数据备份")
 async def create_backup(
     backup_request: Optional[dict] = None,
     current_admin = Depends(get_current_active_admin)
 ):
-    """创建数据备份（仅超级管理员可操作）"""
+    """创建数据备份任务（仅超级管理员可操作），通过任务状态接口查询进度"""
     if not current_admin.is_superuser:
         raise HTTPException(status_code=403, detail="Only superuser can create backup")
 
-    import os
-    import sqlite3
-    import shutil
-    from pathlib import Path
+    # 解析备份请求参数
+    backup_method = "local"  # 默认本地备份
+    webdav_config = None
+    ftp_config = None
+
+    if backup_request:
+        backup_method = backup_request.get("method", "local")
+        webdav_config = backup_request.get("webdav")
+        ftp_config = backup_request.get("ftp")
 
     try:
-        # 解析备份请求参数
-        backup_method = "local"  # 默认本地备份
-        webdav_config = None
-        ftp_config = None
-
-        if backup_request:
-            backup_method = backup_request.get("method", "local")
-            webdav_config = backup_request.get("webdav")
-            ftp_config = backup_request.get("ftp")
-
-        # 获取数据库文件路径
-        db_path = "db.sqlite3"
-        backup_dir = Path("backups")
-        backup_dir.mkdir(exist_ok=True)
+        job = job_manager.submit(
+            "backup",
+            created_by=current_admin.username,
+            method=backup_method,
+            webdav_config=webdav_config,
+            ftp_config=ftp_config
+        )
+    except JobConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
-        # 生成备份文件名
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_filename = f"backup_{timestamp}.sqlite3"
-        backup_path = backup_dir / backup_filename
+    return {
+        "message": f"Backup job started using {backup_method} method",
+        "job": job.to_dict()
+    }
 
-        # 创建数据库备份
-        if os.path.exists(db_path):
-            # 使用SQLite的备份API
-            source_conn = sqlite3.connect(db_path)
-            backup_conn = sqlite3.connect(str(backup_path))
 
-            # 执行备份
-            source_conn.backup(backup_conn)
+async def run_backup_job(job: Job, method: str, webdav_config: Optional[dict], ftp_config: Optional[dict]):
+    """备份任务：在线复制数据库，按备份方法上传到远程"""
+    from pathlib import Path
 
-            source_conn.close()
-            backup_conn.close()
+    username = job.created_by
+    try:
+        staging_dir = Path("backups") / ".staging"
+        staging_dir.mkdir(parents=True, exist_ok=True)
 
-            # 获取备份文件大小
-            file_size = os.path.getsize(backup_path)
-            size_mb = round(file_size / (1024 * 1024), 2)
+        # 生成备份文件名
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        backup_id = f"backup_{timestamp}"
+        backup_filename = f"{backup_id}{backup_extension()}"
+        backup_path = staging_dir / backup_filename
+
+        # 分批复制数据库到临时文件，再分块压缩存入备份库；需要上传时最后 20% 进度留给上传
+        remote = (method == "webdav" and webdav_config) or (method == "ftp" and ftp_config)
+        await copy_database(job, backup_path, span=(0, 60 if remote else 80))
+        try:
+            job.update(stage="archiving")
+            manifest = await asyncio.to_thread(
+                backup_archive.write, backup_id, backup_path, {"method": method, "created_by": username},
+                extension=backup_extension()
+            )
+            job.update(progress=80 if remote else 100)
+            size_mb = round(manifest["size"] / (1024 * 1024), 2)
 
             backup_info = {
-                "backup_id": f"backup_{timestamp}",
+                "backup_id": backup_id,
                 "filename": backup_filename,
-                "created_at": datetime.now(),
-                "created_by": current_admin.username,
+                "created_at": manifest["created_at"],
+                "created_by": username,
                 "size": f"{size_mb}MB",
+                "stored_size": manifest["stored_size"],
                 "status": "completed",
-                "method": backup_method,
-                "path": str(backup_path)
+                "method": method
             }
 
-            # 根据备份方法处理
-            if backup_method == "webdav" and webdav_config:
-                # 上传到WebDAV
-                await upload_to_webdav(backup_path, backup_filename, webdav_config, current_admin)
-                backup_info["remote_location"] = f"{webdav_config['url']}/{webdav_config['path']}/{backup_filename}"
+            # 根据备份方法处理，上传进度占最后 20%
+            def upload_progress(sent, total):
+                job.update(progress=80 + 20 * sent / max(total, 1))
 
-            elif backup_method == "ftp" and ftp_config:
-                # 上传到FTP
-                await upload_to_ftp(backup_path, backup_filename, ftp_config, current_admin)
-                backup_info["remote_location"] = f"ftp://{ftp_config['host']}/{ftp_config['path']}/{backup_filename}"
+            if method == "webdav" and webdav_config:
+                job.update(stage="uploading")
+                backup_info["remote_location"] = await upload_to_webdav(
+                    backup_path, backup_filename, webdav_config, username, upload_progress
+                )
 
-            # 记录备份操作
-            await SystemLogger.info(
-                module=LogModule.SYSTEM,
-                message=f"创建{backup_method}备份成功: {backup_filename}",
-                details={
-                    "backup_id": backup_info["backup_id"],
-                    "method": backup_method,
-                    "size": backup_info["size"]
-                },
-                user=current_admin.username
-            )
+            elif method == "ftp" and ftp_config:
+                job.update(stage="uploading")
+                backup_info["remote_location"] = await upload_to_ftp(
+                    backup_path, backup_filename, ftp_config, username, upload_progress
+                )
+        finally:
+            backup_path.unlink(missing_ok=True)
 
-            return {
-                "message": f"Backup created successfully using {backup_method} method",
-                "backup_info": backup_info
-            }
-        else:
-            raise HTTPException(status_code=500, detail="Database file not found")
+        # 记录备份操作
+        await SystemLogger.info(
+            module=LogModule.SYSTEM,
+            message=f"创建{method}备份成功: {backup_filename}",
+            details={
+                "backup_id": backup_info["backup_id"],
+                "method": method,
+                "size": backup_info["size"]
+            },
+            user=username
+        )
+        return backup_info
 
     except Exception as e:
         await SystemLogger.error(
             module=LogModule.SYSTEM,
             message="备份创建失败",
-            details={"error": str(e), "method": backup_method},
-            user=current_admin.username
+            details={"error": str(e), "method": method},
+            user=username
         )
-        raise HTTPException(status_code=500, detail=f"Backup failed: {str(e)}")
+        raise
 
 
-async def upload_to_webdav(backup_path, filename, webdav_config, current_admin):
-    """上传备份文件到WebDAV服务器"""
-    import httpx
-    import base64
-    from urllib.parse import urljoin
+job_manager.register("backup", run_backup_job, group="database")
 
-    try:
-        # 准备WebDAV上传
-        credentials = base64.b64encode(f"{webdav_config['username']}:{webdav_config['password']}".encode()).decode()
-        headers = {
-            "Authorization": f"Basic {credentials}",
-            "Content-Type": "application/octet-stream"
-        }
 
-        # 构建远程路径
-        remote_url = urljoin(webdav_config['url'].rstrip('/') + '/', webdav_config['path'].strip('/') + '/' + filename)
+@router.get("/backup/jobs", summary="获取后台任务列表")
+async def list_backup_jobs(
+    kind: Optional[str] = Query(None, description="任务类型"),
+    current_admin = Depends(get_current_active_admin)
+):
+    """获取最近的后台任务（仅超级管理员可访问）"""
+    if not current_admin.is_superuser:
+        raise HTTPException(status_code=403, detail="Only superuser can access backup jobs")
 
-        # 读取备份文件
-        with open(backup_path, 'rb') as f:
-            backup_data = f.read()
+    jobs = [job.to_dict() for job in job_manager.list(kind)]
+    return {"jobs": jobs, "total": len(jobs)}
 
-        # 上传到WebDAV
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.put(
-                remote_url,
-                headers=headers,
-                content=backup_data
-            )
 
-            if response.status_code not in [200, 201, 204]:
-                raise Exception(f"WebDAV upload failed: HTTP {response.status_code}")
+@router.get("/backup/jobs/{job_id}", summary="获取后台任务状态")
+async def get_backup_job(
+    job_id: str,
+    current_admin = Depends(get_current_active_admin)
+):
+    """获取后台任务的状态和进度（仅超级管理员可访问）"""
+    if not current_admin.is_superuser:
+        raise HTTPException(status_code=403, detail="Only superuser can access backup jobs")
+
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+async def upload_to_webdav(backup_path, filename, webdav_config, username, progress=None):
+    """流式上传备份文件到WebDAV服务器"""
+    from app.core.remote_transfer import upload_webdav
+
+    try:
+        remote_url = await upload_webdav(Path(backup_path), filename, webdav_config, progress=progress)
 
         await SystemLogger.info(
             module=LogModule.SYSTEM,
             message=f"WebDAV上传成功: {filename}",
             details={"remote_url": remote_url},
-            user=current_admin.username
+            user=username
         )
+        return remote_url
 
     except Exception as e:
         await SystemLogger.error(
             module=LogModule.SYSTEM,
             message=f"WebDAV上传失败: {filename}",
             details={"error": str(e)},
-            user=current_admin.username
+            user=username
         )
         raise
 
 
-async def upload_to_ftp(backup_path, filename, ftp_config, current_admin):
-    """上传备份文件到FTP服务器"""
-    try:
-        import ftplib
-
-        # 连接FTP服务器
-        ftp = ftplib.FTP()
-        ftp.connect(ftp_config['host'], ftp_config.get('port', 21))
-        ftp.login(ftp_config['username'], ftp_config['password'])
-
-        # 切换到目标目录
-        try:
-            ftp.cwd(ftp_config['path'])
-        except ftplib.error_perm:
-            # 如果目录不存在，尝试创建
-            ftp.mkd(ftp_config['path'])
-            ftp.cwd(ftp_config['path'])
-
-        # 上传文件
-        with open(backup_path, 'rb') as f:
-            ftp.storbinary(f'STOR {filename}', f)
+async def upload_to_ftp(backup_path, filename, ftp_config, username, progress=None):
+    """上传备份文件到FTP服务器（支持断点续传）"""
+    from app.core.remote_transfer import upload_ftp
 
-        ftp.quit()
+    try:
+        remote_url = await upload_ftp(Path(backup_path), filename, ftp_config, progress=progress)
 
         await SystemLogger.info(
             module=LogModule.SYSTEM,
             message=f"FTP上传成功: {filename}",
-            details={"host": ftp_config['host'], "path": ftp_config['path']},
-            user=current_admin.username
+            details={"host": ftp_config['host'], "path": ftp_config.get('path')},
+            user=username
         )
+        return remote_url
 
     except Exception as e:
         await SystemLogger.error(
             module=LogModule.SYSTEM,
             message=f"FTP上传失败: {filename}",
             details={"error": str(e)},
-            user=current_admin.username
+            user=username
         )
         raise
 
@@ -790,39 +803,19 @@ async def get_system_logs(
     if not current_admin.is_superuser:
         raise HTTPException(status_code=403, detail="Only superuser can access system logs")
 
-    query = SystemLog.all()
-
-    # 应用筛选条件
-    if level:
-        query = query.filter(level=level)
-
-    if module:
-        query = query.filter(module=module)
-
-    if user:
-        query = query.filter(user__icontains=user)
-
-    if start_time:
-        query = query.filter(timestamp__gte=start_time)
-
-    if end_time:
-        query = query.filter(timestamp__lte=end_time)
-
-    # 获取总数
-    total = await query.count()
+    # 只查询与时间范围有交集的月分区
+    logs, total = await log_store.search(
+        level=level,
+        module=module,
+        user=user,
+        start_time=start_time,
+        end_time=end_time,
+        offset=(page - 1) * size,
+        limit=size
+    )
 
-    # 分页查询
-    offset = (page - 1) * size
-    logs = await query.offset(offset).limit(size).order_by("-timestamp")
-
-    # 统计信息
-    stats = {
-        "total": total,
-        "info_count": await SystemLog.filter(level=LogLevel.INFO).count(),
-        "warning_count": await SystemLog.filter(level=LogLevel.WARNING).count(),
-        "error_count": await SystemLog.filter(level=LogLevel.ERROR).count(),
-        "debug_count": await SystemLog.filter(level=LogLevel.DEBUG).count(),
-    }
+    # 统计信息（由计数回答，与模块、时间范围筛选一致）
+    stats = {**await log_store.stats(module, start_time, end_time), "total": total}
 
     return {
         "logs": logs,
@@ -840,11 +833,11 @@ async def clear_system_logs(
     if not current_admin.is_superuser:
         raise HTTPException(status_code=403, detail="Only superuser can clear system logs")
 
-    # 计算删除时间点
-    cutoff_time = datetime.now() - timedelta(days=days)
+    # 计算删除时间点（日志时间按UTC存储）
+    cutoff_time = log_utcnow() - timedelta(days=days)
 
-    # 删除旧日志
-    deleted_count = await SystemLog.filter(timestamp__lt=cutoff_time).delete()
+    # 删除旧日志：整月过期的分区直接删表
+    deleted_count = await log_store.purge_before(cutoff_time)
 
     # 记录清理操作
     await SystemLogger.info(
@@ -860,10 +853,26 @@ async def clear_system_logs(
     }
 
 
+@router.post("/logs/reconcile", summary="校正系统日志计数")
+async def reconcile_log_counters(
+    current_admin = Depends(get_current_active_admin)
+):
+    """按日志表实际数据修正日志计数（仅超级管理员可操作）"""
+    if not current_admin.is_superuser:
+        raise HTTPException(status_code=403, detail="Only superuser can reconcile log counters")
+
+    corrected = await log_store.reconcile()
+    return {
+        "message": f"Corrected {corrected} log counters",
+        "corrected_count": corrected
+    }
+
+
 @router.post("/backup/test-webdav", summary="测试WebDAV连接")
 async def test_webdav_connection(
     config: WebDAVTestRequest,
-    current_admin = Depends(get_current_active_admin)
+    current_admin = Depends(get_current_active_admin),
+    client = Depends(get_http_client)
 ):
     """测试WebDAV连接"""
     if not current_admin.is_superuser:
@@ -892,27 +901,27 @@ async def test_webdav_connection(
             </D:prop>
         </D:propfind>'''
 
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.request(
-                "PROPFIND",
-                config.url,
-                headers=headers,
-                content=propfind_body
-            )
+        response = await client.request(
+            "PROPFIND",
+            config.url,
+            headers=headers,
+            content=propfind_body,
+            timeout=10.0
+        )
 
-            if response.status_code in [200, 207]:  # 207 Multi-Status is also success for WebDAV
-                await SystemLogger.info(
-                    module=LogModule.SYSTEM,
-                    message="WebDAV连接测试成功",
-                    details={"url": config.url, "username": config.username},
-                    user=current_admin.username
-                )
-                return {"message": "WebDAV connection successful", "status": "success"}
-            else:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"WebDAV connection failed: HTTP {response.status_code}"
-                )
+        if response.status_code in [200, 207]:  # 207 Multi-Status is also success for WebDAV
+            await SystemLogger.info(
+                module=LogModule.SYSTEM,
+                message="WebDAV连接测试成功",
+                details={"url": config.url, "username": config.username},
+                user=current_admin.username
+            )
+            return {"message": "WebDAV connection successful", "status": "success"}
+        else:
+            raise HTTPException(
+                status_code=400,
+                detail=f"WebDAV connection failed: HTTP {response.status_code}"
+            )
 
     except httpx.RequestError as e:
         await SystemLogger.error(
@@ -943,6 +952,7 @@ async def test_ftp_connection(
 
     try:
         import ftplib
+        from app.core.remote_transfer import check_ftp
 
         # 验证必要参数
         required_fields = ['host', 'username', 'password']
@@ -950,21 +960,8 @@ async def test_ftp_connection(
             if not config.get(field):
                 raise HTTPException(status_code=400, detail=f"Missing required field: {field}")
 
-        # 测试FTP连接
-        ftp = ftplib.FTP()
-        ftp.connect(config['host'], config.get('port', 21))
-        ftp.login(config['username'], config['password'])
-
-        # 测试目录访问
-        if config.get('path'):
-            try:
-                ftp.cwd(config['path'])
-            except ftplib.error_perm:
-                # 如果目录不存在，尝试创建
-                ftp.mkd(config['path'])
-                ftp.cwd(config['path'])
-
-        ftp.quit()
+        # 测试FTP连接和目录访问（目录不存在时创建），在工作线程中执行
+        await check_ftp(config)
 
         await SystemLogger.info(
             module=LogModule.SYSTEM,
@@ -995,7 +992,8 @@ async def test_ftp_connection(
 @router.post("/test-cdn", summary="测试CDN连接")
 async def test_cdn_connection(
     config: dict,
-    current_admin = Depends(get_current_active_admin)
+    current_admin = Depends(get_current_active_admin),
+    client = Depends(get_http_client)
 ):
     """测试CDN连接"""
     if not current_admin.is_superuser:
@@ -1032,34 +1030,34 @@ async def test_cdn_connection(
         }
 
         # 测试上传到CDN
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                settings.IMAGE_CDN_URL,
-                files=files,
-                data=data,
-                headers=headers
-            )
+        response = await client.post(
+            settings.IMAGE_CDN_URL,
+            files=files,
+            data=data,
+            headers=headers,
+            timeout=10.0
+        )
 
-            if response.status_code == 200:
-                result = response.json()
-                if result.get('code') == 200:
-                    await SystemLogger.info(
-                        module=LogModule.SYSTEM,
-                        message="CDN连接测试成功",
-                        details={"domain": config['domain']},
-                        user=current_admin.username
-                    )
-                    return {"message": "CDN connection successful", "status": "success"}
-                else:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"CDN test failed: {result.get('msg', 'Unknown error')}"
-                    )
+        if response.status_code == 200:
+            result = response.json()
+            if result.get('code') == 200:
+                await SystemLogger.info(
+                    module=LogModule.SYSTEM,
+                    message="CDN连接测试成功",
+                    details={"domain": config['domain']},
+                    user=current_admin.username
+                )
+                return {"message": "CDN connection successful", "status": "success"}
             else:
                 raise HTTPException(
                     status_code=400,
-                    detail=f"CDN test failed: HTTP {response.status_code}"
+                    detail=f"CDN test failed: {result.get('msg', 'Unknown error')}"
                 )
+        else:
+            raise HTTPException(
+                status_code=400,
+                detail=f"CDN test failed: HTTP {response.status_code}"
+            )
 
     except httpx.RequestError as e:
         await SystemLogger.error(
@@ -1167,130 +1165,95 @@ async def test_email_sending(
         raise HTTPException(status_code=500, detail=f"Email test failed: {str(e)}")
 
 
-@router.post("/backup/webdav", summary="WebDAV备份")
+@router.post("/backup/webdav", status_code=202, summary="WebDAV备份")
 async def backup_to_webdav(
     config: WebDAVConfig,
     current_admin = Depends(get_current_active_admin)
 ):
-    """备份数据到WebDAV服务器"""
+    """创建备份并上传到WebDAV服务器的后台任务"""
     if not current_admin.is_superuser:
         raise HTTPException(status_code=403, detail="Only superuser can create WebDAV backup")
 
     try:
-        import httpx
-        import base64
-        from pathlib import Path
-        from urllib.parse import urljoin
-
-        # 首先创建本地备份
-        backup_response = await create_backup(current_admin)
-        backup_info = backup_response["backup_info"]
-        local_backup_path = backup_info["path"]
-
-        # 准备WebDAV上传
-        credentials = base64.b64encode(f"{config.username}:{config.password}".encode()).decode()
-        headers = {
-            "Authorization": f"Basic {credentials}",
-            "Content-Type": "application/octet-stream"
-        }
-
-        # 构建远程路径
-        remote_filename = backup_info["filename"]
-        remote_url = urljoin(config.url.rstrip('/') + '/', config.path.strip('/') + '/' + remote_filename)
-
-        # 读取备份文件
-        with open(local_backup_path, 'rb') as f:
-            backup_data = f.read()
-
-        # 上传到WebDAV
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.put(
-                remote_url,
-                headers=headers,
-                content=backup_data
-            )
-
-            if response.status_code in [200, 201, 204]:
-                await SystemLogger.info(
-                    module=LogModule.SYSTEM,
-                    message=f"WebDAV备份成功: {remote_filename}",
-                    details={
-                        "backup_id": backup_info["backup_id"],
-                        "remote_url": remote_url,
-                        "size": backup_info["size"]
-                    },
-                    user=current_admin.username
-                )
-
-                return {
-                    "message": "WebDAV backup successful",
-                    "backup_info": backup_info,
-                    "remote_url": remote_url
-                }
-            else:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"WebDAV upload failed: HTTP {response.status_code}"
-                )
-
-    except Exception as e:
-        await SystemLogger.error(
-            module=LogModule.SYSTEM,
-            message="WebDAV备份失败",
-            details={"error": str(e)},
-            user=current_admin.username
+        job = job_manager.submit(
+            "backup",
+            created_by=current_admin.username,
+            method="webdav",
+            webdav_config=config.dict(),
+            ftp_config=None
         )
-        raise HTTPException(status_code=500, detail=f"WebDAV backup failed: {str(e)}")
+    except JobConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return {
+        "message": "WebDAV backup job started",
+        "job": job.to_dict()
+    }
 
 
 @router.get("/backup/history", summary="获取备份历史")
 async def get_backup_history(
     current_admin = Depends(get_current_active_admin)
 ):
-    """获取备份历史列表"""
+    """获取备份历史列表，包含逻辑大小与实际占用空间"""
     if not current_admin.is_superuser:
         raise HTTPException(status_code=403, detail="Only superuser can access backup history")
 
-    import os
     from pathlib import Path
 
     try:
         backup_dir = Path("backups")
         if not backup_dir.exists():
-            return {"backups": [], "total": 0}
+            return {"backups": [], "total": 0, "logical_size": 0, "physical_size": 0}
+
+        # 分块备份
+        backups = [
+            {
+                "id": manifest["id"],
+                "filename": manifest["filename"],
+                "size": manifest["size"],
+                "stored_size": manifest["stored_size"],
+                "format": "chunked",
+                "method": manifest.get("method", "local"),
+                "status": "success",
+                "created_at": manifest["created_at"]
+            }
+            for manifest in await asyncio.to_thread(backup_archive.manifests)
+        ]
+        usage = await asyncio.to_thread(backup_archive.usage)
 
-        backups = []
+        # 升级前的完整数据库备份文件
         for backup_file in backup_dir.glob("backup_*.sqlite3"):
             try:
                 stat = backup_file.stat()
                 filename = backup_file.name
 
-                # 从文件名提取时间戳
-                timestamp_str = filename.replace("backup_", "").replace(".sqlite3", "")
-
                 # 尝试从系统日志中获取备份方法信息
                 backup_method = "local"  # 默认值
                 try:
                     # 查找相关的备份日志
-                    log_entry = await SystemLog.filter(
+                    log_entries, _ = await log_store.search(
                         module=LogModule.SYSTEM,
-                        message__icontains=filename
-                    ).first()
-                    if log_entry and log_entry.details:
-                        backup_method = log_entry.details.get("method", "local")
+                        message=filename,
+                        limit=1
+                    )
+                    if log_entries and log_entries[0]["details"]:
+                        backup_method = log_entries[0]["details"].get("method", "local")
                 except:
                     pass
 
-                backup_info = {
+                backups.append({
                     "id": filename,
                     "filename": filename,
                     "size": stat.st_size,
+                    "stored_size": stat.st_size,
+                    "format": "raw",
                     "method": backup_method,
                     "status": "success",
-                    "created_at": datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                    "path": str(backup_file)
-                }
-                backups.append(backup_info)
+                    "created_at": datetime.fromtimestamp(stat.st_ctime).isoformat()
+                })
+                usage["logical_size"] += stat.st_size
+                usage["physical_size"] += stat.st_size
             except Exception as e:
                 print(f"Error processing backup file {backup_file}: {e}")
                 continue
@@ -1300,7 +1263,8 @@ async def get_backup_history(
 
         return {
             "backups": backups,
-            "total": len(backups)
+            "total": len(backups),
+            **usage
         }
 
     except Exception as e:
@@ -1316,13 +1280,14 @@ async def download_backup(
     if not current_admin.is_superuser:
         raise HTTPException(status_code=403, detail="Only superuser can download backup")
 
-    from fastapi.responses import FileResponse
+    from fastapi.responses import FileResponse, StreamingResponse
     from pathlib import Path
 
     try:
         backup_path = Path("backups") / backup_id
+        chunked = backup_archive.exists(backup_id)
 
-        if not backup_path.exists():
+        if not chunked and (not backup_path.exists() or backup_path.name != backup_id):
             raise HTTPException(status_code=404, detail="Backup file not found")
 
         await SystemLogger.info(
@@ -1332,6 +1297,18 @@ async def download_backup(
             user=current_admin.username
         )
 
+        if chunked:
+            # 分块备份边解压边下载
+            manifest = await asyncio.to_thread(backup_archive.manifest, backup_id)
+            return StreamingResponse(
+                backup_archive.iter_content(backup_id),
+                media_type='application/octet-stream',
+                headers={
+                    "Content-Disposition": f'attachment; filename="{manifest["filename"]}"',
+                    "Content-Length": str(manifest["size"])
+                }
+            )
+
         return FileResponse(
             path=str(backup_path),
             filename=backup_id,
@@ -1358,12 +1335,15 @@ async def delete_backup(
     try:
         backup_path = Path("backups") / backup_id
 
-        if not backup_path.exists():
+        if backup_archive.exists(backup_id):
+            # 删除清单并清理不再被引用的数据块
+            await asyncio.to_thread(backup_archive.delete, backup_id)
+        elif backup_path.exists() and backup_path.name == backup_id:
+            # 删除文件
+            backup_path.unlink()
+        else:
             raise HTTPException(status_code=404, detail="Backup file not found")
 
-        # 删除文件
-        backup_path.unlink()
-
         await SystemLogger.warning(
             module=LogModule.SYSTEM,
             message=f"删除备份文件: {backup_id}",
@@ -1379,58 +1359,101 @@ async def delete_backup(
         raise HTTPException(status_code=500, detail=f"Failed to delete backup: {str(e)}")
 
 
-@router.post("/backup/restore/{backup_id}", summary="从备份恢复数据")
+@router.post("/backup/restore/{backup_id}", status_code=202, summary="从备份恢复数据")
 async def restore_from_backup(
     backup_id: str,
     current_admin = Depends(get_current_active_admin)
 ):
-    """从备份文件恢复数据"""
+    """创建恢复任务，在不重启服务的情况下替换当前数据库"""
     if not current_admin.is_superuser:
         raise HTTPException(status_code=403, detail="Only superuser can restore backup")
 
-    import os
-    import sqlite3
-    import shutil
-    from pathlib import Path
+    backup_path = Path("backups") / backup_id
+    chunked = backup_archive.exists(backup_id)
+
+    if not chunked and (not backup_path.exists() or backup_path.name != backup_id):
+        raise HTTPException(status_code=404, detail="Backup file not found")
 
     try:
-        backup_path = Path("backups") / backup_id
+        job = job_manager.submit(
+            "restore",
+            created_by=current_admin.username,
+            backup_id=backup_id,
+            source=None if chunked else str(backup_path)
+        )
+    except JobConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
-        if not backup_path.exists():
-            raise HTTPException(status_code=404, detail="Backup file not found")
+    return {
+        "message": f"Restore job started for backup {backup_id}",
+        "job": job.to_dict()
+    }
 
-        # 当前数据库路径
-        current_db_path = "db.sqlite3"
 
-        # 创建当前数据库的备份
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        safety_backup_path = Path("backups") / f"safety_backup_before_restore_{timestamp}.sqlite3"
+async def run_restore_job(job: Job, backup_id: str, source: Optional[str]):
+    """恢复任务：停顿连接池，替换数据库后重建缓存"""
+    try:
+        result = await restore_database(job, backup_id, Path(source) if source else None)
+    except Exception as e:
+        await SystemLogger.error(
+            module=LogModule.SYSTEM,
+            message=f"从备份恢复数据失败: {backup_id}",
+            details={"backup_id": backup_id, "error": str(e)},
+            user=job.created_by
+        )
+        raise
 
-        if os.path.exists(current_db_path):
-            shutil.copy2(current_db_path, safety_backup_path)
+    # 数据库已替换但补齐表结构或重建缓存失败时，任务仍为完成，结果中带 warnings
+    suffix = "（已恢复，部分后续步骤失败）" if result.get("warnings") else ""
+    await SystemLogger.warning(
+        module=LogModule.SYSTEM,
+        message=f"从备份恢复数据{suffix}: {backup_id}",
+        details=result,
+        user=job.created_by
+    )
+    return result
 
-        # 恢复数据库
-        shutil.copy2(backup_path, current_db_path)
 
-        await SystemLogger.warning(
-            module=LogModule.SYSTEM,
-            message=f"从备份恢复数据: {backup_id}",
-            details={
-                "backup_id": backup_id,
-                "safety_backup": str(safety_backup_path)
-            },
-            user=current_admin.username
-        )
+job_manager.register("restore", run_restore_job, group="database")
 
-        return {
-            "message": f"Data restored from backup {backup_id} successfully",
-            "safety_backup": str(safety_backup_path)
-        }
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to restore backup: {str(e)}")
+@router.get("/scheduler", summary="获取定时任务")
+async def get_scheduled_tasks(
+    current_admin = Depends(get_current_active_admin)
+):
+    """获取定时任务及最近的运行记录（仅超级管理员可访问）"""
+    if not current_admin.is_superuser:
+        raise HTTPException(status_code=403, detail="Only superuser can access scheduled tasks")
+
+    kinds = {task.job_kind for task in scheduler.tasks()}
+    return {
+        "enabled": settings.SCHEDULER_ENABLED,
+        "is_leader": scheduler.is_leader,
+        "tasks": [task.to_dict() for task in scheduler.tasks()],
+        "history": [job.to_dict() for job in job_manager.list() if job.kind in kinds]
+    }
+
+
+@router.post("/scheduler/{task_name}/run", status_code=202, summary="立即运行定时任务")
+async def run_scheduled_task(
+    task_name: str,
+    current_admin = Depends(get_current_active_admin)
+):
+    """立即运行一次定时任务（仅超级管理员可操作）"""
+    if not current_admin.is_superuser:
+        raise HTTPException(status_code=403, detail="Only superuser can run scheduled tasks")
+
+    task = scheduler.get(task_name)
+    if not task:
+        raise HTTPException(status_code=404, detail="Scheduled task not found")
+
+    job = await scheduler.run_task(task, jitter=False)
+    if job is None:
+        raise HTTPException(status_code=409, detail=f"Scheduled task skipped: {task.last_skipped}")
+    return {
+        "message": f"Scheduled task {task_name} started",
+        "job": job.to_dict()
+    }
 
 
 @router.get("/config/backup", summary="获取备份配置")
@@ -1710,6 +1733,36 @@ async def get_performance_data(
         raise HTTPException(status_code=500, detail=f"Failed to get performance data: {str(e)}")
 
 
+@router.get("/monitor/metrics", summary="获取请求指标快照")
+async def get_metrics_snapshot(
+    current_admin = Depends(get_current_active_admin)
+):
+    """所有 worker 按路由汇总的请求数、错误数和耗时直方图"""
+    if not await PermissionManager.has_permission(current_admin, PermissionCode.SYSTEM_VIEW):
+        raise HTTPException(status_code=403, detail="Permission denied")
+
+    from app.core.metrics import metrics_store
+    return metrics_store.snapshot()
+
+
+@router.post("/monitor/performance/reset", summary="重置性能监控数据")
+async def reset_performance_data(
+    current_admin = Depends(get_current_active_admin)
+):
+    """清零所有 worker 的请求指标"""
+    if not await PermissionManager.has_permission(current_admin, PermissionCode.SYSTEM_CONFIG):
+        raise HTTPException(status_code=403, detail="Permission denied")
+
+    from app.middleware.performance import performance_monitor
+    performance_monitor.reset()
+    await SystemLogger.info(
+        module=LogModule.SYSTEM,
+        message="重置性能监控数据",
+        user=current_admin.username
+    )
+    return {"message": "Performance data reset successfully"}
+
+
 @router.get("/monitor/health", summary="系统健康检查")
 async def health_check_detailed():
     """详细的系统健康检查"""
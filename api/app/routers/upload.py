@@ -1,87 +1,162 @@
 import os
-import httpx
+import tempfile
 import aiofiles
+from pathlib import Path
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from fastapi.responses import JSONResponse
 from app.config import settings
+from app.core.http_clients import get_http_client
+from app.core.image_index import image_index
+from app.core.image_pipeline import PRESETS, image_pipeline, rename
+from app.core.image_upload import (
+    Base64DecodeError, ImageSource, ImageTooLargeError, ImageUploadError, MultipartBody, from_base64, from_upload
+)
 from app.dependencies.auth import get_current_active_admin
 
 router = APIRouter(prefix="/upload", tags=["文件上传"])
 
 
+async def _send_to_cdn(client, source: ImageSource, filename: str, folder: str) -> dict:
+    """把图片流式写入 multipart 请求发往图床，返回图片信息"""
+    body = MultipartBody({'folder': folder}, 'image', filename, source.content_type, source.size)
+    response = await client.post(
+        settings.IMAGE_CDN_URL,
+        content=body.stream(source.chunks(settings.MAX_FILE_SIZE)),
+        headers={**body.headers, 'token': settings.IMAGE_CDN_TOKEN}
+    )
+
+    if response.status_code != 200:
+        raise HTTPException(status_code=500, detail="CDN上传失败")
+
+    result = response.json()
+
+    if result.get('code') != 200:
+        raise HTTPException(
+            status_code=500,
+            detail=f"CDN上传失败: {result.get('msg', '未知错误')}"
+        )
+
+    return {
+        "url": result['data']['url'],
+        "id": result['data']['id'],
+        "name": result['data']['name'],
+        "size": result['data']['size'],
+        "mime": result['data']['mime']
+    }
+
+
+async def _send_or_store(client, source: ImageSource, filename: str, folder: str) -> dict:
+    """上传到图床；图床无法连接且开启了本地兜底时保存到本地"""
+    import httpx
+
+    try:
+        return await _send_to_cdn(client, source, filename, folder)
+    except httpx.RequestError:
+        if not settings.IMAGE_LOCAL_FALLBACK:
+            raise
+        return await image_index.save_local(source, filename, settings.MAX_FILE_SIZE)
+
+
+def _resolve_preset(preset: Optional[str]) -> str:
+    preset = preset or settings.IMAGE_OPTIMIZE_PRESET
+    if preset not in PRESETS:
+        raise HTTPException(status_code=400, detail=f"不支持的图片质量预设: {preset}")
+    return preset
+
+
+async def _optimize_and_send(
+    client, source: ImageSource, filename: str, folder: str, preset: str, thumbnail: bool
+) -> dict:
+    """按预设优化图片（进程池中执行）后上传，需要时同时上传缩略图"""
+    if PRESETS[preset] is None:
+        return await _send_or_store(client, source, filename, folder)
+
+    with tempfile.TemporaryDirectory(prefix="hqxx-image-") as workdir:
+        image, thumb, info = await image_pipeline.optimize(
+            source, Path(workdir), preset, settings.IMAGE_OPTIMIZE_FORMAT, thumbnail, settings.MAX_FILE_SIZE
+        )
+        filename = rename(filename, image.content_type)
+        data = await _send_or_store(client, image, filename, folder)
+        if thumb is not None:
+            thumb_data = await _send_or_store(client, thumb, f"thumb_{filename}", folder)
+            data["thumbnail"] = thumb_data["url"]
+            if thumb_data.get("local"):
+                data["local"] = True
+    data["optimization"] = info
+    return data
+
+
+async def _upload_image(
+    client, source: ImageSource, filename: str, folder: str, preset: str, thumbnail: bool
+) -> dict:
+    """上传图片：先按内容哈希查找已上传的地址，未命中时优化、上传并记录"""
+    if not settings.IMAGE_DEDUP_ENABLED:
+        data = await _optimize_and_send(client, source, filename, folder, preset, thumbnail)
+    else:
+        variant = image_index.variant(folder, preset, settings.IMAGE_OPTIMIZE_FORMAT, thumbnail)
+        sha256 = await source.sha256(settings.MAX_FILE_SIZE)
+        entry = await image_index.lookup(sha256, variant)
+        if entry is not None:
+            data = image_index.response_data(entry)
+        else:
+            data = await _optimize_and_send(client, source, filename, folder, preset, thumbnail)
+            await image_index.remember(sha256, variant, data, source.size)
+
+    # 返回成功结果
+    return {
+        "success": True,
+        "message": "上传成功",
+        "data": data
+    }
+
+
+@router.get("/image/stats", summary="图片去重统计")
+async def get_image_upload_stats(current_admin = Depends(get_current_active_admin)):
+    """图片去重索引的记录数、命中次数和命中率"""
+    return {
+        "success": True,
+        "data": await image_index.stats()
+    }
+
+
 @router.post("/image", summary="上传图片到CDN")
 async def upload_image_to_cdn(
     image: UploadFile = File(...),
     folder: Optional[str] = Form("tinymce"),
-    current_admin = Depends(get_current_active_admin)
+    preset: Optional[str] = Form(None),
+    thumbnail: bool = Form(False),
+    current_admin = Depends(get_current_active_admin),
+    client = Depends(get_http_client)
 ):
     """
     上传图片到CDN
-    支持从TinyMCE编辑器粘贴上传
+    支持从TinyMCE编辑器粘贴上传；按质量预设缩放、压缩后上传（preset=original 时原样按块转发），
+    thumbnail=true 时同时上传缩略图
     """
+    import httpx
+
     # 验证文件类型
     if not image.content_type or not image.content_type.startswith('image/'):
         raise HTTPException(status_code=400, detail="只支持图片文件")
     
-    # 验证文件大小
-    if image.size and image.size > settings.MAX_FILE_SIZE:
-        raise HTTPException(status_code=400, detail="文件大小超过限制")
-    
     # 检查CDN配置
     if not settings.IMAGE_CDN_TOKEN:
         raise HTTPException(status_code=500, detail="图床配置未设置")
+
+    preset = _resolve_preset(preset)
     
     try:
-        # 读取文件内容
-        file_content = await image.read()
-
-        # 准备上传到CDN的数据
-        files = {
-            'image': (image.filename, file_content, image.content_type)
-        }
-        data = {
-            'folder': folder
-        }
-
-        # 设置请求头
-        headers = {
-            'token': settings.IMAGE_CDN_TOKEN
-        }
-
-        # 上传到CDN
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                settings.IMAGE_CDN_URL,
-                files=files,
-                data=data,
-                headers=headers
-            )
-
-            if response.status_code != 200:
-                raise HTTPException(status_code=500, detail="CDN上传失败")
-
-            result = response.json()
-
-            if result.get('code') != 200:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"CDN上传失败: {result.get('msg', '未知错误')}"
-                )
-
-            # 返回成功结果
-            return {
-                "success": True,
-                "message": "上传成功",
-                "data": {
-                    "url": result['data']['url'],
-                    "id": result['data']['id'],
-                    "name": result['data']['name'],
-                    "size": result['data']['size'],
-                    "mime": result['data']['mime']
-                }
-            }
+        # 验证文件大小和文件头（实际格式以文件内容为准）
+        source = await from_upload(image, settings.MAX_FILE_SIZE)
+        return await _upload_image(client, source, image.filename or "image", folder, preset, thumbnail)
 
+    except ImageTooLargeError:
+        raise HTTPException(status_code=400, detail="文件大小超过限制")
+    except ImageUploadError:
+        raise HTTPException(status_code=400, detail="无效的图片数据")
+    except HTTPException:
+        raise
     except httpx.RequestError as e:
         raise HTTPException(status_code=500, detail=f"网络请求失败: {str(e)}")
     except Exception as e:
@@ -93,92 +168,36 @@ async def upload_base64_image_to_cdn(
     image_data: str = Form(...),
     filename: Optional[str] = Form("pasted_image.png"),
     folder: Optional[str] = Form("tinymce"),
-    current_admin = Depends(get_current_active_admin)
+    preset: Optional[str] = Form(None),
+    thumbnail: bool = Form(False),
+    current_admin = Depends(get_current_active_admin),
+    client = Depends(get_http_client)
 ):
     """
     上传Base64编码的图片到CDN
-    主要用于处理粘贴的图片
+    主要用于处理粘贴的图片；优化方式与文件上传相同，Base64 边解码边写入，不生成完整的解码副本
     """
-    import base64
-    import io
-    from PIL import Image
-    
+    import httpx
+
+    # 检查CDN配置
+    if not settings.IMAGE_CDN_TOKEN:
+        raise HTTPException(status_code=500, detail="图床配置未设置")
+
+    preset = _resolve_preset(preset)
+
     try:
-        # 解析Base64数据
-        if image_data.startswith('data:image/'):
-            # 移除data:image/xxx;base64,前缀
-            header, encoded = image_data.split(',', 1)
-            content_type = header.split(';')[0].split(':')[1]
-        else:
-            encoded = image_data
-            content_type = 'image/png'
-        
-        # 解码Base64
-        image_bytes = base64.b64decode(encoded)
-        
-        # 验证是否为有效图片
-        try:
-            img = Image.open(io.BytesIO(image_bytes))
-            img.verify()
-        except Exception:
-            raise HTTPException(status_code=400, detail="无效的图片数据")
-        
-        # 验证文件大小
-        if len(image_bytes) > settings.MAX_FILE_SIZE:
-            raise HTTPException(status_code=400, detail="文件大小超过限制")
-        
-        # 检查CDN配置
-        if not settings.IMAGE_CDN_TOKEN:
-            raise HTTPException(status_code=500, detail="图床配置未设置")
-        
-        # 准备上传到CDN的数据
-        files = {
-            'image': (filename, image_bytes, content_type)
-        }
-        data = {
-            'folder': folder
-        }
-
-        # 设置请求头
-        headers = {
-            'token': settings.IMAGE_CDN_TOKEN
-        }
-
-        # 上传到CDN
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                settings.IMAGE_CDN_URL,
-                files=files,
-                data=data,
-                headers=headers
-            )
-
-            if response.status_code != 200:
-                raise HTTPException(status_code=500, detail="CDN上传失败")
-
-            result = response.json()
-
-            if result.get('code') != 200:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"CDN上传失败: {result.get('msg', '未知错误')}"
-                )
-
-            # 返回成功结果
-            return {
-                "success": True,
-                "message": "上传成功",
-                "data": {
-                    "url": result['data']['url'],
-                    "id": result['data']['id'],
-                    "name": result['data']['name'],
-                    "size": result['data']['size'],
-                    "mime": result['data']['mime']
-                }
-            }
-
-    except base64.binascii.Error:
+        # 验证Base64、文件大小和文件头（只解码开头几个字节）
+        source = from_base64(image_data, settings.MAX_FILE_SIZE)
+        return await _upload_image(client, source, filename, folder, preset, thumbnail)
+
+    except Base64DecodeError:
         raise HTTPException(status_code=400, detail="无效的Base64数据")
+    except ImageTooLargeError:
+        raise HTTPException(status_code=400, detail="文件大小超过限制")
+    except ImageUploadError:
+        raise HTTPException(status_code=400, detail="无效的图片数据")
+    except HTTPException:
+        raise
     except httpx.RequestError as e:
         raise HTTPException(status_code=500, detail=f"网络请求失败: {str(e)}")
     except Exception as e:
@@ -3,7 +3,12 @@ import uuid
 from datetime import datetime
 from typing import Optional, Dict, Any
 from fastapi import Request
+from tortoise import timezone
+from tortoise.expressions import F
+from tortoise.functions import Count, Max
+from app.models.admin import Admin, AdminLoginActivity
 from app.models.system_log import SystemLog, LogLevel, LogModule
+from app.core.log_store import log_store
 
 
 class SystemLogger:
@@ -31,8 +36,8 @@ class SystemLogger:
                 if not request_id:
                     request_id = str(uuid.uuid4())
             
-            # 创建日志记录
-            await SystemLog.create(
+            # 写入当月日志分区
+            await log_store.write(
                 level=level,
                 module=module,
                 message=message,
@@ -69,7 +74,7 @@ class SystemLogger:
     
     @staticmethod
     async def auth_login(username: str, success: bool, request: Optional[Request] = None):
-        """记录登录日志"""
+        """记录登录日志，并同步更新登录统计"""
         level = LogLevel.INFO if success else LogLevel.WARNING
         message = f"用户 {username} 登录{'成功' if success else '失败'}"
         await SystemLogger.log(
@@ -79,6 +84,49 @@ class SystemLogger:
             user=username if success else None,
             request=request
         )
+        try:
+            await SystemLogger._record_login_activity(username, success, request)
+        except Exception as e:
+            print(f"Failed to update login activity: {e}")
+
+    @staticmethod
+    async def _record_login_activity(username: str, success: bool, request: Optional[Request] = None):
+        """更新登录统计（只为已存在的管理员建立记录）"""
+        now = timezone.now()
+        if success:
+            ip_address = request.client.host if request and request.client else None
+            updated = await AdminLoginActivity.filter(username=username).update(
+                login_count=F("login_count") + 1, last_login_at=now, last_ip=ip_address
+            )
+            values = {"login_count": 1, "last_login_at": now, "last_ip": ip_address}
+        else:
+            updated = await AdminLoginActivity.filter(username=username).update(
+                failed_count=F("failed_count") + 1, last_failed_at=now
+            )
+            values = {"failed_count": 1, "last_failed_at": now}
+
+        if not updated and await Admin.filter(username=username).exists():
+            await AdminLoginActivity.create(username=username, **values)
+
+    @staticmethod
+    async def backfill_login_activity():
+        """
+        登录统计表为空时，从历史登录日志汇总一次（兼容升级前的数据）
+
+        需在旧日志迁移到月分区之前执行。
+        """
+        if await AdminLoginActivity.all().exists():
+            return
+        rows = await SystemLog.filter(
+            module=LogModule.AUTH, message__icontains="登录成功", user__isnull=False
+        ).annotate(count=Count("id"), last_login_at=Max("timestamp")).group_by("user").values(
+            "user", "count", "last_login_at"
+        )
+        usernames = set(await Admin.all().values_list("username", flat=True))
+        await AdminLoginActivity.bulk_create([
+            AdminLoginActivity(username=row["user"], login_count=row["count"], last_login_at=row["last_login_at"])
+            for row in rows if row["user"] in usernames
+        ])
     
     @staticmethod
     async def auth_logout(username: str, request: Optional[Request] = None):
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+图片优化性能测试
+用不同的进程数批量执行 optimize_file（与上传接口使用同一函数和进程池配置），
+报告压缩前后的总字节数、节省比例、吞吐量（张/秒）和每个进程的吞吐量
+
+默认生成模拟截图（大面积纯色、文字、色块，PNG）和照片（渐变加噪声，带 EXIF 的 JPEG），
+也可以用 --images 指定图片目录
+
+运行方式（在 api 目录下）:
+    python -m benchmarks.bench_image_pipeline [--count 24] [--workers 1,2,4]
+        [--preset standard] [--format webp] [--thumbnail] [--images DIR]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from app.core.image_pipeline import FORMATS, PRESETS, optimize_file
+
+
+def make_screenshot(path: Path, index: int):
+    """模拟粘贴的截图：白底、文字行和色块"""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(index)
+    width, height = rng.choice([(2560, 1440), (1920, 1080), (3024, 1964)])
+    img = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(img)
+    for y in range(40, height - 40, 36):
+        if rng.random() < 0.15:
+            continue
+        draw.text((60, y), f"{index}-{y} 已知函数 f(x) = ax^2 + bx + c，求 f(x) 的最小值" * 2, fill="black")
+    for _ in range(12):
+        x, y = rng.randrange(width - 400), rng.randrange(height - 300)
+        draw.rectangle((x, y, x + rng.randrange(50, 400), y + rng.randrange(20, 300)),
+                       fill=tuple(rng.randrange(256) for _ in range(3)))
+    img.save(path, "PNG")
+
+
+def make_photo(path: Path, index: int):
+    """模拟手机拍摄的照片：渐变加噪声，带 EXIF"""
+    from PIL import Image
+
+    width, height = 4032, 3024
+    gradient = Image.linear_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 40 + index % 20)
+    img = Image.merge("RGB", (gradient, noise, gradient.rotate(90).resize((width, height))))
+    exif = Image.Exif()
+    exif[0x010F] = "Benchmark Camera"
+    exif[0x0112] = 1
+    img.save(path, "JPEG", quality=92, exif=exif)
+
+
+def prepare_images(workdir: Path, count: int, source: str = None) -> list:
+    if source:
+        images = sorted(p for p in Path(source).iterdir() if p.is_file())
+        if not images:
+            raise SystemExit(f"目录中没有图片: {source}")
+        return images
+    images = []
+    for index in range(count):
+        if index % 3 == 2:
+            path = workdir / f"photo_{index}.jpg"
+            make_photo(path, index)
+        else:
+            path = workdir / f"screenshot_{index}.png"
+            make_screenshot(path, index)
+        images.append(path)
+    return images
+
+
+def run(images: list, outdir: Path, workers: int, preset: str, fmt: str, thumbnail: bool) -> tuple:
+    """用 workers 个进程处理全部图片，返回 (耗时秒, 处理结果列表)"""
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        # 先启动全部子进程并导入 PIL，进程启动时间不计入结果
+        list(executor.map(_warm_up, range(workers)))
+        start = time.perf_counter()
+        futures = [
+            executor.submit(
+                optimize_file, str(path), str(outdir / f"{index}.out"), preset, fmt,
+                str(outdir / f"{index}.thumb") if thumbnail else None
+            )
+            for index, path in enumerate(images)
+        ]
+        results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - start
+    return elapsed, results
+
+
+def _warm_up(_):
+    """预先启动子进程并导入 PIL，计时不包含进程启动和模块导入"""
+    # 只为加载模块，不使用导入的名称
+    from PIL import Image, WebPImagePlugin  # noqa: F401
+    # 稍作停留，使每个子进程都分到一次预热任务
+    time.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="图片优化性能测试")
+    parser.add_argument("--count", type=int, default=24, help="生成的测试图片数")
+    parser.add_argument("--workers", default=",".join(str(n) for n in sorted({1, 2, os.cpu_count() or 1})),
+                        help="进程数列表，逗号分隔")
+    parser.add_argument("--preset", default="standard", choices=[name for name, options in PRESETS.items() if options])
+    parser.add_argument("--format", default="webp", choices=FORMATS)
+    parser.add_argument("--thumbnail", action="store_true", help="同时生成缩略图")
+    parser.add_argument("--images", help="使用目录中的图片代替生成的测试图片")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench_image_"))
+    try:
+        images = prepare_images(workdir, args.count, args.images)
+        print(f"测试图片: {len(images)} 张，预设 {args.preset}，格式 {args.format}，CPU {os.cpu_count()} 核")
+
+        for workers in [int(n) for n in args.workers.split(",")]:
+            outdir = workdir / f"out_{workers}"
+            outdir.mkdir()
+            elapsed, results = run(images, outdir, workers, args.preset, args.format, args.thumbnail)
+            original = sum(result["original_size"] for result in results)
+            optimized = sum(result["size"] for result in results)
+            thumbnails = sum(result.get("thumbnail_size", 0) for result in results)
+            throughput = len(images) / elapsed
+            print(f"\n{workers} 个进程: {elapsed:.2f} 秒")
+            print(f"  吞吐量: {throughput:.1f} 张/秒，每个进程 {throughput / workers:.2f} 张/秒，"
+                  f"输入 {original / elapsed / 1024 / 1024:.1f} MB/秒")
+            print(f"  原图 {original / 1024:.0f} KB -> {optimized / 1024:.0f} KB，"
+                  f"节省 {original - optimized:,} 字节（{(1 - optimized / original) * 100:.1f}%）"
+                  + (f"，缩略图共 {thumbnails / 1024:.0f} KB" if args.thumbnail else ""))
+            skipped = sum(1 for result in results if not result["optimized"])
+            if skipped:
+                print(f"  {skipped} 张保留原图（动画图片或重新编码后没有变小）")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+SQLite 连接配置档性能测试
+多个读线程和写线程同时访问同一个数据库，对比裸地址（Tortoise 默认 PRAGMA）与各配置档的读写吞吐量和锁冲突次数
+
+运行方式（在 api 目录下）:
+    python -m benchmarks.bench_sqlite_pragmas [--rows 50000] [--readers 8] [--writers 2] [--seconds 5]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import threading
+import time
+from app.core.db_profile import PROFILES, apply_pragmas
+
+# 不带查询参数的 sqlite:// 地址在 Tortoise 中得到的 PRAGMA
+BASELINE = {"journal_mode": "WAL", "journal_size_limit": 16384, "foreign_keys": "ON"}
+
+SCHEMA = """
+CREATE TABLE questions (
+    id INTEGER PRIMARY KEY,
+    subject_id INTEGER NOT NULL,
+    difficulty INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    view_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX idx_questions_subject ON questions (subject_id, difficulty);
+"""
+
+
+def connect(path: str, pragmas: dict) -> sqlite3.Connection:
+    # 与 aiosqlite 一致：自动提交模式，默认等待 5 秒
+    conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+    apply_pragmas(conn, pragmas)
+    return conn
+
+
+def seed(path: str, rows: int):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany(
+        "INSERT INTO questions (subject_id, difficulty, title, content) VALUES (?, ?, ?, ?)",
+        (
+            (i % 20, i % 5 + 1, f"测试题目 {i}", f"<p>题目内容 {i}</p>" * 20)
+            for i in range(rows)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+class Counter:
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+        self.locked = 0
+        self.lock = threading.Lock()
+
+    def add(self, reads=0, writes=0, locked=0):
+        with self.lock:
+            self.reads += reads
+            self.writes += writes
+            self.locked += locked
+
+
+def reader(path: str, pragmas: dict, rows: int, deadline: float, counter: Counter):
+    conn = connect(path, pragmas)
+    rng = random.Random()
+    try:
+        while time.perf_counter() < deadline:
+            try:
+                if rng.random() < 0.5:
+                    conn.execute("SELECT * FROM questions WHERE id = ?", (rng.randint(1, rows),)).fetchall()
+                else:
+                    conn.execute(
+                        "SELECT id, title, content FROM questions WHERE subject_id = ? AND difficulty = ? "
+                        "ORDER BY id DESC LIMIT 20",
+                        (rng.randint(0, 19), rng.randint(1, 5)),
+                    ).fetchall()
+                counter.add(reads=1)
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e):
+                    raise
+                counter.add(locked=1)
+    finally:
+        conn.close()
+
+
+def writer(path: str, pragmas: dict, rows: int, deadline: float, counter: Counter):
+    conn = connect(path, pragmas)
+    rng = random.Random()
+    try:
+        while time.perf_counter() < deadline:
+            try:
+                # 与接口中的写操作类似：小事务内一次插入加一次更新
+                conn.execute("BEGIN")
+                conn.execute(
+                    "INSERT INTO questions (subject_id, difficulty, title, content) VALUES (?, ?, ?, ?)",
+                    (rng.randint(0, 19), rng.randint(1, 5), "新题目", "<p>新内容</p>" * 20),
+                )
+                conn.execute("UPDATE questions SET view_count = view_count + 1 WHERE id = ?", (rng.randint(1, rows),))
+                conn.execute("COMMIT")
+                counter.add(writes=1)
+            except sqlite3.OperationalError as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                if "locked" not in str(e):
+                    raise
+                counter.add(locked=1)
+    finally:
+        conn.close()
+
+
+def run(name: str, pragmas: dict, args) -> Counter:
+    path = f"bench_pragmas_{name}.sqlite3"
+    remove(path)
+    seed(path, args.rows)
+    # 预热一次，使页缓存和内存映射就绪
+    connect(path, pragmas).close()
+
+    counter = Counter()
+    deadline = time.perf_counter() + args.seconds
+    threads = [
+        threading.Thread(target=reader, args=(path, pragmas, args.rows, deadline, counter))
+        for _ in range(args.readers)
+    ] + [
+        threading.Thread(target=writer, args=(path, pragmas, args.rows, deadline, counter))
+        for _ in range(args.writers)
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        remove(path)
+    return counter
+
+
+def remove(path: str):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite 连接配置档性能测试")
+    parser.add_argument("--rows", type=int, default=50000, help="初始试题数量")
+    parser.add_argument("--readers", type=int, default=8, help="读线程数")
+    parser.add_argument("--writers", type=int, default=2, help="写线程数")
+    parser.add_argument("--seconds", type=float, default=5, help="每个配置档的运行时间")
+    args = parser.parse_args()
+
+    print(f"📋 {args.rows} 道试题, {args.readers} 个读线程, {args.writers} 个写线程, 每组 {args.seconds:.0f}s")
+    results = {}
+    for name, pragmas in [("baseline", BASELINE), ("development", PROFILES["development"]),
+                          ("production", PROFILES["production"])]:
+        counter = run(name, pragmas, args)
+        results[name] = counter
+        print(
+            f"  {name:<12} 读 {counter.reads / args.seconds:>9.0f} 次/秒  "
+            f"写 {counter.writes / args.seconds:>7.0f} 次/秒  锁冲突 {counter.locked}"
+        )
+
+    base = results["baseline"]
+    best = results["production"]
+    if base.reads and base.writes:
+        print(f"📊 production 相对 baseline: 读 {best.reads / base.reads:.1f}x, 写 {best.writes / base.writes:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+启动时间测试
+在子进程中导入 app.main（python -X importtime），统计导入耗时、耗时最多的模块，
+并检查按需加载的重型模块（PIL、httpx、psutil、ftplib、smtplib）是否在启动时被导入；
+--serve 时再启动 uvicorn，测量从进程启动到 /health 返回 200 的时间
+
+运行方式（在 api 目录下）:
+    python -m benchmarks.bench_startup [--runs 5] [--top 15] [--serve] [--port 8765]
+"""
+
+import argparse
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+# 启动时不应导入的模块（只在对应接口中按需加载）
+LAZY_MODULES = ("PIL", "httpx", "psutil", "ftplib", "smtplib")
+
+_IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+def profile_import() -> tuple:
+    """导入 app.main 一次，返回 (墙钟耗时秒, {模块: 累计微秒}, 顶层模块列表)"""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True, text=True, env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        sys.exit(f"导入 app.main 失败:\n{result.stderr[-2000:]}")
+
+    cumulative = {}
+    top_level = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if not match:
+            continue
+        _, cumul, indent, name = match.groups()
+        cumulative[name] = int(cumul)
+        # 缩进为 1 个空格的是直接被 -c 导入链触发的模块
+        if len(indent) <= 1:
+            top_level.append(name)
+    return elapsed, cumulative, top_level
+
+
+def measure_serve(port: int, timeout: float = 30.0) -> float:
+    """启动 uvicorn，返回 /health 首次返回 200 的耗时（秒）"""
+    with socket.socket() as sock:
+        if sock.connect_ex(("127.0.0.1", port)) == 0:
+            sys.exit(f"端口 {port} 已被占用")
+
+    env = {**os.environ, "AUTO_MIGRATE": os.environ.get("AUTO_MIGRATE", "false"), "SCHEDULER_ENABLED": "false"}
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        sys.exit(f"{timeout} 秒内服务未就绪")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动时间测试")
+    parser.add_argument("--runs", type=int, default=5, help="导入测试次数")
+    parser.add_argument("--top", type=int, default=15, help="列出耗时最多的模块数")
+    parser.add_argument("--serve", action="store_true", help="同时测量 uvicorn 启动到健康检查通过的时间")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    # 第一次运行预热字节码缓存和文件系统缓存，不计入结果
+    profile_import()
+    runs = [profile_import() for _ in range(args.runs)]
+    elapsed = [run[0] for run in runs]
+    cumulative = runs[-1][1]
+    top_level = runs[-1][2]
+
+    print(f"导入 app.main（含解释器启动）: 中位数 {statistics.median(elapsed) * 1000:.0f} ms, "
+          f"最快 {min(elapsed) * 1000:.0f} ms, 最慢 {max(elapsed) * 1000:.0f} ms（{args.runs} 次）")
+    print(f"app.main 累计导入耗时: {cumulative.get('app.main', 0) / 1000:.0f} ms")
+
+    print("\n耗时最多的顶层模块（累计）:")
+    for name in sorted(top_level, key=lambda name: cumulative[name], reverse=True)[:args.top]:
+        print(f"  {cumulative[name] / 1000:8.1f} ms  {name}")
+
+    loaded = [name for name in LAZY_MODULES if name in cumulative]
+    print(f"\n启动时导入的按需加载模块: {', '.join(loaded) if loaded else '无'}")
+
+    if args.serve:
+        ready = measure_serve(args.port)
+        print(f"\nuvicorn 启动到 /health 返回 200: {ready * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+from contextlib import asynccontextmanager
+import pytest
+from tortoise import Tortoise
+from app.config import TORTOISE_ORM
+from app.core.db_profile import tortoise_connections
+
+
+def database_config(path) -> dict:
+    """指向 path 处 SQLite 测试数据库的 Tortoise 配置（模型和路由与应用相同）"""
+    return {
+        **TORTOISE_ORM,
+        "connections": tortoise_connections(f"sqlite://{path}", "test", read_connections=1),
+    }
+
+
+@asynccontextmanager
+async def open_database(config: dict):
+    """
+    初始化 Tortoise，退出时关闭连接
+
+    Tortoise 的连接保存在 contextvar 中，初始化和关闭必须在同一个测试协程里进行
+    （放在异步 fixture 的清理阶段关闭不到，测试进程会因 aiosqlite 线程无法退出）。
+    """
+    await Tortoise.init(config=config)
+    try:
+        yield
+    finally:
+        await Tortoise.close_connections()
+
+
+@pytest.fixture
+def db_config(tmp_path) -> dict:
+    """空的测试数据库"""
+    return database_config(tmp_path / "test.sqlite3")
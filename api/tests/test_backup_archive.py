@@ -0,0 +1,35 @@
+import random
+from app.core.backup_archive import CDC_MAX_SIZE, BackupArchive
+
+
+def test_manifest_filename_extension(tmp_path):
+    """清单中的下载文件名使用调用方按数据库类型传入的扩展名"""
+    archive = BackupArchive(str(tmp_path / "backups"))
+    source = tmp_path / "backup.pgdump"
+    source.write_bytes(b"PGDMP" + bytes(range(256)) * 64)
+
+    manifest = archive.write("backup_1", source, extension=".pgdump")
+    assert manifest["filename"] == "backup_1.pgdump"
+    assert archive.manifest("backup_1")["filename"] == "backup_1.pgdump"
+    assert archive.write("backup_2", source)["filename"] == "backup_2.sqlite3"
+
+
+def test_shifted_dump_is_deduplicated(tmp_path):
+    """非 SQLite 文件按滚动哈希切块，中间插入数据后只有附近的块需要重新存储"""
+    archive = BackupArchive(str(tmp_path / "backups"))
+    content = random.Random(1).randbytes(2 * 1024 * 1024)
+    first = tmp_path / "first.pgdump"
+    first.write_bytes(content)
+    second = tmp_path / "second.pgdump"
+    second.write_bytes(content[:1000] + b"inserted row" * 10 + content[1000:])
+
+    full = archive.write("backup_1", first, extension=".pgdump")
+    delta = archive.write("backup_2", second, extension=".pgdump")
+
+    assert len(full["chunks"]) > 16
+    assert all(length <= CDC_MAX_SIZE for _, length in full["chunks"])
+    assert delta["stored_size"] < full["stored_size"] * 0.1
+
+    restored = tmp_path / "restored.pgdump"
+    archive.restore_to("backup_2", restored)
+    assert restored.read_bytes() == second.read_bytes()
@@ -0,0 +1,55 @@
+import pytest
+from app.core import batch
+from app.core.batch import CopyConflictError, copy_questions
+from app.migrate import migrate_schema
+from app.models.category import Category
+from app.models.grade import Grade
+from app.models.question import Question
+from app.models.semester import Semester
+from app.models.subject import Subject
+from tests.conftest import open_database
+
+
+async def _create_questions(count: int) -> list:
+    semester = await Semester.create(name="第一学期", code="s1")
+    grade = await Grade.create(name="一年级", code="g1", level=1)
+    subject = await Subject.create(name="语文", code="chinese")
+    category = await Category.create(name="拼音", code="pinyin", subject=subject)
+    return [
+        await Question.create(title=f"题目{i}", content=f"内容{i}", semester=semester, grade=grade,
+                              subject=subject, category=category)
+        for i in range(count)
+    ]
+
+
+async def test_copy_questions_id_map(db_config):
+    """新旧ID按原题对应，已删除试题的ID不会被复用"""
+    async with open_database(db_config):
+        await migrate_schema()
+        questions = await _create_questions(3)
+        await questions[-1].delete()
+
+        id_map = await copy_questions([q.id for q in questions[:2]])
+
+        assert set(id_map) == {q.id for q in questions[:2]}
+        assert min(id_map.values()) > questions[-1].id
+        for original in questions[:2]:
+            copy = await Question.get(id=id_map[original.id])
+            assert copy.title == f"{original.title} (副本)"
+            assert copy.content == original.content
+            assert not copy.is_published
+
+
+async def test_copy_questions_conflict(db_config, monkeypatch):
+    """预留的ID已被占用时返回可处理的错误并整体回滚"""
+    async with open_database(db_config):
+        await migrate_schema()
+        questions = await _create_questions(2)
+
+        async def taken_ids(conn, count):
+            return [questions[0].id + i for i in range(count)]
+
+        monkeypatch.setattr(batch, "_reserve_question_ids", taken_ids)
+        with pytest.raises(CopyConflictError):
+            await copy_questions([q.id for q in questions])
+        assert await Question.all().count() == 2
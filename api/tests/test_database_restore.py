@@ -0,0 +1,30 @@
+from app.core import database_restore
+
+
+async def test_reload_after_swap_continues_after_failure(monkeypatch):
+    """数据库替换后补齐表结构失败时仍重建缓存和派生数据，并以警告返回"""
+    calls = []
+
+    async def failing_migrate():
+        raise RuntimeError("index already exists")
+
+    async def reload():
+        calls.append("reload")
+
+    monkeypatch.setattr(database_restore, "migrate_schema", failing_migrate)
+    monkeypatch.setattr(database_restore, "reload_derived_data", reload)
+
+    warnings = await database_restore._reload_after_swap()
+
+    assert calls == ["reload"]
+    assert len(warnings) == 1 and "index already exists" in warnings[0]
+
+
+async def test_reload_after_swap_without_warnings(monkeypatch):
+    async def ok():
+        pass
+
+    monkeypatch.setattr(database_restore, "migrate_schema", ok)
+    monkeypatch.setattr(database_restore, "reload_derived_data", ok)
+
+    assert await database_restore._reload_after_swap() == []
@@ -0,0 +1,29 @@
+from app.core.image_index import ImageIndex
+from app.migrate import migrate_schema
+from tests.conftest import open_database
+
+
+def test_variant_includes_folder():
+    """同一处理方式上传到不同目录时使用不同的去重标识，过长的目录名取哈希"""
+    assert ImageIndex.variant("tinymce", "standard", "webp", True) == "tinymce/standard:webp:thumb"
+    assert ImageIndex.variant("tinymce", "original", "webp", True) == "tinymce/original"
+    assert ImageIndex.variant("covers", "standard", "webp", True) != ImageIndex.variant(
+        "tinymce", "standard", "webp", True
+    )
+
+    long_folder = "questions/" + "x" * 100
+    variant = ImageIndex.variant(long_folder, "standard", "original", True)
+    assert len(variant) <= 50
+    assert variant != ImageIndex.variant(long_folder + "y", "standard", "original", True)
+
+
+async def test_lookup_by_folder(db_config, tmp_path):
+    """在一个目录中上传过的图片，上传到其他目录时不命中"""
+    index = ImageIndex(str(tmp_path), "/uploads/images")
+    data = {"url": "https://cdn.example.com/a.webp", "id": 1, "name": "a.webp", "size": 10, "mime": "image/webp"}
+    async with open_database(db_config):
+        await migrate_schema()
+        await index.remember("a" * 64, index.variant("tinymce", "standard", "webp", False), data, 20)
+
+        assert await index.lookup("a" * 64, index.variant("tinymce", "standard", "webp", False)) is not None
+        assert await index.lookup("a" * 64, index.variant("covers", "standard", "webp", False)) is None
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta, timezone
+from app.core import log_store as log_store_module
+from app.core.log_store import LogStore
+from app.migrate import migrate_schema
+from app.models.system_log import LogCounter, LogPartition, SystemLog
+from tests.conftest import open_database
+
+
+def _worker(cache_counters: bool) -> LogStore:
+    """模拟一个 worker 进程中的日志存储实例"""
+    store = LogStore()
+    store._cache_counters = cache_counters
+    return store
+
+
+async def test_search_total_across_workers(db_config):
+    """多 worker 时一个进程写入的日志，另一个进程分页查询的总数立即包含"""
+    async with open_database(db_config):
+        await migrate_schema()
+        reader, writer = _worker(False), _worker(False)
+
+        await writer.write("info", "system", "first")
+        assert (await reader.search())[1] == 1
+
+        await writer.write("info", "system", "second")
+        logs, total = await reader.search(offset=1, limit=1)
+        assert total == 2
+        assert [log["message"] for log in logs] == ["first"]
+
+
+async def test_migrate_legacy_recounts_once(db_config, monkeypatch):
+    """旧日志迁移完成后每个分区只重算一次计数"""
+    monkeypatch.setattr(log_store_module, "MIGRATE_BATCH_SIZE", 2)
+    store = _worker(True)
+    recounted = []
+    recount = store._recount
+
+    async def tracking_recount(partition, conn):
+        recounted.append(partition.key)
+        return await recount(partition, conn)
+
+    monkeypatch.setattr(store, "_recount", tracking_recount)
+
+    async with open_database(db_config):
+        await migrate_schema()
+        start = datetime(2024, 1, 31, 12, tzinfo=timezone.utc)
+        for i in range(5):
+            await SystemLog.create(level="info", module="system", message=f"log {i}",
+                                   timestamp=start + timedelta(hours=6 * i))
+
+        await store.migrate_legacy()
+
+        assert sorted(recounted) == ["202401", "202402"]
+        assert not await SystemLog.all().exists()
+        assert sum(await LogPartition.all().values_list("total_count", flat=True)) == 5
+        assert sum(await LogCounter.all().values_list("count", flat=True)) == 5
+        assert (await store.search())[1] == 5
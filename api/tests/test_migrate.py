@@ -0,0 +1,50 @@
+import os
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+from tortoise import Tortoise
+from app.migrate import INDEXES, migrate_schema
+from tests.conftest import open_database
+
+
+def _index_names(config: dict) -> set:
+    path = config["connections"]["default"]["credentials"]["file_path"]
+    with sqlite3.connect(path) as conn:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+async def test_migrate_twice(db_config):
+    """迁移可以重复执行，第二次执行不因索引已存在而失败"""
+    async with open_database(db_config):
+        await migrate_schema()
+        await migrate_schema()
+
+    assert {name for name, _, _ in INDEXES} <= _index_names(db_config)
+
+
+async def test_migrate_existing_index(db_config):
+    """已有同名索引的旧数据库（旧版本由 Meta.indexes 创建）第一次迁移也能成功"""
+    async with open_database(db_config):
+        await Tortoise.generate_schemas(safe=True)
+        client = Tortoise.get_connection("default")
+        await client.execute_script('CREATE INDEX "idx_questions_created_at" ON "questions" ("created_at")')
+        await migrate_schema()
+
+    assert "idx_questions_created_at" in _index_names(db_config)
+
+
+def test_migrate_command_twice(tmp_path):
+    """容器每次启动都执行 python -m app.migrate（docker/start.sh），重启时不能失败"""
+    api_dir = Path(__file__).resolve().parent.parent
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite://{tmp_path / 'app.sqlite3'}",
+        "DB_PROFILE": "test",
+        "PYTHONPATH": str(api_dir),
+    }
+    for _ in range(2):
+        result = subprocess.run(
+            [sys.executable, "-m", "app.migrate"], cwd=tmp_path, env=env, capture_output=True, text=True
+        )
+        assert result.returncode == 0, result.stderr[-2000:]
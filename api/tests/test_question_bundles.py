@@ -0,0 +1,53 @@
+import asyncio
+import json
+from app.core.question_bundles import MANIFEST_NAME, QuestionBundles
+
+
+def _worker(directory) -> QuestionBundles:
+    """模拟一个 worker 进程中的快照包实例（进程内锁各自独立）"""
+    bundles = QuestionBundles(str(directory), "/snapshots")
+
+    async def render(key):
+        # 渲染期间让出事件循环，使两个实例的重建交错进行
+        await asyncio.sleep(0.05)
+        return json.dumps([{"id": key[0]}]).encode(), 1
+
+    bundles._render = render
+    return bundles
+
+
+async def test_concurrent_rebuilds_keep_each_others_entries(tmp_path):
+    """两个 worker 同时重建不同的快照包，清单中保留双方的条目"""
+    first, second = _worker(tmp_path), _worker(tmp_path)
+
+    await asyncio.gather(first.rebuild([(1, 1, 1, 1)]), second.rebuild([(2, 2, 2, 2)]))
+
+    manifest = json.loads((tmp_path / MANIFEST_NAME).read_text(encoding="utf-8"))
+    assert set(manifest["bundles"]) == {"1-1-1-1", "2-2-2-2"}
+    for entry in manifest["bundles"].values():
+        assert (tmp_path / entry["file"]).exists()
+
+
+async def test_replaced_bundle_kept_until_collected(tmp_path):
+    """被替换的快照文件在保留期内仍可访问，过期后由 collect_garbage 清理"""
+    bundles = QuestionBundles(str(tmp_path), "/snapshots")
+    version = {"value": 1}
+
+    async def render(key):
+        return json.dumps([{"id": key[0], "version": version["value"]}]).encode(), 1
+
+    bundles._render = render
+    old_file = (await bundles.rebuild([(1, 1, 1, 1)]))["bundles"]["1-1-1-1"]["file"]
+    version["value"] = 2
+    new_file = (await bundles.rebuild([(1, 1, 1, 1)]))["bundles"]["1-1-1-1"]["file"]
+    assert new_file != old_file
+
+    # 缓存了旧清单的客户端仍能取到旧文件
+    assert (tmp_path / old_file).exists() and (tmp_path / f"{old_file}.gz").exists()
+    assert await bundles.collect_garbage() == 0
+    assert (tmp_path / old_file).exists()
+
+    assert await bundles.collect_garbage(min_age=0) == 2
+    assert not (tmp_path / old_file).exists()
+    assert (tmp_path / new_file).exists() and (tmp_path / f"{new_file}.gz").exists()
+    assert (tmp_path / MANIFEST_NAME).exists()
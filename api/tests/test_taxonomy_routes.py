@@ -0,0 +1,72 @@
+from pathlib import Path
+import httpx
+from fastapi import FastAPI
+from app.core.question_bundles import question_bundles
+from app.core.taxonomy import taxonomy
+from app.dependencies.auth import get_current_active_admin
+from app.migrate import migrate_schema
+from app.models.grade import Grade
+from app.models.semester import Semester
+from app.models.subject import Subject
+from app.routers import categories, questions
+from tests.conftest import open_database
+
+
+class _Superuser:
+    id = 1
+    username = "admin"
+    is_superuser = True
+    is_active = True
+
+
+def _client() -> httpx.AsyncClient:
+    """只挂载分类和试题路由的应用，不执行启动事件"""
+    app = FastAPI()
+    app.include_router(categories.router)
+    app.include_router(questions.router)
+    app.dependency_overrides[get_current_active_admin] = lambda: _Superuser()
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def test_create_question_and_child_category(db_config, tmp_path, monkeypatch):
+    """按分类校验关联数据的接口（创建子分类、创建和修改试题）不因分类查找出错"""
+    monkeypatch.setattr(question_bundles, "directory", Path(tmp_path / "snapshots"))
+    async with open_database(db_config):
+        await migrate_schema()
+        taxonomy.invalidate()
+        semester = await Semester.create(name="第一学期", code="s1")
+        grade = await Grade.create(name="一年级", code="g1", level=1)
+        subject = await Subject.create(name="语文", code="chinese")
+
+        async with _client() as client:
+            response = await client.post("/categories/", json={"name": "拼音", "code": "pinyin", "subject_id": subject.id})
+            assert response.status_code == 200, response.text
+            parent_id = response.json()["id"]
+
+            response = await client.post("/categories/", json={
+                "name": "声母", "code": "initials", "subject_id": subject.id, "parent_id": parent_id, "level": 2
+            })
+            assert response.status_code == 200, response.text
+            child_id = response.json()["id"]
+            assert response.json()["parent"]["id"] == parent_id
+
+            response = await client.get(f"/categories/{parent_id}")
+            assert response.status_code == 200, response.text
+            assert [child["id"] for child in response.json()["children"]] == [child_id]
+
+            response = await client.post("/questions/", json={
+                "title": "题目", "content": "内容", "semester_id": semester.id, "grade_id": grade.id,
+                "subject_id": subject.id, "category_id": parent_id,
+            })
+            assert response.status_code == 200, response.text
+            question = response.json()
+            assert question["category"]["id"] == parent_id
+
+            response = await client.put(f"/questions/{question['id']}", json={"category_id": child_id})
+            assert response.status_code == 200, response.text
+
+            response = await client.post("/questions/", json={
+                "title": "题目", "content": "内容", "semester_id": semester.id, "grade_id": grade.id,
+                "subject_id": subject.id, "category_id": 999,
+            })
+            assert response.status_code == 400
@@ -63,6 +63,12 @@ else
     fi
 fi
 
+# 复制来的数据库可能缺少新版本的表和索引
+/app/.venv/bin/python -m app.migrate || {
+    echo "❌ 数据库迁移失败"
+    exit 1
+}
+
 echo "✅ 数据库初始化完成"
 
 # 标记初始化完成
@@ -15,6 +15,8 @@ mkdir -p /app/logs/nginx/scgi_temp
 mkdir -p /app/logs/supervisor
 mkdir -p /app/logs/redis
 mkdir -p /app/data
+mkdir -p /app/data/snapshots
+mkdir -p /app/data/uploads/images
 mkdir -p /run/nginx
 
 # 设置权限（以当前用户身份）
@@ -57,39 +59,17 @@ cd /app/api
 # 设置环境变量
 export PYTHONPATH="/app/api"
 export DATABASE_URL="sqlite:///app/data/app.db"
+export DB_PROFILE="production"
+# uvicorn worker 进程数（共享状态使用容器内的Redis）
+export WEB_CONCURRENCY="${WEB_CONCURRENCY:-2}"
 
-# 检查是否已经初始化过
-if [ ! -f "/app/data/app.db" ]; then
-    echo "📊 首次运行，创建数据库..."
-
-    # 尝试创建数据库目录
-    mkdir -p /app/data
-
-    # 运行数据库初始化
-    /app/.venv/bin/python -c "
-import asyncio
-import sys
-sys.path.insert(0, '/app/api')
-
-try:
-    from tortoise import Tortoise
-    from app.config import TORTOISE_ORM
-
-    async def init_db():
-        await Tortoise.init(config=TORTOISE_ORM)
-        await Tortoise.generate_schemas()
-        await Tortoise.close_connections()
-        print('✅ 数据库初始化完成')
-
-    asyncio.run(init_db())
-except Exception as e:
-    print(f'⚠️ 数据库初始化失败: {e}')
-    print('将在运行时自动创建')
-"
-
-else
-    echo "📊 数据库已存在，跳过初始化"
-fi
+# 建表、建索引（可重复执行），服务启动时不再生成表结构
+echo "📊 执行数据库迁移..."
+mkdir -p /app/data
+/app/.venv/bin/python -m app.migrate || {
+    echo "❌ 数据库迁移失败"
+    exit 1
+}
 
 # 测试Redis配置
 echo "🔴 测试Redis配置..."
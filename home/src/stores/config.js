@@ -14,6 +14,8 @@ export const useConfigStore = defineStore('config', () => {
   const grades = ref([])
   const subjects = ref([])
   const categories = ref([])
+  // 分类体系中各学科的分类，加载后切换学科无需再请求
+  const categoriesBySubject = ref({})
   
   // 加载状态
   const loading = ref(false)
@@ -92,6 +94,10 @@ export const useConfigStore = defineStore('config', () => {
   }
   
   const loadCategories = async (subjectId = null) => {
+    if (subjectId && categoriesBySubject.value[subjectId]) {
+      categories.value = categoriesBySubject.value[subjectId]
+      return
+    }
     try {
       loading.value = true
       const params = { is_active: true }
@@ -108,12 +114,34 @@ export const useConfigStore = defineStore('config', () => {
     }
   }
   
+  const loadTaxonomy = async () => {
+    try {
+      loading.value = true
+      const data = await apiService.getTaxonomy()
+      semesters.value = (data.semesters || []).filter(s => s.is_time_active)
+      grades.value = data.grades || []
+      subjects.value = (data.subjects || []).map(({ categories: _, ...subject }) => subject)
+      categoriesBySubject.value = Object.fromEntries(
+        (data.subjects || []).map(subject => [subject.id, subject.categories || []])
+      )
+      return true
+    } catch (error) {
+      console.error('加载分类体系失败:', error)
+      return false
+    } finally {
+      loading.value = false
+    }
+  }
+
   const loadAllData = async () => {
-    await Promise.all([
-      loadSemesters(),
-      loadGrades(),
-      loadSubjects()
-    ])
+    // 优先一次请求加载完整分类体系，失败时回退到分别加载
+    if (!await loadTaxonomy()) {
+      await Promise.all([
+        loadSemesters(),
+        loadGrades(),
+        loadSubjects()
+      ])
+    }
     
     // 如果已选择学科，加载对应分类
     if (selectedSubject.value) {
@@ -167,6 +195,7 @@ export const useConfigStore = defineStore('config', () => {
     loadGrades,
     loadSubjects,
     loadCategories,
+    loadTaxonomy,
     loadAllData,
     setConfig,
     clearConfig,
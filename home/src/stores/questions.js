@@ -27,6 +27,19 @@ export const useQuestionsStore = defineStore('questions', () => {
   })
   
   // 方法
+  // 通过快照包清单加载已发布试题，试题内容由静态文件提供
+  const loadQuestionsFromBundle = async (config, forceRefresh) => {
+    const manifest = await apiService.getQuestionManifest({
+      semester_id: config.semester_id,
+      grade_id: config.grade_id,
+      subject_id: config.subject_id,
+      category_id: config.category_id,
+      _t: forceRefresh ? Date.now() : undefined
+    })
+    const bundle = Object.values(manifest.bundles || {})[0]
+    return bundle ? await apiService.getQuestionBundle(bundle.url) : []
+  }
+
   const loadAllQuestions = async (config, forceRefresh = false) => {
     try {
       loading.value = true
@@ -54,7 +67,14 @@ export const useQuestionsStore = defineStore('questions', () => {
         console.log('强制刷新：清除缓存并重新请求数据')
       }
 
-      const response = await apiService.getQuestions(params)
+      const response = await loadQuestionsFromBundle(config, forceRefresh).catch(err => {
+        // 学期时间错误直接提示，其他错误（如快照包已被替换）回退到接口加载
+        if (err.response?.data?.detail?.type === 'semester_time_error') {
+          throw err
+        }
+        console.warn('快照包加载失败，改用接口加载:', err)
+        return apiService.getQuestions(params)
+      })
       const data = response.data || response || []
       questions.value = data
 
@@ -64,6 +64,9 @@ const cachedApiCall = (endpoint, params = {}, ttl = 5 * 60 * 1000) => {
 
 // API方法 - 使用公开接口和缓存
 export const apiService = {
+  // 获取完整分类体系：学期、年级、学科及分类（缓存5分钟，服务端支持ETag协商）
+  getTaxonomy: () => cachedApiCall('/public/taxonomy', {}, 5 * 60 * 1000),
+
   // 获取学期列表（缓存5分钟）
   getSemesters: (params = {}) => cachedApiCall('/public/semesters/', { only_active_time: true, ...params }, 5 * 60 * 1000),
 
@@ -79,6 +82,12 @@ export const apiService = {
   // 获取试题列表（缓存2分钟）
   getQuestions: (params = {}) => cachedApiCall('/public/questions/', params, 2 * 60 * 1000),
 
+  // 获取试题快照包清单（不缓存，清单随发布变化）
+  getQuestionManifest: (params = {}) => api.get('/public/questions/manifest', { params }),
+
+  // 获取试题快照包（静态文件，文件名包含内容哈希，由浏览器长期缓存）
+  getQuestionBundle: (url) => api.get(url, { baseURL: '' }),
+
   // 随机获取试题（不缓存，保证随机性）
   getRandomQuestion: (params = {}) => api.get('/public/questions/random', { params }),
 
@@ -35,6 +35,11 @@ export default defineConfig({
     port: 3002,
     host: '0.0.0.0',
     proxy: {
+      // 试题快照包（生产环境由Nginx直接提供）
+      '/snapshots': {
+        target: 'http://127.0.0.1:8000',
+        changeOrigin: true
+      },
       '/api': {
         target: 'http://127.0.0.1:8000',
         changeOrigin: true,